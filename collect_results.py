@@ -11,7 +11,6 @@ import sklearn.metrics as metrics
 import imblearn.metrics as imb_metrics
 from loguru import logger
 from omegaconf import OmegaConf
-from roc_utils import plot_mean_roc
 from scipy.special import expit
 
 from pipeline_tabular.utils.roc_utils.roc_utils import compute_roc_aucopt
@@ -20,11 +19,12 @@ from pipeline_tabular.utils.helpers import generate_seeds, job_name_cleaner
 from pipeline_tabular.data_handler.data_handler import DataHandler
 from pipeline_tabular.utils.data_split import DataSplit
 from pipeline_tabular.utils.explain.explain import Explain  # import here to avoid circular imports
+from pipeline_tabular.utils.plots import PlotRenderer, submit_plot
 
 
 class CollectResults(DataHandler):
-    def __init__(self, config):
-        super().__init__()
+    def __init__(self, config, context=None):
+        super().__init__(context)
         self.config = config
         self.out_dir = config.meta.output_dir
         self.results_dir = os.path.join(self.out_dir, 'results')
@@ -55,11 +55,10 @@ class CollectResults(DataHandler):
         if f'{self.opt_scoring}_score' not in self.metrics_to_collect:  # ensure optimisation metric is always collected
             self.metrics_to_collect.append(f'{self.opt_scoring}_score')
         self.metrics_to_plot = [metric for metric in self.metrics_to_collect if metric not in ['roc']]
-
-        plt.rcParams.update({'font.size': config.collect_results.font_size})
+        self.font_size = config.collect_results.font_size
 
     def __call__(self) -> None:
-        self.explainer = Explain(self.config)
+        self.explainer = Explain(self.config, self.context)
         self.collect_results()
 
     def collect_results(self):
@@ -69,7 +68,7 @@ class CollectResults(DataHandler):
             index=range(len(self.to_collect)),
         )
         self.metrics_for_stats = {metric: {} for metric in self.metrics_to_plot}
-        self.roc_plot, self.roc_ax = plt.subplots()
+        self.experiment_rocs = []  # best mean ROC of each experiment -> (roc, label, color)
         self.best_jobs = {}
         self.best_models = {}
         self.best_models_per_job = {}
@@ -92,8 +91,14 @@ class CollectResults(DataHandler):
             self.summarise_verification(experiment_index, experiment_name)
 
         self.summarise_experiments()
-        self.roc_ax.set_title('Best mean ROC')
-        self.roc_plot.savefig(os.path.join(self.results_dir, f'ROC_experiments.{self.plot_format}'), dpi=300)
+        submit_plot(
+            self.config,
+            'mean_rocs',
+            os.path.join(self.results_dir, f'ROC_experiments.{self.plot_format}'),
+            rocs=self.experiment_rocs,
+            title='Best mean ROC',
+            font_size=self.font_size,
+        )
 
     def summarise_selection(self, experiment_name) -> None:
         """Summarise selection results over all seeds"""
@@ -105,32 +110,26 @@ class CollectResults(DataHandler):
             job_scores = job_scores.sort_values(by='score', ascending=True).reset_index(drop=True)
             job_scores['score'] = job_scores['score'] / job_scores['score'].sum()
 
-            try:
-                ax = job_scores.plot.barh(x='feature', y='score', figsize=(10, 10), color='green')
-            except TypeError:  # no data is available to plot, i.e. collect_results flag set to True by accident
+            if job_scores.empty:  # no data is available to plot, i.e. collect_results flag set to True by accident
                 logger.error(f'No results found to collect for job {job_name}.')
                 raise SystemExit(0)
-            fig = ax.get_figure()
-            plt.title(f'Average feature ranking')
-            plt.xlabel('Average feature ranking')
-            plt.tight_layout()
-            plt.gca().legend_.remove()
-            plt.savefig(os.path.join(out_dir, f'avg_feature_ranking_all.{self.plot_format}'), dpi=300)
-            plt.close(fig)
+            submit_plot(
+                self.config,
+                'feature_ranking',
+                os.path.join(out_dir, f'avg_feature_ranking_all.{self.plot_format}'),
+                job_scores=job_scores,
+                figsize=(10, 10),
+                font_size=self.font_size,
+            )
 
             for n_top in range(5, max(self.n_top_features), 10):
-                job_scores_n_top = job_scores.iloc[-n_top:, :]
-                ax = job_scores_n_top.plot.barh(x='feature', y='score', color='green')
-                fig = ax.get_figure()
-                plt.title(f'Average feature ranking')
-                plt.xlabel('Average feature ranking')
-                plt.tight_layout()
-                plt.gca().legend_.remove()
-                plt.savefig(
+                submit_plot(
+                    self.config,
+                    'feature_ranking',
                     os.path.join(out_dir, f'avg_feature_ranking_top{n_top}.{self.plot_format}'),
-                    dpi=300,
+                    job_scores=job_scores.iloc[-n_top:, :],
+                    font_size=self.font_size,
                 )
-                plt.close(fig)
 
     def summarise_verification(self, experiment_index, experiment_name) -> None:
         """Summarise verification results over all seeds and bootstraps"""
@@ -172,14 +171,8 @@ class CollectResults(DataHandler):
         if 'roc' in self.metrics_to_collect:
             self.plot_rocs(verification_scores['roc'], best_models)
             best_roc_exp = verification_scores['roc'].loc[best_model, best_job]
-            plot_mean_roc(
-                best_roc_exp,
-                show_ci=False,
-                show_ti=False,
-                show_opt=False,
-                ax=self.roc_ax,
-                label=self.clean_experiment_names[experiment_index],
-                color=sns.color_palette()[experiment_index],
+            self.experiment_rocs.append(
+                (best_roc_exp, self.clean_experiment_names[experiment_index], sns.color_palette()[experiment_index])
             )
         self.best_jobs[experiment_name] = best_job
         self.best_models[experiment_name] = best_model
@@ -196,15 +189,15 @@ class CollectResults(DataHandler):
         self.compute_statistics()
         self.save_mean_results()
         results_to_plot = self.results.explode(self.metrics_to_plot)  # expand lists into columns
-        plt.rcParams.update({'font.size': self.config.collect_results.font_size - 5})
         for metric in self.metrics_to_plot:
-            fig = plt.figure()
-            sns.boxplot(data=results_to_plot, x='experiment', y=metric)
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            fig.savefig(os.path.join(self.results_dir, f'{metric}_boxplot.{self.plot_format}'), dpi=300)
-            plt.close(fig)
-        plt.rcParams.update({'font.size': self.config.collect_results.font_size})
+            submit_plot(
+                self.config,
+                'metric_box_plot',
+                os.path.join(self.results_dir, f'{metric}_boxplot.{self.plot_format}'),
+                results=results_to_plot[['experiment', metric]],
+                metric=metric,
+                font_size=self.font_size - 5,
+            )
 
     def compute_statistics(self):
         for metric in self.metrics_to_plot:
@@ -228,19 +221,16 @@ class CollectResults(DataHandler):
                             best_scores_all_jobs.loc[self.best_models_per_job[experiment_name][job_1]][job_1],
                             best_scores_all_jobs.loc[self.best_models_per_job[experiment_name][job_2]][job_2],
                         ).round(2)['p-val'][0]
-                fig = plt.figure()
                 stats_all_jobs = stats_all_jobs.dropna(axis=1, how='all').dropna(axis=0, how='all')
                 if not stats_all_jobs.empty:  # will be empty for one job
-                    sns.heatmap(stats_all_jobs.astype(float), annot=True, cmap='PuBuGn', fmt='.2f')
-                    plt.title(f'Mann-Whitney U test p-values for best {metric}')
-                    plt.xticks(rotation=45, ha='right')
-                    plt.yticks(rotation=0)
-                    plt.tight_layout()
-                    fig.savefig(
+                    submit_plot(
+                        self.config,
+                        'p_value_heatmap',
                         os.path.join(self.results_dir, f'mwu_pvals_{metric}_{experiment_name}.{self.plot_format}'),
-                        dpi=300,
+                        p_values=stats_all_jobs,
+                        title=f'Mann-Whitney U test p-values for best {metric}',
+                        font_size=self.font_size,
                     )
-                    plt.close(fig)
 
             stats_all_exp = pd.DataFrame(index=self.to_collect, columns=self.to_collect)
             for i, exp_1 in enumerate(self.to_collect):
@@ -250,16 +240,19 @@ class CollectResults(DataHandler):
                     stats_all_exp.loc[exp_1, exp_2] = pg.mwu(best_scores[exp_1], best_scores[exp_2]).round(2)['p-val'][
                         0
                     ]
-            fig = plt.figure(figsize=(15, 15))
             stats_all_exp = stats_all_exp.dropna(axis=1, how='all').dropna(axis=0, how='all')
             if not stats_all_exp.empty:  # will be empty for one experiment
-                sns.heatmap(stats_all_exp.astype(float), annot=True, cmap='PuBuGn', fmt='.2f')
-                plt.title(f'Mann-Whitney U test p-values for best {metric}')
-                plt.xticks(ticks=plt.xticks()[0], labels=self.clean_experiment_names[1:], rotation=45, ha='right')
-                plt.yticks(ticks=plt.yticks()[0], labels=self.clean_experiment_names[:-1], rotation=0)
-                plt.tight_layout()
-                fig.savefig(os.path.join(self.results_dir, f'mwu_pvals_{metric}.{self.plot_format}'), dpi=300)
-                plt.close(fig)
+                submit_plot(
+                    self.config,
+                    'p_value_heatmap',
+                    os.path.join(self.results_dir, f'mwu_pvals_{metric}.{self.plot_format}'),
+                    p_values=stats_all_exp,
+                    title=f'Mann-Whitney U test p-values for best {metric}',
+                    figsize=(15, 15),
+                    xticklabels=self.clean_experiment_names[1:],
+                    yticklabels=self.clean_experiment_names[:-1],
+                    font_size=self.font_size,
+                )
 
     def save_mean_results(self):
         mean_results = pd.DataFrame(index=self.results.index, columns=self.results.columns)
@@ -276,7 +269,7 @@ class CollectResults(DataHandler):
             for model in self.rep_models + self.ensemble:
                 best_mean_opt_score, self.higher_is_better = self.init_scoring()
                 for n_top in self.n_top_features:  # find best number of features for each job/model combination
-                    all_scores, roc, conf_matrix = self.collect_scores(f'{job_name}_{n_top}', model)
+                    all_scores, roc, conf_matrix = self.collect_scores(job_name, n_top, model)
                     mean_opt_score = np.mean(all_scores[f'{self.opt_scoring}_score'])
                     if (self.higher_is_better and mean_opt_score > best_mean_opt_score) or (
                         not self.higher_is_better and mean_opt_score < best_mean_opt_score
@@ -298,7 +291,7 @@ class CollectResults(DataHandler):
 
         return verification_scores
 
-    def collect_scores(self, job_name, model) -> None:
+    def collect_scores(self, job_name, n_top, model) -> None:
         """Collect results over all seeds and bootstraps"""
         all_scores = {score: [] for score in self.metrics_to_collect}
         best_thresholds = [0.5] * self.n_bootstraps  # default threshold for binary classification
@@ -308,21 +301,26 @@ class CollectResults(DataHandler):
         conf_matrix_counter = 0
         for seed_index, seed in enumerate(self.seeds):
             try:
-                scores = self.get_store('score', seed, job_name)[model]
+                scores = self.get_store('score', seed, f'{job_name}_{n_top}')[model]
             except KeyError:  # model not yet stored for this seed/job
                 scores = {scoring: [] for scoring in self.metrics_to_collect}
+            predictions = self.get_predictions(seed, job_name, n_top, model, self.n_bootstraps)
 
             if scores[list(scores.keys())[0]]:  # else scores empty, i.e. not run for this job_name/n_top/seed
                 # special metrics
                 if self.use_youden_index:  # find best threshold and use it to compute other metrics
                     recompute_scores = True
                     for boot_iter in range(self.n_bootstraps):
-                        fpr, tpr, thresholds = metrics.roc_curve(scores['true'][boot_iter], scores['probas'][boot_iter])
+                        fpr, tpr, thresholds = metrics.roc_curve(
+                            predictions['true'][boot_iter], predictions['probas'][boot_iter]
+                        )
                         best_thresholds[boot_iter] = thresholds[np.argmax(tpr - fpr)]
 
                 if 'roc' in self.metrics_to_collect:
                     for boot_iter in range(self.n_bootstraps):
-                        fpr, tpr, thresholds = metrics.roc_curve(scores['true'][boot_iter], scores['probas'][boot_iter])
+                        fpr, tpr, thresholds = metrics.roc_curve(
+                            predictions['true'][boot_iter], predictions['probas'][boot_iter]
+                        )
                         roc.append(
                             compute_roc_aucopt(
                                 fpr,
@@ -332,8 +330,8 @@ class CollectResults(DataHandler):
                             )
                         )
                 for boot_iter in range(self.n_bootstraps):  # compute cumulative confusion matrix
-                    pred = np.where(np.array(scores['probas'][boot_iter]) >= best_thresholds[boot_iter], 1, 0)
-                    cum_conf_matrix += metrics.confusion_matrix(scores['true'][boot_iter], pred)
+                    pred = np.where(predictions['probas'][boot_iter] >= best_thresholds[boot_iter], 1, 0)
+                    cum_conf_matrix += metrics.confusion_matrix(predictions['true'][boot_iter], pred)
                     conf_matrix_counter += 1
                 for score in self.metrics_to_collect:
                     if score == 'roc':  # already computed
@@ -344,7 +342,7 @@ class CollectResults(DataHandler):
                     if (
                         recompute_scores or score not in scores.keys() or len(scores[score]) < self.n_bootstraps
                     ):  # score needs to be recomputed or has not yet been computed
-                        scores = self.compute_missing_scores(scores, score, best_thresholds)
+                        scores = self.compute_missing_scores(scores, predictions, score, best_thresholds)
 
                     all_scores[score].append(scores[score])
             else:
@@ -354,21 +352,21 @@ class CollectResults(DataHandler):
 
         return all_scores, roc, mean_conf_matrix
 
-    def compute_missing_scores(self, scores, score, thresholds):
+    def compute_missing_scores(self, scores, predictions, score, thresholds):
         """Compute missing scores for a given metric and threshold"""
         try:  # try sklearn metrics
             scores[score] = [
                 getattr(metrics, score)(
-                    scores['true'][boot_iter],
-                    np.where(np.array(scores['probas'][boot_iter]) >= thresholds[boot_iter], 1, 0),
+                    predictions['true'][boot_iter],
+                    np.where(predictions['probas'][boot_iter] >= thresholds[boot_iter], 1, 0),
                 )
                 for boot_iter in range(self.n_bootstraps)
             ]
         except AttributeError:  # try imbalanced learn metrics (e.g. for specificity)
             scores[score] = [
                 getattr(imb_metrics, score)(
-                    scores['true'][boot_iter],
-                    np.where(np.array(scores['probas'][boot_iter]) >= thresholds[boot_iter], 1, 0),
+                    predictions['true'][boot_iter],
+                    np.where(predictions['probas'][boot_iter] >= thresholds[boot_iter], 1, 0),
                 )
                 for boot_iter in range(self.n_bootstraps)
             ]
@@ -387,65 +385,52 @@ class CollectResults(DataHandler):
         return reduced_scores
 
     def plot_rocs(self, rocs, best_models):
-        roc_plot, roc_ax = plt.subplots()
         colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
-
+        best_rocs = []
         for job_index, job_name in enumerate(self.job_names):
             best_roc_job = rocs.loc[best_models[job_name], job_name]
             if best_roc_job is not None:
-                plot_mean_roc(
-                    best_roc_job,
-                    show_ci=False,
-                    show_ti=False,
-                    show_opt=False,
-                    ax=roc_ax,
-                    label=f'Strat. {job_index+1}',
-                    color=colors[job_index],
-                )
-                plt.figure()
-                plot_mean_roc(
-                    best_roc_job,
+                best_rocs.append((best_roc_job, f'Strat. {job_index+1}', colors[job_index]))
+                submit_plot(
+                    self.config,
+                    'mean_rocs',
+                    os.path.join(self.report_dir, f'ROC_best_strat_{job_index+1}.{self.plot_format}'),
+                    rocs=[(best_roc_job, f'Strat. {job_index+1}', None)],
+                    title=f'Best mean ROC for Strat. {job_index+1}',
                     show_ci=True,
-                    show_ti=False,
-                    show_opt=False,
-                    label=f'Strat. {job_index+1}',
+                    font_size=self.font_size,
                 )
-                plt.title(f'Best mean ROC for Strat. {job_index+1}')
-                plt.savefig(os.path.join(self.report_dir, f'ROC_best_strat_{job_index+1}.{self.plot_format}'), dpi=300)
-                plt.clf()
 
-        roc_ax.set_title('Best mean ROC for all strategies')
-        roc_plot.savefig(os.path.join(self.report_dir, f'ROC_best_per_strat.{self.plot_format}'), dpi=300)
+        submit_plot(
+            self.config,
+            'mean_rocs',
+            os.path.join(self.report_dir, f'ROC_best_per_strat.{self.plot_format}'),
+            rocs=best_rocs,
+            title='Best mean ROC for all strategies',
+            font_size=self.font_size,
+        )
 
     def plot_conf_matrix(self, conf_matrix, job_index):
-        plt.figure()
-        plt.tight_layout()
-        conf_matrix = metrics.ConfusionMatrixDisplay(conf_matrix)
-        conf_matrix.plot(cmap='Blues', values_format='.2f')
-        plt.savefig(os.path.join(self.report_dir, f'confusion_matrix_strat_{job_index}.{self.plot_format}'), dpi=300)
-        plt.clf()
+        submit_plot(
+            self.config,
+            'conf_matrix',
+            os.path.join(self.report_dir, f'confusion_matrix_strat_{job_index}.{self.plot_format}'),
+            matrix=conf_matrix,
+            font_size=self.font_size,
+        )
 
     def plot_heatmaps(self, mean_scores):
         cmaps = ['Blues', 'Greens', 'Reds', 'Purples', 'Oranges', 'Greys', 'YlGnBu', 'YlOrRd', 'PuBu', 'PuRd']
         for i, score in enumerate(self.metrics_to_plot):
-            fig = plt.figure()
-            sns.heatmap(
-                mean_scores[score],
-                annot=True,
+            submit_plot(
+                self.config,
+                'score_heatmap',
+                os.path.join(self.report_dir, f'results_heatmap_{self.metrics_to_plot[i]}.{self.plot_format}'),
+                scores=mean_scores[score],
                 xticklabels=[f'Strat. {i+1}' for i in range(len(self.job_names))],
-                yticklabels=True,
-                vmin=0.5,
-                vmax=0.81,
                 cmap=cmaps[i],
-                fmt='.2g',
-            )
-            plt.xticks(rotation=45)
-            plt.yticks(rotation=0)
-            plt.tight_layout()
-            plt.savefig(
-                os.path.join(self.report_dir, f'results_heatmap_{self.metrics_to_plot[i]}.{self.plot_format}'), dpi=300
+                font_size=self.font_size,
             )
-            plt.close(fig)
 
     def init_scoring(self):
         """Find value corresponding to a bad score given the scoring metric, and return whether higher is better"""
@@ -472,17 +457,17 @@ class CollectResults(DataHandler):
         all_ids = self.get_frame().index
         predictions_with_id = pd.DataFrame(index=all_ids, columns=self.seeds)
         best_n_top = verification_scores['n_top'].loc[best_model, best_job]
-        best_job = f'{best_job}_{best_n_top}'
-        data_splitter = DataSplit(self.config)
+        data_splitter = DataSplit(self.config, self.context)
         for seed in self.seeds:
-            data_splitter(seed, 0)
-            test_set = data_splitter.get_store('frame', seed, 'test')
-            test_ids = test_set.index
-            try:
-                predictions = self.get_store('score', seed, best_job)[best_model]['probas'][0]
-            except IndexError:
-                pass  # no predictions available for this seed
-            predictions_with_id.loc[test_ids, seed] = predictions
+            predictions = self.get_predictions(seed, best_job, best_n_top, best_model, n_bootstraps=1)
+            if not predictions['probas']:
+                continue  # no predictions available for this seed
+            if predictions['sample_id'][0] is not None:
+                test_ids = all_ids[all_ids.astype(str).get_indexer(predictions['sample_id'][0])]
+            else:  # results of previous versions do not store sample ids -> rebuild data split
+                data_splitter(seed, 0)
+                test_ids = data_splitter.get_store('frame', seed, 'test').index
+            predictions_with_id.loc[test_ids, seed] = predictions['probas'][0]
 
         predictions_with_id = predictions_with_id.agg('mean', axis=1)
         predictions_with_id = pd.DataFrame(
@@ -512,7 +497,8 @@ def collect_results() -> None:
         warnings.simplefilter("ignore")
         os.environ["PYTHONWARNINGS"] = "ignore"
 
-    CollectResults(config)()
+    with PlotRenderer(config):  # renders queued plots while the results are collected
+        CollectResults(config)()
     logger.info('Results collected successfully.')
 
 
@@ -0,0 +1,31 @@
+import os
+import sys
+
+from loguru import logger
+
+from pipeline_tabular.config_manager import ConfigManager
+from pipeline_tabular.data_handler.journal import ResultJournal
+from pipeline_tabular.run.work_queue import init_work_queue, work_queue_path
+
+
+def compact_results() -> None:
+    """Merge all result journal segments of the configured experiment into a single segment"""
+    config = ConfigManager()(save=False)
+    logger.remove()
+    logger.add(sys.stderr, level=config.meta.logging_level)
+
+    experiment_dir = os.path.join(config.meta.output_dir, config.meta.experiment)
+    if os.path.exists(work_queue_path(config)):  # seeds were distributed over several nodes
+        work_queue = init_work_queue(config)
+        counts = work_queue.counts(config.meta.experiment)
+        if counts['pending'] or counts['running']:  # workers still append to their journal segments
+            logger.error(f'Work queue is not drained yet, queue state -> {counts}')
+            sys.exit(1)
+        if counts['failed']:
+            logger.warning(f'{counts["failed"]} work units failed, their seeds are incomplete, see {work_queue.path}')
+    n_records = ResultJournal(experiment_dir).compact()
+    logger.info(f'Result journal compacted successfully ({n_records} seeds).')
+
+
+if __name__ == '__main__':
+    compact_results()
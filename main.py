@@ -1,27 +1,73 @@
 import os
 import sys
+import argparse
 import warnings
 
 from loguru import logger
 
 from pipeline_tabular.config_manager import ConfigManager
+from pipeline_tabular.data_handler.data_handler import DataHandler, RunContext
 from pipeline_tabular.utils.inspections import CleanUp, DataExploration
+from pipeline_tabular.utils.plots import PlotRenderer
 from pipeline_tabular.run.data_reader import DataReader
 from pipeline_tabular.run.run import Run
+from pipeline_tabular.run.work_queue import init_work_queue, worker_name
+
+ROLES = ['local', 'publish', 'worker']
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Run the pipeline as defined in config.yaml of the current directory')
+    parser.add_argument(
+        '--role',
+        choices=ROLES,
+        default='local',
+        help='local: run all seeds on this machine, publish: prepare the data and publish a work unit per seed, '
+        'worker: run published units until the queue is drained (any number of nodes sharing the output directory)',
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='record wall time, CPU time and peak RSS of all stages per seed and job, saved as timings.parquet and '
+        'a flame-style summary (timings.folded, timings_summary.txt) in the experiment directory',
+    )
+    return parser.parse_args()
 
 
 def main() -> None:
-    config = ConfigManager()()
+    args = parse_args()
+    config = ConfigManager()(save=args.role != 'worker')  # job config is saved by the publisher
     logger.remove()
     logger.add(sys.stderr, level=config.meta.logging_level)
     if config.meta.ignore_warnings:
         warnings.simplefilter("ignore")
         os.environ["PYTHONWARNINGS"] = "ignore"
 
-    DataReader(config)()
-    CleanUp(config)()
-    DataExploration(config)()
-    Run(config)()
+    experiment_dir = os.path.join(config.meta.output_dir, config.meta.experiment)
+    context = RunContext(args.profile)  # frame and results of this run, shared by all stages
+    profiler = context.profiler
+    if args.role == 'worker':
+        DataHandler(context).load_frame(experiment_dir)
+        worker = worker_name()
+        with PlotRenderer(config), profiler.stage('run'):
+            Run(config, context).work(init_work_queue(config), worker)
+        profiler.save(experiment_dir, f'timings_{worker}')  # one file per worker node
+        return
+
+    with profiler.stage('read'):
+        DataReader(config, context)()
+    with profiler.stage('clean'):
+        CleanUp(config, context)()
+    exploration = DataExploration(config, context)
+    with profiler.stage('explore'):  # start of the exploration only if it runs in the background
+        exploration()
+    if args.role == 'publish':
+        Run(config, context).publish(init_work_queue(config))
+    else:
+        with PlotRenderer(config), profiler.stage('run'):  # renders queued plots while the run computes
+            Run(config, context)()
+    exploration.join()
+    profiler.save(experiment_dir)
 
 if __name__ == '__main__':
     main()
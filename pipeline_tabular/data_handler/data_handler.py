@@ -1,10 +1,17 @@
 import os
 import json
+import threading
 
+import numpy as np
 import pandas as pd
 from collections import defaultdict
 from loguru import logger
 
+from pipeline_tabular.data_handler.frame_snapshot import FrameSnapshot
+from pipeline_tabular.data_handler.journal import ResultJournal
+from pipeline_tabular.data_handler.prediction_store import PredictionStore
+from pipeline_tabular.utils.profiler import Profiler
+
 
 class NestedDefaultDict(defaultdict):
     """Nested dict, which can be dynamically expanded"""
@@ -15,25 +22,56 @@ class NestedDefaultDict(defaultdict):
     def __repr__(self):
         return repr(dict(self))
 
+    def __reduce__(self):  # default_factory is fixed, pickle items only (e.g. for worker processes)
+        return type(self), (), None, None, iter(self.items())
+
+
+class RunContext:
+    """Frame and result stores of a single pipeline run, shared by all stages bound to this context"""
+
+    def __init__(self, profile: bool = False) -> None:
+        self.profiler = Profiler(profile)  # records timings of all stages if active
+        self.state = {
+            '_frame_store': NestedDefaultDict(),
+            '_feature_store': NestedDefaultDict(),
+            '_feature_score_store': NestedDefaultDict(),
+            '_seed_feature_score_store': NestedDefaultDict(),
+            '_score_store': NestedDefaultDict(),
+            '_prediction_store': PredictionStore(),
+            '_journal_dir': None,  # unit checkpoints are only written if set, e.g. by Run
+            '_journal_segment': 'main',  # e.g. one segment per worker node
+            '_profiler': self.profiler,
+            '_frame': None,
+            '_lock': threading.RLock(),
+            'context': self,
+        }
+
+    def seed_context(self, seed: int) -> 'SeedContext':
+        """Create a context for the stages processing a single seed"""
+        return SeedContext(self, seed)
+
+
+class SeedContext:
+    """Per-seed view of a RunContext, result stores are shared but data splits and stage attributes are private"""
+
+    def __init__(self, run_context: RunContext, seed: int) -> None:
+        self.run_context = run_context
+        self.seed = str(seed)
+        self.state = dict(run_context.state)  # shallow copy -> result stores are shared with the run
+        self.state['_frame_store'] = NestedDefaultDict()
+        self.state['context'] = self
+
 
 class DataHandler:
-    """Borg pattern, which is used to share frame between classes"""
-
-    shared_state = {
-        '_frame_store': NestedDefaultDict(),
-        '_feature_store': NestedDefaultDict(),
-        '_feature_score_store': NestedDefaultDict(),
-        '_score_store': NestedDefaultDict(),
-        '_frame': None,
-    }
-
-    def __init__(self) -> None:
-        self._frame_store = NestedDefaultDict()
-        self._feature_store = NestedDefaultDict()
-        self._feature_score_store = NestedDefaultDict()
-        self._score_store = NestedDefaultDict()
-        self._frame = None
-        self.__dict__ = self.shared_state  # borg design pattern
+    """Stages bound to the same context share their state (Borg pattern scoped to a RunContext/SeedContext)"""
+
+    default_context = RunContext()  # used by all stages created without an explicit context
+    shared_state = default_context.state
+
+    def __init__(self, context: RunContext or SeedContext = None) -> None:
+        if context is None:
+            context = self.default_context
+        self.__dict__ = context.state  # borg design pattern
 
     def set_frame(self, frame: pd.DataFrame) -> None:
         """Sets the frame"""
@@ -68,17 +106,15 @@ class DataHandler:
             self._feature_store[seed][boot_iter][job_name] = data
             logger.trace(f'Feature data set -> {type(data)}')
 
-            if job_name not in self._feature_score_store.keys():
-                self._feature_score_store[job_name] = NestedDefaultDict()
             scores = len(data) * [1]
             scores[: min(10, len(data))] = range(
                 10, 10 - min(10, len(data)), -1
             )  # first min(10, len(features)) features get rank score, rest get score of 1
-            for i, feature in enumerate(data):  # calculate feature importance scores on the fly
-                if feature in self._feature_score_store[job_name].keys():
-                    self._feature_score_store[job_name][feature] += scores[i]
-                else:
-                    self._feature_score_store[job_name][feature] = scores[i]
+            with self._lock:  # feature scores are shared by all seeds of a run
+                self._add_feature_scores(self._feature_score_store, job_name, dict(zip(data, scores)))
+                self._add_feature_scores(
+                    self._seed_feature_score_store[seed], job_name, dict(zip(data, scores))
+                )  # keep contribution of each seed separately to merge results of parallel seeds
         elif 'score' in name:
             if seed not in self._score_store.keys():
                 self._score_store[seed] = {}
@@ -87,6 +123,21 @@ class DataHandler:
         else:
             raise ValueError(f'Invalid data name to set store data -> {name}, allowed -> frame, feature, score')
 
+    def get_predictions(self, seed: int, job_name: str, n_top: int, model: str, n_bootstraps: int) -> dict:
+        """Returns probas, true and pred for all bootstraps of a seed, i.e. lists with one array per bootstrap"""
+        predictions = {'probas': [], 'true': [], 'pred': [], 'sample_id': []}
+        for boot_iter in range(n_bootstraps):
+            columns = self._prediction_store.select(seed, boot_iter, job_name, n_top, model)
+            if columns is None:  # results of previous versions keep predictions as lists in the score store
+                scores = self.get_store('score', seed, f'{job_name}_{n_top}').get(model, {})
+                if len(scores.get('probas', [])) <= boot_iter:
+                    break
+                columns = {column: np.array(scores[column][boot_iter]) for column in ['probas', 'true', 'pred']}
+                columns['sample_id'] = None
+            for column in predictions:
+                predictions[column].append(columns[column])
+        return predictions
+
     def get_store(self, name: str, seed: int, job_name: str = None, boot_iter: int = None) -> pd.DataFrame:
         """Returns the store value"""
         seed = str(seed)
@@ -109,22 +160,115 @@ class DataHandler:
                 return {}
         raise ValueError(f'Invalid data name to get store data -> {name}, allowed -> frame, feature, score')
 
-    def save_frame(self, out_dir) -> None:
-        """Save frame"""
-        self._frame.to_csv(os.path.join(out_dir, 'frame.csv'), index=True)
+    @staticmethod
+    def _add_feature_scores(store: dict, job_name: str, feature_scores: dict) -> None:
+        """Add feature importance scores to a feature score store"""
+        if job_name not in store.keys():
+            store[job_name] = NestedDefaultDict()
+        for feature, score in feature_scores.items():  # calculate feature importance scores on the fly
+            if feature in store[job_name].keys():
+                store[job_name][feature] += score
+            else:
+                store[job_name][feature] = score
 
-    def save_intermediate_results(self, out_dir) -> None:
-        with open(os.path.join(out_dir, 'features.json'), 'w') as feature_file:
-            json.dump(self._feature_store, feature_file)
-        with open(os.path.join(out_dir, 'feature_scores.json'), 'w') as feature_score_file:
-            json.dump(self._feature_score_store, feature_score_file)
-        with open(os.path.join(out_dir, 'scores.json'), 'w') as score_file:
-            json.dump(self._score_store, score_file)
+    def export_seed_results(self, seed: int) -> dict:
+        """Collect all results computed for a seed, e.g. to send them back from a worker process"""
+        seed = str(seed)
+        return {
+            'features': dict(self._feature_store.get(seed, {})),
+            'feature_scores': dict(self._seed_feature_score_store.get(seed, {})),
+            'scores': dict(self._score_store.get(seed, {})),
+        }
+
+    def merge_seed_results(self, seed: int, results: dict) -> None:
+        """Merge results exported by export_seed_results into the stores"""
+        seed = str(seed)
+        if results['features']:
+            self._feature_store[seed] = NestedDefaultDict(results['features'])
+        with self._lock:
+            for job_name, feature_scores in results['feature_scores'].items():
+                self._add_feature_scores(self._feature_score_store, job_name, feature_scores)
+                self._add_feature_scores(self._seed_feature_score_store[seed], job_name, feature_scores)
+        if results['scores']:
+            self._score_store[seed] = results['scores']
+        if 'predictions' in results:  # only sent by worker processes, the journal holds scalar results only
+            self._prediction_store.merge(results['predictions'])
+
+    def save_frame(self, out_dir, export_csv: bool = False) -> None:
+        """Save frame as binary snapshot and optionally as csv"""
+        FrameSnapshot(out_dir).save(self._frame)
+        if export_csv:
+            self._frame.to_csv(os.path.join(out_dir, 'frame.csv'), index=True)
+
+    def save_intermediate_results(self, out_dir: str, seed: int) -> None:
+        """Save the predictions of a seed and append its results to the result journal"""
+        self._prediction_store.save(out_dir, seed)
+        ResultJournal(out_dir, self._journal_segment).append([{'seed': str(seed), **self.export_seed_results(seed)}])
+
+    def unit_done(self, seed: int, boot_iter: int, job_name: str, n_top: int = None, model: str = None) -> bool:
+        """Whether the results of a unit are available, selection units are (seed, boot_iter, job_name)
+
+        Verification units are (seed, boot_iter, job_name, n_top, model), pos_rate is stored last by evaluate.
+        """
+        if n_top is None:
+            return bool(self._feature_store.get(str(seed), {}).get(str(boot_iter), {}).get(job_name))
+        scores = self.get_store('score', seed, f'{job_name}_{n_top}').get(model, {})
+        return len(scores.get('pos_rate', [])) > boot_iter
+
+    def checkpoint_unit(
+        self, seed: int, boot_iter: int, job_name: str, n_top: int = None, model: str = None, **results
+    ) -> None:
+        """Append the results of a finished unit to the result journal, an interrupted seed resumes after this unit"""
+        if self._journal_dir is None:
+            return
+        unit = {'boot_iter': int(boot_iter), 'job_name': job_name, 'n_top': n_top, 'model': model}
+        ResultJournal(self._journal_dir, self._journal_segment).append([{'seed': str(seed), 'unit': unit, **results}])
+
+    def merge_unit_results(self, record: dict) -> None:
+        """Merge the results of a unit checkpointed by checkpoint_unit into the stores"""
+        seed, unit = record['seed'], record['unit']
+        if self.unit_done(seed, **unit):
+            return
+        if unit['n_top'] is None:  # selection, feature scores count every step like in Selection
+            for features in record['step_features']:
+                self.set_store('feature', seed, unit['job_name'], features, unit['boot_iter'])
+            return
+        job_name = f'{unit["job_name"]}_{unit["n_top"]}'
+        scores = self.get_store('score', seed, job_name)
+        model_scores = scores.setdefault(unit['model'], {})
+        for score, value in record['scores'].items():
+            values = model_scores.setdefault(score, [])
+            if len(values) == unit['boot_iter']:  # not merged yet
+                values.append(value)
+        self.set_store('score', seed, job_name, scores)
+        predictions = record['predictions']
+        self._prediction_store.add(
+            seed,
+            unit['boot_iter'],
+            unit['job_name'],
+            unit['n_top'],
+            unit['model'],
+            predictions['sample_id'],
+            predictions['probas'],
+            predictions['true'],
+            predictions['pred'],
+        )
 
     def load_frame(self, out_dir) -> None:
-        self._frame = pd.read_csv(os.path.join(out_dir, 'frame.csv'), index_col=0)
+        """Load frame from the binary snapshot, experiments saved by previous versions only have a csv"""
+        snapshot = FrameSnapshot(out_dir)
+        if snapshot.exists():
+            self._frame = snapshot.load()
+        else:
+            self._frame = pd.read_csv(os.path.join(out_dir, 'frame.csv'), index_col=0)
 
     def load_intermediate_results(self, out_dir):
+        """Load results saved by previous versions as full JSON files and replay the result journal"""
+        self._feature_store = NestedDefaultDict()  # e.g. CollectResults loads several experiments in a row
+        self._feature_score_store = NestedDefaultDict()
+        self._seed_feature_score_store = NestedDefaultDict()
+        self._score_store = NestedDefaultDict()
+        self._prediction_store.load(out_dir)
         try:
             with open(os.path.join(out_dir, 'features.json'), 'r') as feature_file:
                 self._feature_store = json.load(feature_file)
@@ -138,8 +282,28 @@ class DataHandler:
         try:
             with open(os.path.join(out_dir, 'scores.json'), 'r') as score_file:
                 self._score_store = json.load(score_file)
-                logger.info(f'Scores loaded for {len(self._score_store.keys())} seeds')
+            scores_found = True
         except FileNotFoundError:
-            return False  # need to init scores nested dict
+            scores_found = False
+
+        records, unit_records = ResultJournal(out_dir).resume_state()
+        for seed, record in records.items():
+            self.merge_seed_results(seed, record)
+        for seed_unit_records in unit_records.values():  # units of interrupted bootstraps
+            for record in seed_unit_records:
+                self.merge_unit_results(record)
+        if records or unit_records or scores_found:
+            logger.info(f'Scores loaded for {len(self._score_store.keys())} seeds')
+            return True
+
+        return False  # need to init scores nested dict
 
-        return True  # when all files could be read
+    def load_seed_results(self, out_dir: str, seed: int) -> bool:
+        """Load the predictions and the most recent journal record of a single seed, e.g. on a worker node"""
+        self._prediction_store.load(out_dir, seed)
+        records, unit_records = ResultJournal(out_dir).resume_state()
+        if str(seed) in records:
+            self.merge_seed_results(seed, records[str(seed)])
+        for record in unit_records.get(str(seed), []):
+            self.merge_unit_results(record)
+        return str(seed) in records or str(seed) in unit_records
@@ -0,0 +1,80 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+
+class FrameSnapshot:
+    """Binary snapshot of a frame, one .npy block per dtype and the index plus a JSON file with columns and dtypes"""
+
+    def __init__(self, out_dir: str, name: str = 'frame') -> None:
+        self.out_dir = out_dir
+        self.name = name
+        self.meta_path = os.path.join(out_dir, f'{name}.json')
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.meta_path)
+
+    def save(self, frame: pd.DataFrame) -> None:
+        """Save the frame, the meta file is written last so that a snapshot is only visible once complete
+
+        Blocks of a previous snapshot with other dtypes are removed once the new snapshot is complete.
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        previous_files = self._files(self._read_meta()) if self.exists() else set()
+        blocks = {}
+        for position, dtype in enumerate(frame.dtypes):
+            blocks.setdefault(str(dtype), []).append(position)
+        meta = {
+            'columns': list(frame.columns),
+            'index_file': f'{self.name}_index.npy',  # keeps the index dtype, e.g. datetime64
+            'index_name': frame.index.name,
+            'blocks': [],
+        }
+        np.save(os.path.join(self.out_dir, meta['index_file']), frame.index.to_numpy(), allow_pickle=True)
+        for dtype, positions in blocks.items():
+            file_name = f'{self.name}_{dtype}.npy'
+            np.save(os.path.join(self.out_dir, file_name), frame.iloc[:, positions].to_numpy(dtype=dtype))
+            meta['blocks'].append({'file': file_name, 'dtype': dtype, 'positions': positions})
+        with open(f'{self.meta_path}.tmp', 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file, default=str)
+        os.replace(f'{self.meta_path}.tmp', self.meta_path)
+        for file_name in previous_files - self._files(meta):
+            os.remove(os.path.join(self.out_dir, file_name))
+
+    def load(self) -> pd.DataFrame:
+        """Map the blocks into memory without parsing, pages are only read when accessed
+
+        Blocks are mapped copy-on-write, i.e. the frame can be modified without changing the snapshot. Frames with a
+        single dtype are not copied at all, frames with several dtypes are copied once to restore the column order.
+        """
+        meta = self._read_meta()
+        if 'index_file' in meta:
+            index = pd.Index(np.load(os.path.join(self.out_dir, meta['index_file']), allow_pickle=True))
+        else:  # snapshots of previous versions store the index in the meta file
+            index = pd.Index(meta['index'])
+        index.name = meta['index_name']
+        columns = pd.Index(meta['columns'])
+        frames = []
+        for block in meta['blocks']:
+            object_block = block['dtype'] == 'object'  # object blocks are pickled and cannot be mapped
+            values = np.load(
+                os.path.join(self.out_dir, block['file']),
+                mmap_mode=None if object_block else 'c',
+                allow_pickle=object_block,
+            )
+            frames.append(pd.DataFrame(values, index=index, columns=columns[block['positions']], copy=False))
+        if len(frames) == 1:
+            return frames[0]
+        order = np.argsort(np.concatenate([block['positions'] for block in meta['blocks']]))
+        return pd.concat(frames, axis=1, copy=False).iloc[:, order]
+
+    def _read_meta(self) -> dict:
+        with open(self.meta_path, 'r', encoding='utf-8') as meta_file:
+            return json.load(meta_file)
+
+    @staticmethod
+    def _files(meta: dict) -> set:
+        """Files of a snapshot besides its meta file"""
+        return {block['file'] for block in meta['blocks']} | ({meta['index_file']} if 'index_file' in meta else set())
@@ -0,0 +1,84 @@
+import os
+import json
+import glob
+import time
+
+from loguru import logger
+
+
+class ResultJournal:
+    """Append-only journal of seed results, stored as JSON lines segments in <out_dir>/journal"""
+
+    compacted_segment = '000_compacted'  # sorted first, i.e. replayed before all other segments
+
+    def __init__(self, out_dir: str, segment: str = 'main') -> None:
+        self.journal_dir = os.path.join(out_dir, 'journal')
+        self.segment = segment
+
+    def append(self, records: list) -> None:
+        """Append records to this journal segment, only the new records are written"""
+        os.makedirs(self.journal_dir, exist_ok=True)
+        written = time.time()  # orders records of different segments, e.g. of several worker nodes
+        with open(self._segment_path(self.segment), 'a', encoding='utf-8') as journal_file:
+            journal_file.write(''.join(json.dumps({**record, 'written': written}) + '\n' for record in records))
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def replay(self) -> list:
+        """Read all records of all segments in the order they were written"""
+        records = []
+        for segment_path in self._segment_paths():
+            with open(segment_path, 'r', encoding='utf-8') as journal_file:
+                for line_number, line in enumerate(journal_file):
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:  # e.g. last line of a segment interrupted while writing
+                        logger.warning(f'Skipping corrupt journal record {segment_path}:{line_number + 1}')
+        return records
+
+    def latest_records(self) -> dict:
+        """Return the most recent record for each seed"""
+        return self.resume_state()[0]
+
+    def resume_state(self) -> tuple:
+        """Most recent seed record of each seed and the unit records written after it, i.e. of unfinished bootstraps
+
+        Seed records hold all results of a seed, unit records (with a unit key) the results of a single selection
+        or verification unit. Records of previous versions have no time and keep their order.
+        """
+        seed_records, unit_records = {}, {}
+        for record in sorted(self.replay(), key=lambda record: record.get('written', 0)):  # stable sort
+            if 'unit' in record:
+                unit_records.setdefault(record['seed'], []).append(record)
+            else:
+                seed_records[record['seed']] = record
+                unit_records[record['seed']] = []  # included in the seed record
+        return seed_records, unit_records
+
+    def compact(self) -> int:
+        """Merge all segments into a single segment, keeps the latest record of each seed and its newer unit records"""
+        segment_paths = self._segment_paths()
+        if not segment_paths:
+            return 0
+        seed_records, unit_records = self.resume_state()
+        records = list(seed_records.values()) + [record for records in unit_records.values() for record in records]
+        tmp_path = f'{self._segment_path(self.compacted_segment)}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as journal_file:
+            journal_file.write(''.join(json.dumps(record) + '\n' for record in records))
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(tmp_path, self._segment_path(self.compacted_segment))  # atomic, journal is never incomplete
+        for segment_path in segment_paths:
+            if segment_path != self._segment_path(self.compacted_segment):
+                os.remove(segment_path)
+        logger.info(
+            f'Compacted {len(segment_paths)} journal segments into {len(seed_records)} seed records '
+            f'and {len(records) - len(seed_records)} unit records'
+        )
+        return len(seed_records)
+
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.journal_dir, f'{segment}.jsonl')
+
+    def _segment_paths(self) -> list:
+        return sorted(glob.glob(os.path.join(self.journal_dir, '*.jsonl')))
@@ -0,0 +1,90 @@
+import os
+import glob
+import json
+import uuid
+import pickle
+import hashlib
+from collections import OrderedDict
+
+from loguru import logger
+
+
+class MemoCache:
+    """Least recently used in-memory cache with an optional on-disk store of pickled values"""
+
+    def __init__(self, max_entries: int = 16, cache_dir: str = None, max_disk_mb: float = None) -> None:
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_mb * 1024**2 if max_disk_mb is not None else None
+        self._entries = OrderedDict()  # key -> value, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Build a cache key from JSON serialisable parts"""
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: str, default=None):
+        """Return the cached value, or default if the key is neither in memory nor on disk"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        disk_path = self._disk_path(key)
+        if disk_path is not None and os.path.isfile(disk_path):
+            try:
+                with open(disk_path, 'rb') as cache_file:
+                    value = pickle.load(cache_file)
+            except (OSError, EOFError, pickle.UnpicklingError):  # e.g. file removed by another process
+                logger.warning(f'Skipping unreadable cache entry {disk_path}')
+            else:
+                os.utime(disk_path)  # mark as recently used for disk eviction
+                self._set_memory(key, value)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return default
+
+    def set(self, key: str, value) -> None:
+        """Cache a value in memory and, if configured, on disk"""
+        self._set_memory(key, value)
+        disk_path = self._disk_path(key)
+        if disk_path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{disk_path}.{os.getpid()}_{uuid.uuid4().hex}.tmp'  # seeds may write the same entry at once
+            with open(tmp_path, 'wb') as cache_file:
+                pickle.dump(value, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, disk_path)  # atomic, concurrent readers never see partial entries
+            self._evict_disk()
+
+    def _set_memory(self, key: str, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def _evict_disk(self) -> None:
+        """Remove least recently used entries until the disk store fits into max_disk_mb"""
+        if self.max_disk_bytes is None:
+            return
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, '*.pkl')):
+            try:
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:  # removed in the meantime
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
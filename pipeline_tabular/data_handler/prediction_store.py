@@ -0,0 +1,113 @@
+import os
+import glob
+
+import numpy as np
+
+
+class PredictionStore:
+    """Per-sample predictions stored in typed columns, saved as one .npz file per seed in <out_dir>/predictions"""
+
+    def __init__(self) -> None:
+        self._units = {}  # (seed, boot_iter, job_name, n_top, model) -> columns of a single verification
+
+    def add(self, seed, boot_iter, job_name, n_top, model, sample_ids, probas, true, pred) -> None:
+        """Add the predictions of a single verification, replaces earlier predictions of the same unit"""
+        self._units[(str(seed), int(boot_iter), job_name, int(n_top), model)] = {
+            'sample_id': np.asarray(sample_ids).astype(str),
+            'probas': np.asarray(probas, dtype=np.float32),
+            'true': np.asarray(true),
+            'pred': np.asarray(pred),
+        }
+
+    def select(self, seed, boot_iter, job_name, n_top, model) -> dict:
+        """Return the columns of a single verification, or None if not available"""
+        return self._units.get((str(seed), int(boot_iter), job_name, int(n_top), model))
+
+    def export(self, seed) -> dict:
+        """Return all columns of a seed, e.g. to send them back from a worker process"""
+        units = [unit for unit in self._units if unit[0] == str(seed)]
+        if not units:
+            return {}
+        job_names = sorted({unit[2] for unit in units})
+        model_names = sorted({unit[4] for unit in units})
+        lengths = [len(self._units[unit]['probas']) for unit in units]
+        columns = {
+            column: np.concatenate([self._units[unit][column] for unit in units])
+            for column in ['sample_id', 'probas', 'true', 'pred']
+        }
+        labels = np.concatenate([columns['true'], columns['pred']])
+        if np.array_equal(labels, np.round(labels)) and np.abs(labels).max(initial=0) < 128:  # class labels
+            label_type = np.int8
+        else:  # regression targets
+            label_type = np.float32
+        columns['true'] = columns['true'].astype(label_type)
+        columns['pred'] = columns['pred'].astype(label_type)
+        columns['seed'] = np.repeat([np.int64(unit[0]) for unit in units], lengths)
+        columns['boot_iter'] = np.repeat([unit[1] for unit in units], lengths).astype(np.int16)
+        columns['job'] = np.repeat([job_names.index(unit[2]) for unit in units], lengths).astype(np.int16)
+        columns['n_top'] = np.repeat([unit[3] for unit in units], lengths).astype(np.int16)
+        columns['model'] = np.repeat([model_names.index(unit[4]) for unit in units], lengths).astype(np.int16)
+        columns['job_names'] = np.array(job_names)
+        columns['model_names'] = np.array(model_names)
+        return columns
+
+    def merge(self, columns: dict) -> None:
+        """Add columns exported by export, e.g. by a worker process"""
+        if columns:
+            self._add_table(self._decode(columns))
+
+    def save(self, out_dir: str, seed) -> None:
+        """Save all predictions of a seed"""
+        columns = self.export(seed)
+        if not columns:
+            return
+        predictions_dir = os.path.join(out_dir, 'predictions')
+        os.makedirs(predictions_dir, exist_ok=True)
+        file_path = os.path.join(predictions_dir, f'seed_{seed}.npz')
+        with open(f'{file_path}.tmp', 'wb') as prediction_file:
+            np.savez(prediction_file, **columns)
+        os.replace(f'{file_path}.tmp', file_path)  # atomic, never leaves a corrupt file behind
+
+    def load(self, out_dir: str, seed=None) -> int:
+        """Load all saved predictions (or those of a single seed) with a single vectorised read per file"""
+        self._units = {}
+        file_name = '*.npz' if seed is None else f'seed_{seed}.npz'
+        file_paths = sorted(glob.glob(os.path.join(out_dir, 'predictions', file_name)))
+        if not file_paths:
+            return 0
+        tables = []
+        for file_path in file_paths:
+            with np.load(file_path) as prediction_file:
+                tables.append(self._decode(dict(prediction_file)))
+        self._add_table({column: np.concatenate([table[column] for table in tables]) for column in tables[0]})
+        return len(file_paths)
+
+    @staticmethod
+    def _decode(columns: dict) -> dict:
+        """Replace job and model codes by their names, codes are only valid within a single file"""
+        table = {column: values for column, values in columns.items() if column not in ['job_names', 'model_names']}
+        table['job'] = columns['job_names'][columns['job']]
+        table['model'] = columns['model_names'][columns['model']]
+        return table
+
+    def _add_table(self, table: dict) -> None:
+        """Split a table into verification units, units are views on the sorted table"""
+        order = np.lexsort((table['model'], table['n_top'], table['job'], table['boot_iter'], table['seed']))
+        table = {column: values[order] for column, values in table.items()}
+        unit_start = np.zeros(len(order), dtype=bool)
+        unit_start[:1] = True
+        for key in ['seed', 'boot_iter', 'job', 'n_top', 'model']:
+            unit_start[1:] |= table[key][1:] != table[key][:-1]
+        starts = np.flatnonzero(unit_start)
+        stops = np.append(starts[1:], len(order))
+        for start, stop in zip(starts, stops):
+            unit = (
+                str(table['seed'][start]),
+                int(table['boot_iter'][start]),
+                str(table['job'][start]),
+                int(table['n_top'][start]),
+                str(table['model'][start]),
+            )
+            self._units[unit] = {
+                column: table[column][start:stop] for column in ['sample_id', 'probas', 'true', 'pred']
+            }
@@ -1,39 +1,142 @@
 import os
+import re
+import uuid
 
+import numpy as np
 import pandas as pd
 from loguru import logger
+from pandas.api.types import is_extension_array_dtype, is_numeric_dtype, is_string_dtype
 
 from pipeline_tabular.data_handler.data_handler import DataHandler
+from pipeline_tabular.data_handler.memo_cache import MemoCache
+from pipeline_tabular.utils.inspections.clean_up import CleanUp
 
 
 class DataReader(DataHandler):
-    """Reads excel, csv, or dataframe and returns a dataframe"""
+    """Reads excel, csv, parquet, feather, or dataframe and returns a dataframe"""
 
-    def __init__(self, config) -> None:
-        super().__init__()
+    def __init__(self, config, context=None) -> None:
+        super().__init__(context)
         self.config = config
         self.file = config.meta.input_file
         if isinstance(self.file, str):
             if not os.path.isfile(self.file):
                 raise FileNotFoundError(f'Invalid file path, check -> {self.file}')
+        self.target_label = config.meta.target_label
+        self.label_as_index = config.inspection.label_as_index
+        self.drop_regexes = []
+        if config.inspection.manual_clean:  # same columns as dropped by CleanUp.drop_columns_rex, but before parsing
+            regex = config.inspection.manual_strategy.drop_columns_regex
+            self.drop_regexes = [re.compile(r'{}'.format(expr)) for expr in CleanUp._clean_up_regex(regex) or []]
+        self.cache_dir = None
+        if config.meta.input_cache:
+            self.cache_dir = os.path.join(config.meta.output_dir, 'cache', 'input')
 
     def __call__(self) -> None:
         self.read_file()
         self.set_frame(self.frame)
 
     def read_file(self):
-        """Reads excel, csv, or pd dataframe and returns a pd dataframe"""
+        """Reads excel, csv, parquet, feather, or pd dataframe and returns a pd dataframe"""
+        if isinstance(self.file, pd.DataFrame):
+            logger.info(f'Reading dataframe -> {self.file}')
+            self.frame = self.file
+            return
+
+        cache_path = self.cache_path()
+        if cache_path is not None and os.path.isfile(cache_path):
+            logger.info(f'Reading cached parquet copy of {self.file} -> {cache_path}')
+            self.frame = self.normalise_dtypes(pd.read_parquet(cache_path, engine='fastparquet'))
+            return
+
         if self.file.endswith('.csv'):
             logger.info(f'Reading csv file -> {self.file}')
-            self.frame = pd.read_csv(self.file)
+            self.frame = pd.read_csv(self.file, usecols=self.keep_column)
 
         elif self.file.endswith('.xlsx'):
             logger.info(f'Reading excel file -> {self.file}')
-            self.frame = pd.read_excel(self.file)
+            self.frame = pd.read_excel(self.file, usecols=self.keep_column)
 
-        elif isinstance(self.file, pd.DataFrame):
-            logger.info(f'Reading dataframe -> {self.file}')
-            self.frame = self.file
+        elif self.file.endswith('.parquet'):
+            logger.info(f'Reading parquet file -> {self.file}')
+            from fastparquet import ParquetFile
+
+            columns = [column for column in ParquetFile(self.file).columns if self.keep_column(column)]
+            self.frame = pd.read_parquet(self.file, engine='fastparquet', columns=columns)
+
+        elif self.file.endswith('.feather'):
+            logger.info(f'Reading feather file -> {self.file}')
+            self.frame = pd.read_feather(self.file)  # needs pyarrow
+            self.frame = self.frame[[column for column in self.frame.columns if self.keep_column(column)]]
 
         else:
-            raise ValueError(f'Found invalid file type, allowed is (.csv, .xlsx, dataframe), check -> {self.file}')
+            raise ValueError(
+                'Found invalid file type, allowed is (.csv, .xlsx, .parquet, .feather, dataframe), '
+                f'check -> {self.file}'
+            )
+
+        if isinstance(self.label_as_index, str) and self.label_as_index in self.frame.columns:
+            self.frame = self.frame.set_index(self.label_as_index)
+        self.frame = self.downcast(self.normalise_dtypes(self.frame))
+        if cache_path is not None:
+            self.write_cache(cache_path)
+
+    def keep_column(self, column) -> bool:
+        """Whether a column is needed, columns matching drop_columns_regex are never parsed"""
+        if column in [self.target_label, self.label_as_index]:
+            return True
+        return not any(expression.search(str(column)) for expression in self.drop_regexes)
+
+    @staticmethod
+    def normalise_dtypes(frame: pd.DataFrame) -> pd.DataFrame:
+        """Replace nullable dtypes (e.g. Int64 columns with nulls read from parquet) by the numpy dtypes read_csv
+        returns for the same values, i.e. all input formats reach CleanUp with the same dtypes"""
+        for column, dtype in frame.dtypes.items():
+            if not is_extension_array_dtype(dtype):
+                continue
+            values = frame[column]
+            if is_numeric_dtype(dtype):  # incl. boolean, float if missing values, else int or bool
+                frame[column] = values.to_numpy(dtype=float if values.hasnans else dtype.numpy_dtype, na_value=np.nan)
+            elif is_string_dtype(dtype):
+                frame[column] = values.astype(object).where(values.notna(), np.nan)
+        return frame
+
+    @staticmethod
+    def downcast(frame: pd.DataFrame) -> pd.DataFrame:
+        """Store integer columns in the smallest integer type, floats are kept as is to keep results unchanged"""
+        int_columns = frame.select_dtypes(include='integer').columns
+        if len(int_columns):
+            frame[int_columns] = frame[int_columns].apply(pd.to_numeric, downcast='integer')
+        return frame
+
+    def cache_path(self) -> str:
+        """Path of the parquet copy, changes with the input file and the settings applied while reading"""
+        if self.cache_dir is None:
+            return None
+        stat = os.stat(self.file)
+        key = MemoCache.key(
+            os.path.abspath(self.file),
+            stat.st_size,
+            stat.st_mtime_ns,
+            [expression.pattern for expression in self.drop_regexes],
+            self.label_as_index,
+            self.target_label,
+        )
+        return os.path.join(self.cache_dir, f'{os.path.splitext(os.path.basename(self.file))[0]}_{key[:16]}.parquet')
+
+    def write_cache(self, cache_path: str) -> None:
+        """Write the parquet copy read by later runs"""
+        frame = self.frame.copy()
+        for column in frame.select_dtypes(include='object').columns:  # mixed types, e.g. numbers and 'n.a.'
+            frame[column] = frame[column].where(frame[column].isna(), frame[column].astype(str))
+        tmp_path = f'{cache_path}.{os.getpid()}_{uuid.uuid4().hex}.tmp'  # several nodes may cache the same file
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            frame.to_parquet(tmp_path, engine='fastparquet')
+            os.replace(tmp_path, cache_path)  # atomic, concurrent writers store the same copy, the last one wins
+        except (OSError, ValueError, TypeError) as error:  # e.g. non-string column names
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+            logger.warning(f'Could not cache input file as parquet -> {error}')
+            return
+        logger.info(f'Cached parquet copy of {self.file} -> {cache_path}')
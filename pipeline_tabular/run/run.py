@@ -1,5 +1,7 @@
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
@@ -20,16 +22,18 @@ from pipeline_tabular.utils.data_split import DataSplit
 from pipeline_tabular.utils.helpers import generate_seeds, job_name_cleaner
 from pipeline_tabular.utils.imputers import Imputer
 from pipeline_tabular.utils.normalisers import Normalisers
+from pipeline_tabular.utils.resources import ResourceManager
 from pipeline_tabular.utils.selections import Selection
 from pipeline_tabular.utils.verifications import Verification
-from pipeline_tabular.data_handler.data_handler import DataHandler, NestedDefaultDict
+from pipeline_tabular.data_handler.data_handler import DataHandler, NestedDefaultDict, RunContext
+from pipeline_tabular.run.work_queue import worker_name
 
 
 class Run(DataHandler, Normalisers):
     """Class to run the desired models for multiple seeds/bootstraps as defined in config file"""
 
-    def __init__(self, config) -> None:
-        super().__init__()
+    def __init__(self, config, context: RunContext = None) -> None:
+        super().__init__(context)
         self.config = config
         self.experiment_name = config.meta.experiment
         self.out_dir = config.meta.output_dir
@@ -39,6 +43,10 @@ class Run(DataHandler, Normalisers):
         self.n_bootstraps = config.data_split.n_bootstraps
         self.oversample = config.data_split.oversample
         self.oversample_method = config.data_split.oversample_method
+        self.workers = config.meta.workers
+        self.parallel_seeds = config.meta.parallel_seeds
+        self.resources = ResourceManager(self.workers, config.meta.blas_threads)
+        self._journal_dir = os.path.join(self.out_dir, self.experiment_name)  # checkpoint each finished unit
         self.jobs = config.selection.jobs
         self.job_names = job_name_cleaner(self.jobs)
         scoring_dict = config.collect_results.metrics_to_collect[self.learn_task]
@@ -50,13 +58,9 @@ class Run(DataHandler, Normalisers):
         self.models_to_init = [model for model in self.models_to_init if model not in self.ensemble]
         if len(self.models_to_init) < 2:  # ensemble methods need at least two models two combine their results
             self.ensemble = []
+        self.target_label = config.meta.target_label
         self.config.plot_first_iter = False
 
-        self.data_split = DataSplit(self.config)
-        self.imputation = Imputer(self.config)
-        self.selection = Selection(self.config)
-        self.verification = Verification(self.config)
-
     def __call__(self) -> None:
         """Iterate over all desired seeds/bootstraps, etc."""
         high_logging_level = self.config.meta.logging_level in ['TRACE', 'DEBUG', 'INFO']
@@ -64,59 +68,178 @@ class Run(DataHandler, Normalisers):
         self.seeds = generate_seeds(self.init_seed, self.n_seeds)
         self.init_containers()
 
-        for seed_iter, seed in enumerate(tqdm(self.seeds, desc='Running seeds', disable=high_logging_level)):
-            logger.info(f'Running seed {seed_iter+1}/{self.n_seeds}...')
-            np.random.seed(seed)
-            boot_seeds = generate_seeds(seed, self.n_bootstraps)  # generate boot seeds
+        with self.resources.pinned():
+            if self.parallel_seeds and self.workers > 1 and len(self.seeds) > 1:
+                with self.resources.stage('seeds'):
+                    self.run_parallel(high_logging_level)
+            else:
+                for seed_iter, seed in enumerate(tqdm(self.seeds, desc='Running seeds', disable=high_logging_level)):
+                    self.run_seed(seed_iter, seed)
+        self.resources.log_utilisation()
+
+    def run_parallel(self, high_logging_level: bool) -> None:
+        """Distribute seeds over a process pool and merge the results in seed order"""
+        logger.info(f'Running {len(self.seeds)} seeds in parallel using {self.workers} processes...')
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(self.seeds)),
+            initializer=_init_seed_worker,
+            initargs=(self.get_frame(), self.resources.blas_threads, self._profiler.active),
+        ) as executor:
+            results = executor.map(
+                _run_seed_worker,
+                [self.config] * len(self.seeds),
+                range(len(self.seeds)),
+                self.seeds,
+                [self.export_seed_results(seed) for seed in self.seeds],  # already available results
+            )
+            try:
+                for seed, seed_results in tqdm(
+                    zip(self.seeds, results), total=len(self.seeds), desc='Running seeds', disable=high_logging_level
+                ):  # map returns results in seed order, which keeps merged stores identical to a serial run
+                    self._profiler.merge(seed_results.pop('timings'))
+                    self.merge_seed_results(seed, seed_results)
+                    self.save_intermediate_results(os.path.join(self.out_dir, self.experiment_name), seed)
+            except KeyboardInterrupt:  # results of merged seeds are already saved
+                logger.warning('Keyboard interrupt detected, cancelling remaining seeds before exiting...')
+                executor.shutdown(wait=False, cancel_futures=True)
+                sys.exit(130)
+
+    def publish(self, work_queue) -> None:
+        """Publish a work unit per seed, worker nodes pull them using python3 main.py --role worker"""
+        self.seeds = generate_seeds(self.init_seed, self.n_seeds)
+        n_new = work_queue.publish(self.experiment_name, self.seeds)
+        logger.info(
+            f'Published {n_new} new work units to {work_queue.path}, '
+            f'queue state -> {work_queue.counts(self.experiment_name)}'
+        )
+
+    def work(self, work_queue, worker: str) -> int:
+        """Pull and run work units until none are left, returns the number of units completed by this worker
+
+        Units still running on other workers are waited for, as they are handed out again if their worker crashes.
+        """
+        experiment_dir = os.path.join(self.out_dir, self.experiment_name)
+        if not any(work_queue.counts(self.experiment_name).values()):
+            logger.error(f'No work units found in {work_queue.path}, publish them using python3 main.py --role publish')
+            return 0
+        n_completed = 0
+        with self.resources.pinned():
+            while True:
+                unit = work_queue.claim(self.experiment_name, worker)
+                if unit is None:
+                    counts = work_queue.counts(self.experiment_name)
+                    if counts['running'] == 0:
+                        break
+                    time.sleep(min(60, work_queue.lease_time / 4))
+                    continue
+                seed_iter, seed = unit
+                with work_queue.lease(self.experiment_name, seed, worker):
+                    try:
+                        with self.resources.stage('seeds'):
+                            self.run_unit(experiment_dir, seed_iter, seed, worker)
+                    except KeyboardInterrupt:  # results of finished bootstraps are already saved
+                        logger.warning('Keyboard interrupt detected, returning the current unit to the queue...')
+                        work_queue.release(self.experiment_name, seed, worker)
+                        sys.exit(130)
+                    except Exception as error:  # other units can still succeed, failed units are retried
+                        logger.exception(f'Seed {seed} failed on worker {worker}')
+                        work_queue.fail(self.experiment_name, seed, worker, repr(error))
+                        continue
+                if not work_queue.complete(self.experiment_name, seed, worker):
+                    logger.warning(f'Lease of seed {seed} was lost, the unit is completed by the worker running it now')
+                    continue
+                n_completed += 1
+        self.resources.log_utilisation()
+        logger.info(f'Work queue drained, queue state -> {counts}')
+        if counts['failed']:
+            logger.warning(f'{counts["failed"]} units failed {work_queue.max_attempts} times, see {work_queue.path}')
+        return n_completed
+
+    def run_unit(self, experiment_dir: str, seed_iter: int, seed: int, worker: str) -> None:
+        """Run a single seed in a fresh context, resumed from the results already saved by any worker"""
+        unit_run = Run(self.config, RunContext())
+        unit_run.set_frame(self.get_frame())
+        unit_run.resources = self.resources  # keep stage statistics and timings of all units
+        unit_run._profiler = self._profiler
+        unit_run._journal_segment = worker
+        if not self.config.meta.overwrite:
+            unit_run.load_seed_results(experiment_dir, seed)
+        unit_run.init_seed_containers(seed)
+        unit_run.run_seed(seed_iter, seed)
+
+    def run_seed(self, seed_iter: int, seed: int, save_results: bool = True) -> None:
+        """Run all bootstraps and jobs for a single seed"""
+        logger.info(f'Running seed {seed_iter+1}/{self.n_seeds}...')
+        seed_context = self.context.seed_context(seed)  # data splits and stage state are private to this seed
+        stages = (
+            DataSplit(self.config, seed_context),
+            Imputer(self.config, seed_context),
+            Selection(self.config, seed_context),
+            Verification(self.config, seed_context),
+        )
+        np.random.seed(seed)
+        boot_seeds = generate_seeds(seed, self.n_bootstraps)  # generate boot seeds
+        with self._profiler.stage('seed', seed=seed):
             for boot_iter in range(self.n_bootstraps):
                 logger.info(f'Running bootstrap iteration {boot_iter+1}/{self.n_bootstraps}...')
-                self.data_split(seed, boot_seeds[boot_iter])
-                fit_imputer = self.imputation(seed)
-                if self.oversample:
-                    train = self.over_sampling(self.get_store('frame', seed, 'train'), seed)
-                    self.set_store('frame', seed, 'train', train)
-                for job, job_name in zip(self.jobs, self.job_names):
-                    logger.info(f'Running {job_name}...')
-                    job_dir = os.path.join(self.out_dir, self.experiment_name, job_name)
-                    os.makedirs(job_dir, exist_ok=True)
-                    try:
-                        features = self.get_store('feature', seed, job_name, boot_iter=boot_iter)
-                    except KeyError:
-                        features = []
-                    if not features:
-                        self.selection(
-                            seed, boot_iter, job, job_name, job_dir
-                        )  # run only if selection results not already available
-                    else:
-                        norm = [step for step in self.jobs[0] if 'norm' in step][
-                            0
-                        ]  # need to init normalisation for verification (normally part of selection)
-                        train_frame = self.get_store('frame', seed, 'train')
-                        _ = getattr(self, norm)(train_frame)
-                    _ = self.verification(seed, boot_iter, job_name, job_dir, fit_imputer)
-                try:  # ensure that intermediate result files are not corrupted by KeyboardInterrupt
-                    self.save_intermediate_results(os.path.join(self.out_dir, self.experiment_name))
-                except KeyboardInterrupt:
-                    logger.warning('Keyboard interrupt detected, saving intermediate results before exiting...')
-                    self.save_intermediate_results(os.path.join(self.out_dir, self.experiment_name))
-                    sys.exit(130)
-                self.config.plot_first_iter = (
-                    False  # minimise work by producing certain plots only for the first iteration
-                )
+                with self._profiler.stage('bootstrap', boot_iter=boot_iter):
+                    self.run_bootstrap(seed, boot_iter, boot_seeds[boot_iter], *stages)
+                    if save_results:
+                        with self._profiler.stage('save'):
+                            self.save_seed(seed)
+                # minimise work by producing certain plots only for the first iteration
+                self.config.plot_first_iter = False
+
+    def run_bootstrap(self, seed, boot_iter, boot_seed, data_split, imputation, selection, verification) -> None:
+        """Run all jobs for a single bootstrap, units with available results are skipped"""
+        with self.resources.stage('imputation'):
+            with self._profiler.stage('split'):
+                data_split(seed, boot_seed)
+            with self._profiler.stage('impute'):
+                fit_imputer = imputation(seed, boot_seed)
+        if self.oversample:
+            with self._profiler.stage('oversample'):
+                train = self.over_sampling(data_split.get_store('frame', seed, 'train'), seed)
+                data_split.set_store('frame', seed, 'train', train)
+        for job, job_name in zip(self.jobs, self.job_names):
+            logger.info(f'Running {job_name}...')
+            job_dir = os.path.join(self.out_dir, self.experiment_name, job_name)
+            os.makedirs(job_dir, exist_ok=True)
+            with self._profiler.stage(job_name, job=job_name):
+                with self.resources.stage('selection'), self._profiler.stage('selection'):
+                    if not self.unit_done(seed, boot_iter, job_name):
+                        selection(seed, boot_iter, job, job_name, job_dir)
+                        if self.unit_done(seed, boot_iter, job_name):
+                            self.checkpoint_unit(seed, boot_iter, job_name, step_features=selection.step_features)
+                    else:  # verification needs the normalisation of this job, normally part of selection
+                        selection.restore_scaler(seed, job, job_name)
+                with self.resources.stage('verification'), self._profiler.stage('verification'):
+                    _ = verification(seed, boot_iter, job_name, job_dir, fit_imputer)
+
+    def save_seed(self, seed: int) -> None:
+        try:  # ensure that intermediate result files are not corrupted by KeyboardInterrupt
+            self.save_intermediate_results(os.path.join(self.out_dir, self.experiment_name), seed)
+        except KeyboardInterrupt:
+            logger.warning('Keyboard interrupt detected, saving intermediate results before exiting...')
+            self.save_intermediate_results(os.path.join(self.out_dir, self.experiment_name), seed)
+            sys.exit(130)
 
     def init_containers(self):
         if not self.config.meta.overwrite:
-            scores_found = self.load_intermediate_results(
-                os.path.join(self.out_dir, self.experiment_name)
-            )  # try loading available results
-        if self.config.meta.overwrite or not scores_found:
-            for seed in self.seeds:  # initialise empty score containers to be filled during verification
-                for job_name in self.job_names:
-                    for n_top in self.config.verification.use_n_top_features:
-                        scores = NestedDefaultDict()
-                        for model in self.models_to_init + self.ensemble:
-                            scores[model] = {score: [] for score in self.scores_to_init + ['probas', 'true', 'pred']}
-                        self.set_store('score', str(seed), f'{job_name}_{n_top}', scores)
+            self.load_intermediate_results(os.path.join(self.out_dir, self.experiment_name))  # try loading results
+        for seed in self.seeds:  # seeds and units of interrupted seeds without results yet
+            self.init_seed_containers(seed)
+
+    def init_seed_containers(self, seed: int) -> None:
+        """Add the empty score containers missing for a seed, filled during verification"""
+        for job_name in self.job_names:
+            for n_top in self.config.verification.use_n_top_features:
+                scores = self.get_store('score', seed, f'{job_name}_{n_top}') or NestedDefaultDict()
+                for model in self.models_to_init + self.ensemble:
+                    model_scores = scores.setdefault(model, {})
+                    for score in self.scores_to_init:
+                        model_scores.setdefault(score, [])
+                self.set_store('score', str(seed), f'{job_name}_{n_top}', scores)
 
     def over_sampling(self, x_frame: pd.DataFrame, seed: int) -> pd.DataFrame:
         """Over sample data"""
@@ -141,3 +264,27 @@ class Run(DataHandler, Normalisers):
         y_frame = x_frame[self.target_label]
         new_x_frame, _ = over_sampler.fit_resample(x_frame, y_frame)
         return new_x_frame
+
+
+_worker_state = {}  # cleaned frame and profiling flag of a seed worker process
+
+
+def _init_seed_worker(frame: pd.DataFrame, blas_threads: int, profile: bool) -> None:
+    """Make the cleaned frame available in a seed worker process and pin its BLAS/OpenMP threads"""
+    ResourceManager(1, blas_threads).pin_process()
+    _worker_state.update(frame=frame, profile=profile)
+
+
+def _run_seed_worker(config, seed_iter: int, seed: int, seed_results: dict) -> dict:
+    """Run a single seed in a worker process and return its results to be merged by the parent"""
+    config.meta.workers = 1  # seeds are already distributed over all workers
+    run = Run(config, RunContext(_worker_state['profile']))  # fresh stores per seed, results of a seed are exported
+    run.set_frame(_worker_state['frame'])
+    run._journal_segment = worker_name()  # unit checkpoints of parallel seeds are written concurrently
+    run.merge_seed_results(seed, seed_results)
+    run._seed_feature_score_store = NestedDefaultDict()  # only return contribution of this seed
+    run.run_seed(seed_iter, seed, save_results=False)
+    seed_results = run.export_seed_results(seed)
+    seed_results['predictions'] = run._prediction_store.export(seed)
+    seed_results['timings'] = run._profiler.records
+    return seed_results
@@ -0,0 +1,171 @@
+import os
+import time
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from loguru import logger
+
+
+def worker_name() -> str:
+    """Name of this worker, unique across the nodes sharing a queue"""
+    return f'{socket.gethostname()}_{os.getpid()}'
+
+
+class SQLiteWorkQueue:
+    """Work queue of (experiment, seed) units in a SQLite file, shared by all nodes using a common file system
+
+    Units are claimed with a lease, which the worker renews while it runs the unit. Units of workers that stopped
+    renewing their lease (e.g. crashed nodes) are handed out again, failed units are retried up to max_attempts.
+    Publishing is idempotent, units already known to the queue keep their state.
+    """
+
+    def __init__(self, path: str, lease_time: float = 600, max_attempts: int = 3) -> None:
+        self.path = path
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS units ('
+                'experiment TEXT, seed INTEGER, seed_iter INTEGER, state TEXT, worker TEXT, '
+                'lease_until REAL, attempts INTEGER, error TEXT, PRIMARY KEY (experiment, seed))'
+            )
+
+    def publish(self, experiment: str, seeds: list) -> int:
+        """Add a pending unit for each seed, returns the number of new units"""
+        with self._connect() as connection:
+            n_before = connection.execute('SELECT COUNT(*) FROM units WHERE experiment = ?', (experiment,)).fetchone()
+            connection.executemany(
+                "INSERT OR IGNORE INTO units VALUES (?, ?, ?, 'pending', NULL, 0, 0, NULL)",
+                [(experiment, int(seed), seed_iter) for seed_iter, seed in enumerate(seeds)],
+            )
+            n_after = connection.execute('SELECT COUNT(*) FROM units WHERE experiment = ?', (experiment,)).fetchone()
+        return n_after[0] - n_before[0]
+
+    def claim(self, experiment: str, worker: str) -> tuple or None:
+        """Lease the next pending or expired unit to a worker, returns (seed_iter, seed) or None"""
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(  # units of crashed workers without attempts left are not handed out again
+                "UPDATE units SET state = 'failed', error = 'lease expired' "
+                "WHERE experiment = ? AND state = 'running' AND lease_until < ? AND attempts >= ?",
+                (experiment, now, self.max_attempts),
+            )
+            row = connection.execute(
+                'SELECT seed_iter, seed FROM units WHERE experiment = ? AND attempts < ? '
+                "AND (state = 'pending' OR (state = 'running' AND lease_until < ?)) ORDER BY seed_iter LIMIT 1",
+                (experiment, self.max_attempts, now),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE units SET state = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                'WHERE experiment = ? AND seed = ?',
+                (worker, now + self.lease_time, experiment, row[1]),
+            )
+        return row
+
+    def renew(self, experiment: str, seed: int, worker: str) -> bool:
+        """Extend the lease of a running unit, False if the unit was handed out to another worker meanwhile"""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                'UPDATE units SET lease_until = ? '
+                "WHERE experiment = ? AND seed = ? AND worker = ? AND state = 'running'",
+                (time.time() + self.lease_time, experiment, int(seed), worker),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, experiment: str, seed: int, worker: str) -> bool:
+        """Mark a unit as done, results of a unit are saved before it is completed
+
+        False if the lease was lost meanwhile, the unit then stays with the worker it was handed out to again.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE units SET state = 'done', error = NULL "
+                "WHERE experiment = ? AND seed = ? AND worker = ? AND state = 'running'",
+                (experiment, int(seed), worker),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, experiment: str, seed: int, worker: str, error: str) -> None:
+        """Hand a failed unit out again, unless it failed max_attempts times"""
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE units SET state = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, error = ? "
+                "WHERE experiment = ? AND seed = ? AND worker = ? AND state = 'running'",
+                (self.max_attempts, error, experiment, int(seed), worker),
+            )
+
+    def release(self, experiment: str, seed: int, worker: str) -> None:
+        """Return an interrupted unit to the queue without counting the attempt"""
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE units SET state = 'pending', attempts = attempts - 1 "
+                "WHERE experiment = ? AND seed = ? AND worker = ? AND state = 'running'",
+                (experiment, int(seed), worker),
+            )
+
+    def counts(self, experiment: str) -> dict:
+        """Number of units per state"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                'SELECT state, COUNT(*) FROM units WHERE experiment = ? GROUP BY state', (experiment,)
+            ).fetchall()
+        return {state: 0 for state in ['pending', 'running', 'done', 'failed']} | dict(rows)
+
+    @contextmanager
+    def lease(self, experiment: str, seed: int, worker: str):
+        """Renew the lease of a unit in a background thread while the unit runs"""
+        stop_event = threading.Event()
+
+        def heartbeat():
+            while not stop_event.wait(self.lease_time / 3):
+                if not self.renew(experiment, seed, worker):
+                    logger.warning(f'Lease of seed {seed} was lost, another worker may run it as well')
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop_event.set()
+            thread.join()
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection per operation, i.e. usable from any thread and process
+
+        Each operation is a single write transaction, i.e. a unit is never claimed by two workers at once.
+        """
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+
+QUEUE_BACKENDS = {'sqlite': SQLiteWorkQueue}
+
+
+def work_queue_path(config) -> str:
+    """Queue file of the configured experiment, stored in the experiment directory by default"""
+    return config.meta.queue.path or os.path.join(config.meta.output_dir, config.meta.experiment, 'work_queue.sqlite')
+
+
+def init_work_queue(config):
+    """Work queue of the configured backend"""
+    queue_config = config.meta.queue
+    if queue_config.backend not in QUEUE_BACKENDS:
+        raise ValueError(f'Unknown queue backend: {queue_config.backend}, allowed -> {", ".join(QUEUE_BACKENDS)}')
+    return QUEUE_BACKENDS[queue_config.backend](
+        work_queue_path(config), queue_config.lease_time, queue_config.max_attempts
+    )
@@ -0,0 +1,7 @@
+from pipeline_tabular.utils.correlation.correlation import (
+    correlated_pairs,
+    correlation_matrix,
+    correlation_to_target,
+    dense_pairs,
+    greedy_decorrelate,
+)
@@ -0,0 +1,89 @@
+import numpy as np
+from scipy.stats import rankdata
+
+
+def standardise(values: np.ndarray, method: str = 'pearson', dtype=np.float64) -> np.ndarray:
+    """Centre columns and scale them to unit norm, so that correlations become dot products"""
+    if method == 'spearman':  # spearman correlation is the pearson correlation of ranks
+        values = rankdata(values, axis=0)
+    elif method != 'pearson':
+        raise ValueError(f'Unknown correlation method: {method}, allowed -> pearson, spearman')
+    values = np.asarray(values, dtype=np.float64)
+    values = values - values.mean(axis=0)
+    norms = np.sqrt(np.einsum('ij,ij->j', values, values))
+    norms[norms == 0] = np.inf  # constant columns are uncorrelated to everything
+    return (values / norms).astype(dtype, copy=False)
+
+
+def correlation_matrix(values: np.ndarray, method: str = 'pearson') -> np.ndarray:
+    """Correlation between all columns using a single matrix multiplication"""
+    standardised = standardise(values, method)
+    return standardised.T @ standardised
+
+
+def correlation_to_target(values: np.ndarray, target: np.ndarray, method: str = 'pearson') -> np.ndarray:
+    """Correlation of all columns with the target"""
+    return standardise(values, method).T @ standardise(target.reshape(-1, 1), method)[:, 0]
+
+
+def correlated_pairs(
+    values: np.ndarray,
+    method: str = 'pearson',
+    thresh: float = 0.95,
+    block_size: int = 2048,
+    decimals: int = 2,
+    memmap_path: str = None,
+) -> tuple:
+    """Pairs of columns with absolute correlation above thresh, computed in float32 tiles of the upper triangle
+
+    Memory is bounded by one block_size x n_columns tile instead of the dense n_columns x n_columns matrix. If
+    memmap_path is given, the full correlation matrix is streamed to a memory-mapped .npy file (e.g. for plots).
+    Returns the row indices, column indices (row < column) and absolute correlations of the correlated pairs.
+    """
+    standardised = standardise(values, method, dtype=np.float32)
+    n_columns = standardised.shape[1]
+    matrix = None
+    if memmap_path is not None:
+        matrix = np.lib.format.open_memmap(memmap_path, mode='w+', dtype=np.float32, shape=(n_columns, n_columns))
+    rows, cols, abs_corrs = [], [], []
+    for start in range(0, n_columns, block_size):
+        stop = min(start + block_size, n_columns)
+        tile = standardised[:, start:stop].T @ standardised[:, start:]  # rows start:stop, columns start:
+        if matrix is not None:
+            matrix[start:stop, start:] = tile
+            matrix[start:, start:stop] = tile.T
+        abs_tile = np.abs(tile.round(decimals))
+        tile_rows, tile_cols = np.nonzero(abs_tile > thresh)
+        upper = tile_rows < tile_cols  # skip the diagonal and the lower triangle of the diagonal block
+        rows.append(tile_rows[upper] + start)
+        cols.append(tile_cols[upper] + start)
+        abs_corrs.append(abs_tile[tile_rows[upper], tile_cols[upper]])
+    if matrix is not None:
+        matrix.flush()
+    if not rows:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0, dtype=np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(abs_corrs)
+
+
+def dense_pairs(abs_corr: np.ndarray, thresh: float) -> tuple:
+    """Same output as correlated_pairs for an already computed dense matrix of absolute correlations"""
+    rows, cols = np.nonzero(np.triu(abs_corr > thresh, k=1))
+    return rows, cols, abs_corr[rows, cols]
+
+
+def greedy_decorrelate(rows: np.ndarray, cols: np.ndarray, n_columns: int) -> np.ndarray:
+    """Keep columns in ranked order, unless they are correlated with an already kept column
+
+    Columns must be sorted by feature importance (most important first) and rows < cols, i.e. each pair links a
+    column to a more important one. Returns the mask of kept columns.
+    """
+    keep = np.ones(n_columns, dtype=bool)
+    order = np.argsort(cols, kind='stable')
+    rows, cols = rows[order], cols[order]
+    starts = np.flatnonzero(np.r_[True, cols[1:] != cols[:-1]]) if len(cols) else np.empty(0, dtype=int)
+    stops = np.append(starts[1:], len(cols))
+    for start, stop in zip(starts, stops):  # more important columns are always decided first
+        if keep[rows[start:stop]].any():
+            keep[cols[start]] = False
+    return keep
+
@@ -10,8 +10,8 @@ from pipeline_tabular.data_handler.data_handler import DataHandler
 class DataSplit(DataHandler):
     """Split frame in selection and verification"""
 
-    def __init__(self, config: DictConfig) -> None:
-        super().__init__()
+    def __init__(self, config: DictConfig, context=None) -> None:
+        super().__init__(context)
         self.config = config
         self.learn_task = config.meta.learn_task
         self.target_label = config.meta.target_label
@@ -2,7 +2,6 @@ import os
 import shap
 
 import numpy as np
-import matplotlib.pyplot as plt
 from loguru import logger
 from alibi.explainers import KernelShap
 
@@ -12,22 +11,23 @@ from pipeline_tabular.utils.imputers import Imputer
 from pipeline_tabular.utils.normalisers import Normalisers
 from pipeline_tabular.utils.verifications.verification import Verification
 from pipeline_tabular.utils.helpers import generate_seeds
+from pipeline_tabular.utils.plots import submit_plot
 
 
 class Explain(DataHandler, Normalisers):
     """Explainability methods to understand model decision process"""
 
-    def __init__(self, config) -> None:
-        super().__init__()
+    def __init__(self, config, context=None) -> None:
+        super().__init__(context)
+        self.config = config
         self.out_dir = config.meta.output_dir
         self.plot_format = config.meta.plot_format
         self.oversample = config.data_split.oversample
         self.jobs = config.selection.jobs
-        self.data_split = DataSplit(config)
-        self.imputation = Imputer(config)
-        self.verification = Verification(config)
-
-        plt.rcParams.update({'font.size': config.collect_results.font_size})
+        self.data_split = DataSplit(config, context)
+        self.imputation = Imputer(config, context)
+        self.verification = Verification(config, context)
+        self.font_size = config.collect_results.font_size
 
     def __call__(self, experiment_name, scores, opt_scoring, job_names, best_models, seeds, n_bootstraps) -> None:
         self.expl_out_dir = os.path.join(self.out_dir, experiment_name, 'explain')
@@ -38,7 +38,7 @@ class Explain(DataHandler, Normalisers):
             n_top = scores['n_top'].loc[best_model, job_name]
             seed, boot_seed = self.get_seeds(scores, opt_scoring, job_name, best_model, seeds, n_bootstraps)
             self.data_split(seed, boot_seed)  # re-build data splits
-            fit_imputer = self.imputation(seed)
+            fit_imputer = self.imputation(seed, boot_seed)
             train_frame = self.get_store('frame', seed, 'train')
             if self.oversample:
                 train_frame = self.over_sampling(train_frame, seed)
@@ -75,34 +75,42 @@ class Explain(DataHandler, Normalisers):
         explainer = KernelShap(pred_function)
         explainer.fit(x_train_norm[features])
         explanation = explainer.explain(x_test_norm[features], feature_names=features)
-        shap.summary_plot(explanation.shap_values[1], x_test_norm[features], features, show=False)
-        plt.tight_layout()
-        plt.savefig(
-            os.path.join(self.expl_out_dir, f'KernelSHAP_positive_class_strat_{job_index}.{self.plot_format}'), dpi=300
+        submit_plot(
+            self.config,
+            'shap_summary',
+            os.path.join(self.expl_out_dir, f'KernelSHAP_positive_class_strat_{job_index}.{self.plot_format}'),
+            shap_values=explanation.shap_values[1],
+            x_test=x_test_norm[features],
+            features=features,
+            font_size=self.font_size,
         )
-        plt.clf()
-        shap.summary_plot(explanation.shap_values, x_test_norm[features], features, show=False)
-        plt.tight_layout()
-        plt.savefig(
-            os.path.join(self.expl_out_dir, f'KernelSHAP_both_classes_strat_{job_index}.{self.plot_format}'), dpi=300
+        submit_plot(
+            self.config,
+            'shap_summary',
+            os.path.join(self.expl_out_dir, f'KernelSHAP_both_classes_strat_{job_index}.{self.plot_format}'),
+            shap_values=explanation.shap_values,
+            x_test=x_test_norm[features],
+            features=features,
+            font_size=self.font_size,
         )
-        plt.clf()
 
         heatmap_explainer = shap.KernelExplainer(
             lambda x: pred_function(x)[:, 1], x_train_norm[features]
         )  # need different format for heatmap plot
-        values = heatmap_explainer(x_test_norm[features])
-        shap.plots.heatmap(values, show=False)
-        plt.tight_layout()
-        plt.savefig(
-            os.path.join(self.expl_out_dir, f'KernelSHAP_heatmap_strat_{job_index}.{self.plot_format}'), dpi=300
+        submit_plot(
+            self.config,
+            'shap_heatmap',
+            os.path.join(self.expl_out_dir, f'KernelSHAP_heatmap_strat_{job_index}.{self.plot_format}'),
+            explanation=heatmap_explainer(x_test_norm[features]),
+            font_size=self.font_size,
         )
-        plt.clf()
 
     def plot_coefficients(self, coefficients, features, job_index):
-        plt.figure()
-        plt.barh(features, coefficients[0], color='yellowgreen')
-        plt.title('Feature coefficients')
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.expl_out_dir, f'coefficients_strat_{job_index}.{self.plot_format}'), dpi=300)
-        plt.clf()
+        submit_plot(
+            self.config,
+            'coefficients',
+            os.path.join(self.expl_out_dir, f'coefficients_strat_{job_index}.{self.plot_format}'),
+            features=features,
+            values=coefficients[0],
+            font_size=self.font_size,
+        )
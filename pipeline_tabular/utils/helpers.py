@@ -1,4 +1,10 @@
+import hashlib
+import tracemalloc
+from contextlib import contextmanager
+
 import numpy as np
+import pandas as pd
+from loguru import logger
 from sklearn.ensemble import (
     AdaBoostClassifier,
     AdaBoostRegressor,
@@ -68,6 +74,35 @@ def init_estimator(
     return estimator, cross_fold, scoring
 
 
+def fold_plan(cross_validator, x_frame, y_frame) -> list:
+    """Precompute train/test indices of all folds, splits only depend on the cross-validator seed and y_frame"""
+    return list(cross_validator.split(x_frame, y_frame))
+
+
+def hash_frame(frame: pd.DataFrame) -> str:
+    """Content hash of a frame including index, columns and dtypes"""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+    digest.update(str(list(frame.columns)).encode())
+    digest.update(str(list(frame.dtypes)).encode())
+    return digest.hexdigest()
+
+
+@contextmanager
+def peak_memory(label: str):
+    """Log the peak memory allocated within the context (numpy arrays included)"""
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        logger.info(f'{label} peak memory: {peak / 1024**2:.1f} MB')
+
+
 def job_name_cleaner(jobs: list) -> str:
     """Transform jobs given in list into job name strings"""
     job_names = []
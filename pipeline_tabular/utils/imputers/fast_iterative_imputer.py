@@ -0,0 +1,141 @@
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from loguru import logger
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.linear_model import BayesianRidge
+
+from pipeline_tabular.utils.correlation.correlation import standardise
+
+
+def _fit_columns(filled: np.ndarray, mask: np.ndarray, columns: list, predictors: list, estimator) -> tuple:
+    """Fit the models of a chunk of columns one after the other, returns models and imputed values"""
+    filled = filled.copy()  # columns of this chunk are updated in place, other chunks only see the previous round
+    models, values = [], []
+    for column, column_predictors in zip(columns, predictors):
+        observed = ~mask[:, column]
+        model = clone(estimator).fit(filled[observed][:, column_predictors], filled[observed, column])
+        filled[~observed, column] = model.predict(filled[~observed][:, column_predictors])
+        models.append(model)
+        values.append(filled[~observed, column])
+    return models, values
+
+
+class FastIterativeImputer(BaseEstimator, TransformerMixin):
+    """Approximation of IterativeImputer for wide tables
+
+    Each column with missing values is only predicted from its n_nearest_features most correlated columns. Columns
+    are split into one chunk per job: within a chunk columns are updated one after the other like IterativeImputer,
+    chunks are fitted in parallel and exchange their imputations after each round. Stops as soon as the largest
+    change is below tol, relative to the largest observed absolute value, like IterativeImputer.
+    """
+
+    def __init__(
+        self,
+        estimator=None,
+        n_nearest_features: int = 20,
+        max_iter: int = 100,
+        tol: float = 1e-3,
+        n_jobs: int = 1,
+        keep_empty_features: bool = True,
+    ) -> None:
+        self.estimator = estimator
+        self.n_nearest_features = n_nearest_features
+        self.max_iter = max_iter
+        self.tol = tol
+        self.n_jobs = n_jobs
+        self.keep_empty_features = keep_empty_features
+
+    def fit(self, x_frame, y=None):
+        self.fit_transform(x_frame)
+        return self
+
+    def fit_transform(self, x_frame, y=None) -> np.ndarray:
+        start = time.time()
+        values = np.asarray(x_frame, dtype=float)
+        mask = np.isnan(values)
+        with np.errstate(all='ignore'):
+            self.initial_values_ = np.nanmedian(values, axis=0)
+        self.empty_features_ = np.isnan(self.initial_values_)
+        self.initial_values_[self.empty_features_] = 0
+        filled = np.where(mask, self.initial_values_, values)
+
+        observed = ~self.empty_features_
+        self.columns_ = [column for column in np.flatnonzero(mask.any(axis=0)) if observed[column]]
+        if observed.sum() < 2:  # no predictors available, keep the initial imputation
+            self.columns_ = []
+        self.predictors_ = self._nearest_features(filled, observed)
+        chunks = np.array_split(np.arange(len(self.columns_)), max(1, min(self.n_jobs, len(self.columns_))))
+        estimator = self.estimator if self.estimator is not None else BayesianRidge()
+        normaliser = self.tol * np.max(np.abs(values[~mask]), initial=0)
+
+        self.imputation_sequence_ = []
+        self.n_iter_, change = 0, np.inf
+        with Parallel(n_jobs=self.n_jobs) as parallel:
+            for _ in range(self.max_iter if self.columns_ else 0):
+                results = parallel(
+                    delayed(_fit_columns)(
+                        filled,
+                        mask,
+                        [self.columns_[index] for index in chunk],
+                        [self.predictors_[index] for index in chunk],
+                        estimator,
+                    )
+                    for chunk in chunks
+                )
+                models = [model for chunk_models, _ in results for model in chunk_models]
+                imputed = [column_values for _, chunk_values in results for column_values in chunk_values]
+                previous = filled.copy()
+                for column, column_values in zip(self.columns_, imputed):
+                    filled[mask[:, column], column] = column_values
+                self.imputation_sequence_.append(models)
+                self.n_iter_ += 1
+                change = np.max(np.abs(filled - previous))
+                if change < normaliser:
+                    break
+
+        self.converged_ = change < normaliser or not self.columns_
+        self.fit_time_ = time.time() - start
+        logger.info(
+            f'Imputed {len(self.columns_)} columns in {self.n_iter_} iterations and {self.fit_time_:.1f}s, '
+            f'converged: {self.converged_} (last change {change:.2g}, tolerance {normaliser:.2g})'
+        )
+        return self._drop_empty(filled)
+
+    def transform(self, x_frame) -> np.ndarray:
+        values = np.asarray(x_frame, dtype=float)
+        mask = np.isnan(values)
+        filled = np.where(mask, self.initial_values_, values)
+        chunks = np.array_split(np.arange(len(self.columns_)), max(1, min(self.n_jobs, len(self.columns_))))
+        for models in self.imputation_sequence_:  # replay all rounds of the fit, same update order as the fit
+            previous = filled.copy()
+            for chunk in chunks:
+                chunk_filled = previous.copy()
+                for index in chunk:
+                    column, predictors, model = self.columns_[index], self.predictors_[index], models[index]
+                    missing = mask[:, column]
+                    if missing.any():
+                        chunk_filled[missing, column] = model.predict(chunk_filled[missing][:, predictors])
+                    filled[missing, column] = chunk_filled[missing, column]
+        return self._drop_empty(filled)
+
+    def _nearest_features(self, filled: np.ndarray, observed: np.ndarray, block_size: int = 1024) -> list:
+        """Indices of the most correlated columns for each column with missing values"""
+        candidates = np.flatnonzero(observed)
+        standardised = standardise(filled[:, candidates], dtype=np.float32)
+        n_nearest = max(1, min(self.n_nearest_features, len(candidates) - 1))
+        predictors = []
+        for start in range(0, len(self.columns_), block_size):
+            columns = self.columns_[start : start + block_size]
+            positions = np.searchsorted(candidates, columns)
+            abs_corr = np.abs(standardised.T @ standardised[:, positions])  # candidates x columns
+            abs_corr[positions, np.arange(len(columns))] = -1  # a column never predicts itself
+            nearest = np.argpartition(-abs_corr, n_nearest - 1, axis=0)[:n_nearest]
+            predictors.extend(candidates[np.sort(nearest[:, index])] for index in range(len(columns)))
+        return predictors
+
+    def _drop_empty(self, filled: np.ndarray) -> np.ndarray:
+        if self.keep_empty_features:
+            return filled
+        return filled[:, ~self.empty_features_]
@@ -1,39 +1,70 @@
 import os
+import time
 
 import numpy as np
 import pandas as pd
 from loguru import logger
+from omegaconf import OmegaConf
 from sklearn.experimental import enable_iterative_imputer  # because of bug in sklearn
 from sklearn.impute import IterativeImputer, KNNImputer, MissingIndicator, SimpleImputer
+from sklearn.linear_model import BayesianRidge
 
 from pipeline_tabular.data_handler.data_handler import DataHandler
+from pipeline_tabular.data_handler.memo_cache import MemoCache
+from pipeline_tabular.utils.imputers.fast_iterative_imputer import FastIterativeImputer
+from pipeline_tabular.utils.helpers import hash_frame
+from pipeline_tabular.utils.resources import ResourceManager
 
 logger.trace(enable_iterative_imputer)  # to avoid auto import removal
 
 class Imputer(DataHandler):
     """Impute missing data"""
 
-    def __init__(self, config) -> None:
-        super().__init__()
+    def __init__(self, config, context=None) -> None:
+        super().__init__(context)
         self.config = config
         self.impute_method = config.impute.method
+        self.resources = ResourceManager(config.meta.workers, config.meta.blas_threads)
         self.imputer = None
+        self.cache = None
+        if config.impute.cache.active:  # shared by all experiments, imputation only depends on the data splits
+            cache_dir = os.path.join(config.meta.output_dir, 'cache', 'imputer')
+            self.cache = MemoCache(
+                max_entries=0,  # disk only, imputed frames are later normalised in place
+                cache_dir=cache_dir,
+                max_disk_mb=config.impute.cache.max_disk_mb,
+            )
+        self.cache_signature = OmegaConf.to_container(config.impute, resolve=True)
+        self.cache_signature.pop('cache', None)
 
-    def __call__(self, seed) -> None:
+    def __call__(self, seed, boot_seed=None) -> None:
         """Impute missing data"""
         self.seed = seed
-        
+
         train_frame = self.get_store('frame', seed, 'train')
         test_frame = self.get_store('frame', seed, 'test')
         if self._check_methods():
             if self.impute_method == 'drop_nan_impute':
                 raise NotImplementedError
+            cache_key = None
+            if self.cache is not None:  # content addressed, any change of the data splits gives a new key
+                cache_key = MemoCache.key(
+                    hash_frame(train_frame), hash_frame(test_frame), str(seed), str(boot_seed), self.cache_signature
+                )
+            cached = self.cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                logger.info(f'Reusing cached {self.impute_method} for seed {seed}')
+                self.imputer, imp_train, imp_test = cached['imputer'], cached['train'], cached['test']
             else:
-                imputer = getattr(self, self.impute_method)()
-                imp_train = imputer.fit_transform(train_frame)
+                start = time.time()
+                self.imputer = getattr(self, self.impute_method)()
+                imp_train = self.imputer.fit_transform(train_frame)
                 imp_train = pd.DataFrame(imp_train, index=train_frame.index, columns=train_frame.columns)
-                imp_test = imputer.transform(test_frame)
+                imp_test = self.imputer.transform(test_frame)
                 imp_test = pd.DataFrame(imp_test, index=test_frame.index, columns=test_frame.columns)
+                logger.info(f'{self.impute_method} for seed {seed} took {time.time() - start:.1f}s')
+                if cache_key is not None:
+                    self.cache.set(cache_key, {'imputer': self.imputer, 'train': imp_train, 'test': imp_test})
             self.set_store('frame', seed, 'train', imp_train)
             self.set_store('frame', seed, 'test', imp_test)
 
@@ -69,6 +100,18 @@ class Imputer(DataHandler):
             keep_empty_features=True,
         )
 
+    def fast_iterative_impute(self) -> FastIterativeImputer:
+        """Iterative impute with bounded predictors and parallel column models, for wide tables"""
+        fast_config = self.config.impute.fast_iterative
+        return FastIterativeImputer(
+            estimator=BayesianRidge(),
+            n_nearest_features=fast_config.n_nearest_features,
+            max_iter=fast_config.max_iter,
+            tol=fast_config.tol,
+            n_jobs=self.resources.n_jobs(),  # column models are single-threaded
+            keep_empty_features=True,
+        )
+
     def simple_impute(self) -> SimpleImputer:
         """Simple impute"""
         return SimpleImputer(
@@ -1,18 +1,22 @@
 import os
 import re
 
+from collections import defaultdict
+
 import numpy as np
 import pandas as pd
 from loguru import logger
+from pandas.api.types import is_extension_array_dtype, is_numeric_dtype
 
 from pipeline_tabular.data_handler.data_handler import DataHandler
+from pipeline_tabular.utils.helpers import peak_memory
 
 
 class CleanUp(DataHandler):
     """Clean up data"""
 
-    def __init__(self, config) -> None:
-        super().__init__()
+    def __init__(self, config, context=None) -> None:
+        super().__init__(context)
         self.config = config
         self.label_as_index = self.config.inspection.label_as_index
         self.manual_clean = self.config.inspection.manual_clean
@@ -28,25 +32,71 @@ class CleanUp(DataHandler):
         if self.manual_clean:
             self.drop_columns_rex()
 
-        self.frame = self.frame.apply(pd.to_numeric, errors='coerce')  # Replace non-numeric entries with NaN
-        nunique = self.frame.nunique()
-        non_categorical = nunique[nunique > 5].index
-        self.frame[non_categorical] = self.frame[non_categorical].replace(0, np.nan)  # Replace 0 with NaN
-        self.frame = self.frame.dropna(how='all', axis=1)  # Drop columns with all NaN
-        self.frame = self.frame[self.frame[self.target_label].notna()]  # Drop rows with NaN in target column
+        with peak_memory('CleanUp'):
+            self.frame = self.clean_values(self.frame)
 
         self.set_frame(self.frame)
         output_dir = os.path.join(self.config.meta.output_dir, self.config.meta.experiment)
         os.makedirs(output_dir, exist_ok=True)
-        self.save_frame(output_dir)
+        self.save_frame(output_dir, export_csv=self.config.meta.export_frame_csv)
 
     def set_index_by_label(self) -> None:
         """Set index by label"""
         if isinstance(self.label_as_index, str):
+            if self.frame.index.name == self.label_as_index:  # already set while reading
+                return
             logger.info(f'Reindex table by name -> {self.label_as_index}')
             self.frame = self.frame.set_index(self.label_as_index)
             # self.frame.sort_index(inplace=True)
 
+    def clean_values(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Replace non-numeric entries and 0 in non-categorical columns with NaN, drop empty columns and rows without
+        target, works on one numpy block per dtype and builds the cleaned frame once at the end"""
+        columns = []
+        for column, dtype in frame.dtypes.items():
+            values = frame[column]
+            if not is_numeric_dtype(dtype):  # replace non-numeric entries with NaN
+                values = pd.to_numeric(values, errors='coerce')
+            if is_extension_array_dtype(values.dtype):  # nullable dtypes, e.g. Int64 or boolean holding pd.NA
+                columns.append(values.to_numpy(dtype=float, na_value=np.nan))
+            else:
+                columns.append(values.to_numpy())
+
+        positions_by_dtype = defaultdict(list)
+        for position, values in enumerate(columns):
+            positions_by_dtype[values.dtype].append(position)
+        for dtype, positions in positions_by_dtype.items():
+            block = np.column_stack([columns[position] for position in positions])
+            zeros = block == 0
+            zeros[:, self._nunique(block) <= 5] = False  # keep 0 in categorical columns
+            if dtype.kind == 'f':  # replace 0 with NaN in place
+                block[zeros] = np.nan
+                for index, position in enumerate(positions):
+                    columns[position] = block[:, index]
+            else:  # integer columns need a float copy, but only if they contain 0
+                for index in np.flatnonzero(zeros.any(axis=0)):
+                    values = block[:, index].astype(float)
+                    values[zeros[:, index]] = np.nan
+                    columns[positions[index]] = values
+
+        keep_columns = [not (values.dtype.kind == 'f' and np.isnan(values).all()) for values in columns]
+        target_values = columns[frame.columns.get_loc(self.target_label)]
+        keep_rows = ~pd.isna(target_values)  # drop rows with NaN in target column
+        cleaned = pd.DataFrame(
+            {position: values for position, values in enumerate(columns) if keep_columns[position]}, index=frame.index
+        )
+        cleaned.columns = frame.columns[keep_columns]  # drop columns with all NaN
+        return cleaned.loc[keep_rows]
+
+    @staticmethod
+    def _nunique(block: np.ndarray) -> np.ndarray:
+        """Number of unique non-NaN values per column, NaN is sorted to the end of each column"""
+        block = np.sort(block, axis=0)
+        if block.dtype.kind != 'f':
+            return 1 + (block[1:] != block[:-1]).sum(axis=0) if len(block) else np.zeros(block.shape[1], dtype=int)
+        valid = ~np.isnan(block)
+        return valid[:1].sum(axis=0) + ((block[1:] != block[:-1]) & valid[1:]).sum(axis=0)
+
     @staticmethod
     def _clean_up_regex(regex: str) -> list:
         """Clean up regex"""
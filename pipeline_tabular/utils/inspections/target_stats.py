@@ -1,31 +1,85 @@
 import os
+import sys
+import json
+import multiprocessing
 
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from loguru import logger
+from omegaconf import OmegaConf
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler
 
-from pipeline_tabular.data_handler.data_handler import DataHandler
+from pipeline_tabular.data_handler.data_handler import DataHandler, RunContext
+from pipeline_tabular.data_handler.memo_cache import MemoCache
+from pipeline_tabular.utils.correlation import correlated_pairs, correlation_matrix, correlation_to_target
+from pipeline_tabular.utils.helpers import hash_frame
+
+
+def _explore_in_background(config, frame: pd.DataFrame, cache_key: str) -> None:
+    """Entry point of the background exploration process"""
+    logger.remove()
+    logger.add(sys.stderr, level=config.meta.logging_level)
+    exploration = DataExploration(config, RunContext())
+    exploration.explore(frame, cache_key)
 
 
 class DataExploration(DataHandler):
     """Performs some data exploration and sets the learning task"""
 
-    def __init__(self, config):
-        super().__init__()
+    def __init__(self, config, context=None):
+        super().__init__(context)
         self.config = config
         self.plot_format = config.meta.plot_format
         self.learn_task = config.meta.learn_task
         self.target_label = config.meta.target_label
         self.out_dir = config.meta.output_dir
         self.corr_method = config.selection.corr_method
+        self.corr_thresh = config.selection.corr_thresh
+        self.corr_block_size = config.selection.corr_block_size
         self.variance_thresh = config.selection.variance_thresh
+        self.exploration_mode = config.exploration.mode
+        self.max_plot_features = config.exploration.max_plot_features
+        self.feature_sampling = config.exploration.feature_sampling
+        self.exploration_process = None
 
     def __call__(self) -> None:
+        """Explore the data inline or in a background process, skipped if the outputs are up to date"""
+        if self.exploration_mode == 'skip':
+            return
         frame = self.get_frame()
+        cache_key = MemoCache.key(  # all settings that change the outputs
+            hash_frame(frame),
+            OmegaConf.to_container(self.config.exploration, resolve=True),
+            [self.target_label, self.learn_task, self.plot_format],
+            [self.corr_method, self.corr_thresh, self.corr_block_size],
+        )
+        if self.config.exploration.cache and self.outputs_up_to_date(cache_key):
+            logger.info('Exploration outputs are up to date, skipping exploration')
+            return
+        if self.exploration_mode == 'background':
+            logger.info('Running exploration in a background process')
+            self.exploration_process = multiprocessing.get_context('spawn').Process(
+                target=_explore_in_background, args=(self.config, frame, cache_key)
+            )
+            self.exploration_process.start()
+        elif self.exploration_mode == 'inline':
+            self.explore(frame, cache_key)
+        else:
+            raise ValueError(f'Unknown exploration mode: {self.exploration_mode}, allowed -> inline, background, skip')
+
+    def join(self) -> None:
+        """Wait for the background exploration to finish"""
+        if self.exploration_process is not None:
+            self.exploration_process.join()
+            if self.exploration_process.exitcode != 0:
+                logger.warning(f'Background exploration failed with exit code {self.exploration_process.exitcode}')
+            self.exploration_process = None
+
+    def explore(self, frame: pd.DataFrame, cache_key: str = None) -> None:
+        """Compute all exploration outputs"""
         target_frame = frame[self.target_label]
         imp_frame = SimpleImputer(strategy='median', keep_empty_features=True).fit_transform(frame)
         frame = pd.DataFrame(imp_frame, index=frame.index, columns=frame.columns)
@@ -33,39 +87,95 @@ class DataExploration(DataHandler):
         frame = frame.drop(binary_cols, axis=1)
         unary_cols = frame.nunique()[frame.nunique() == 1].index
         frame = frame.drop(unary_cols, axis=1)
+        plot_features = self.sample_features(frame, target_frame)
         norm_frame = StandardScaler().fit_transform(frame)
         self.frame = pd.concat(
             [pd.DataFrame(norm_frame, index=frame.index, columns=frame.columns), target_frame], axis=1
         )
+        self.plot_frame = self.frame[plot_features]
+        self.outputs = []
         self.corr_to_target()
+        if self.config.exploration.corr_matrix:
+            self.save_corr_matrix()
         self.plot_cluster_map()
         self.plot_corr_heatmap()
         self.plot_stats()
+        if cache_key is not None:
+            with open(os.path.join(self.out_dir, 'exploration.json'), 'w', encoding='utf-8') as cache_file:
+                json.dump({'key': cache_key, 'outputs': self.outputs}, cache_file)
+
+    def outputs_up_to_date(self, cache_key: str) -> bool:
+        """Check whether all outputs of an exploration of the same frame and settings exist"""
+        try:
+            with open(os.path.join(self.out_dir, 'exploration.json'), 'r', encoding='utf-8') as cache_file:
+                cached = json.load(cache_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        return cached['key'] == cache_key and all(os.path.isfile(output) for output in cached['outputs'])
+
+    def sample_features(self, frame: pd.DataFrame, target_frame: pd.Series) -> list:
+        """Features shown in cluster map and heatmap, with highest variance or absolute correlation to target"""
+        if len(frame.columns) <= self.max_plot_features:
+            return list(frame.columns)
+        if self.feature_sampling == 'variance':  # before standardisation, afterwards all variances are 1
+            scores = frame.var()
+        elif self.feature_sampling == 'target_corr':
+            scores = pd.Series(
+                np.abs(correlation_to_target(frame.to_numpy(), target_frame.to_numpy(dtype=float), 'pearson')),
+                index=frame.columns,
+            )
+        else:
+            raise ValueError(f'Unknown feature sampling: {self.feature_sampling}, allowed -> variance, target_corr')
+        selected = set(scores.nlargest(self.max_plot_features).index)
+        logger.info(f'Plotting {len(selected)}/{len(frame.columns)} features selected by {self.feature_sampling}')
+        return [column for column in frame.columns if column in selected]  # keep original order
 
     def corr_to_target(self) -> None:
         y = self.frame[self.target_label]
         x = self.frame.drop(self.target_label, axis=1)
-        corr_series = x.corrwith(y, axis=0, method=self.corr_method).round(2)
+        if self.corr_method in ['pearson', 'spearman']:
+            corr_series = correlation_to_target(x.to_numpy(), y.to_numpy(), self.corr_method)
+            corr_series = pd.Series(corr_series, index=x.columns).round(2)
+        else:
+            corr_series = x.corrwith(y, axis=0, method=self.corr_method).round(2)
         corr_df = pd.DataFrame({'correlation_to_target': corr_series.values, 'feature': corr_series.index})
         corr_df = corr_df.sort_values(by='correlation_to_target')
-        corr_df.to_csv(
-            os.path.join(self.out_dir, f'feature_{self.corr_method}_corr_target_{self.target_label}.txt'),
-            sep='\t',
-            header=True,
-            index=False,
+        out_path = os.path.join(self.out_dir, f'feature_{self.corr_method}_corr_target_{self.target_label}.txt')
+        corr_df.to_csv(out_path, sep='\t', header=True, index=False)
+        self.outputs.append(out_path)
+
+    def save_corr_matrix(self) -> None:
+        """Stream the full correlation matrix to disk and list all correlated pairs"""
+        if self.corr_method not in ['pearson', 'spearman']:
+            logger.warning(f'Full correlation matrix is not available for {self.corr_method} correlation')
+            return
+        frame = self.frame.drop(self.target_label, axis=1)
+        matrix_path = os.path.join(self.out_dir, f'feature_{self.corr_method}_corr_matrix.npy')
+        rows, cols, abs_corrs = correlated_pairs(
+            frame.to_numpy(), self.corr_method, self.corr_thresh, self.corr_block_size, memmap_path=matrix_path
+        )
+        pairs = pd.DataFrame(
+            {'feature_1': frame.columns[rows], 'feature_2': frame.columns[cols], 'abs_correlation': abs_corrs}
         )
+        pairs_path = os.path.join(self.out_dir, f'feature_{self.corr_method}_corr_pairs.txt')
+        pairs.sort_values(by='abs_correlation', ascending=False).to_csv(pairs_path, sep='\t', header=True, index=False)
+        self.outputs.extend([matrix_path, pairs_path])
 
     def plot_cluster_map(self) -> None:
-        frame = self.frame.drop(self.target_label, axis=1)
-        cluster_map = sns.clustermap(frame, figsize=(20, 20), cmap='coolwarm', method='ward', metric='euclidean')
-        cluster_map.savefig(
-            os.path.join(self.out_dir, f'feature_{self.corr_method}_cluster_map.{self.plot_format}'), dpi=300
+        cluster_map = sns.clustermap(
+            self.plot_frame, figsize=(20, 20), cmap='coolwarm', method='ward', metric='euclidean'
         )
-        plt.clf()
+        out_path = os.path.join(self.out_dir, f'feature_{self.corr_method}_cluster_map.{self.plot_format}')
+        cluster_map.savefig(out_path, dpi=300)
+        plt.close(cluster_map.fig)
+        self.outputs.append(out_path)
 
     def plot_corr_heatmap(self) -> None:
-        frame = self.frame.drop(self.target_label, axis=1)
-        corr_matrix = frame.corr(method=self.corr_method)
+        if self.corr_method in ['pearson', 'spearman']:
+            corr_matrix = correlation_matrix(self.plot_frame.to_numpy(), self.corr_method)
+            corr_matrix = pd.DataFrame(corr_matrix, index=self.plot_frame.columns, columns=self.plot_frame.columns)
+        else:
+            corr_matrix = self.plot_frame.corr(method=self.corr_method)
         corr_matrix = corr_matrix.dropna(axis=0, how='all').dropna(axis=1, how='all')
         mask = np.triu(np.ones_like(corr_matrix, dtype=bool))
         corr_plot = sns.heatmap(
@@ -82,9 +192,10 @@ class DataExploration(DataHandler):
         )
         corr_plot.figure.tight_layout()
         corr_plot = corr_plot.get_figure()
-        corr_plot.savefig(
-            os.path.join(self.out_dir, f'feature_{self.corr_method}_corr_heatmap.{self.plot_format}'), dpi=300
-        )
+        out_path = os.path.join(self.out_dir, f'feature_{self.corr_method}_corr_heatmap.{self.plot_format}')
+        corr_plot.savefig(out_path, dpi=300)
+        plt.close(corr_plot)
+        self.outputs.append(out_path)
 
     def plot_stats(self) -> None:
         """Plot target statistics"""
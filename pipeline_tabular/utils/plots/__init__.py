@@ -0,0 +1 @@
+from pipeline_tabular.utils.plots.plot_queue import PlotRenderer, render_pending, submit_plot
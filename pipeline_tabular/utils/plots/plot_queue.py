@@ -0,0 +1,146 @@
+import os
+import sys
+import glob
+import time
+import uuid
+import pickle
+import multiprocessing
+
+from loguru import logger
+
+from pipeline_tabular.utils.plots.renderers import RENDERERS
+
+PLOT_MODES = ['inline', 'background', 'deferred']
+CLAIM_TIMEOUT = 600  # seconds, jobs claimed longer ago belong to a renderer that died and are queued again
+
+
+def plot_spool_dir(config) -> str:
+    """Directory holding the queued plot jobs of the configured experiment"""
+    return os.path.join(config.meta.output_dir, config.meta.experiment, 'plot_jobs')
+
+
+def submit_plot(config, renderer: str, out_path: str, **data) -> None:
+    """Render a plot right away or queue its data for the plot renderer, depending on meta.plot_mode
+
+    Only the data needed to draw the plot is stored, i.e. compute workers never block on rendering.
+    """
+    if renderer not in RENDERERS:
+        raise ValueError(f'Unknown plot renderer: {renderer}, allowed -> {", ".join(RENDERERS)}')
+    job = {'renderer': renderer, 'out_path': out_path, 'data': data}
+    if config.meta.plot_mode == 'inline':
+        render_job(job)
+        return
+    spool_dir = plot_spool_dir(config)
+    os.makedirs(spool_dir, exist_ok=True)
+    job_path = os.path.join(spool_dir, f'{time.time_ns()}_{uuid.uuid4().hex}.pkl')
+    with open(f'{job_path}.tmp', 'wb') as job_file:
+        pickle.dump(job, job_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f'{job_path}.tmp', job_path)  # atomic, the renderer never reads a partial job
+
+
+def render_job(job: dict) -> None:
+    os.makedirs(os.path.dirname(job['out_path']) or '.', exist_ok=True)
+    RENDERERS[job['renderer']](job['out_path'], **job['data'])
+
+
+def render_pending(spool_dir: str) -> int:
+    """Render all queued plot jobs in submission order, failed jobs are kept as .failed for inspection
+
+    Jobs are claimed by an atomic rename, i.e. several renderers (e.g. of worker nodes) can share a spool directory.
+    Jobs of renderers that died while rendering are queued again once their claim is older than CLAIM_TIMEOUT.
+    """
+    requeue_stale(spool_dir)
+    n_rendered = 0
+    for job_path in sorted(glob.glob(os.path.join(spool_dir, '*.pkl'))):
+        rendering_path = f'{job_path}.rendering'
+        try:
+            os.replace(job_path, rendering_path)
+            os.utime(rendering_path)  # claim time, the rename keeps the submission time
+        except FileNotFoundError:  # claimed by another renderer
+            continue
+        try:
+            with open(rendering_path, 'rb') as job_file:
+                job = pickle.load(job_file)
+            render_job(job)
+        except Exception as error:  # a single broken plot must not stop the others
+            logger.warning(f'Could not render plot job {job_path} -> {error}')
+            try:
+                os.replace(rendering_path, f'{job_path}.failed')
+            except FileNotFoundError:  # claim timed out and job queued again
+                pass
+            continue
+        try:
+            os.remove(rendering_path)
+        except FileNotFoundError:  # claim timed out and job queued again, rendered twice
+            pass
+        n_rendered += 1
+    return n_rendered
+
+
+def requeue_stale(spool_dir: str, claim_timeout: float = CLAIM_TIMEOUT) -> int:
+    """Queue jobs claimed longer than claim_timeout seconds ago again, returns the number of queued jobs"""
+    n_requeued = 0
+    for rendering_path in glob.glob(os.path.join(spool_dir, '*.pkl.rendering')):
+        try:
+            if time.time() - os.path.getmtime(rendering_path) < claim_timeout:
+                continue
+            os.replace(rendering_path, rendering_path[: -len('.rendering')])
+        except FileNotFoundError:  # finished or queued again by another renderer
+            continue
+        n_requeued += 1
+    if n_requeued:
+        logger.warning(f'Queued {n_requeued} plot jobs of renderers that stopped while rendering them again')
+    return n_requeued
+
+
+def _render_loop(spool_dir: str, stop_event, logging_level: str, poll_interval: float) -> None:
+    """Entry point of the plot renderer process"""
+    import matplotlib
+
+    matplotlib.use('Agg')
+    logger.remove()
+    logger.add(sys.stderr, level=logging_level)
+    while not stop_event.is_set():
+        render_pending(spool_dir)
+        stop_event.wait(poll_interval)
+    n_rendered = render_pending(spool_dir)  # drain jobs submitted until the run finished
+    logger.debug(f'Plot renderer stopped, rendered {n_rendered} remaining plots')
+
+
+class PlotRenderer:
+    """Renders queued plot jobs in a separate process while the pipeline runs
+
+    Used as a context manager around the run, the remaining jobs are rendered on exit.
+    """
+
+    def __init__(self, config, poll_interval: float = 1.0) -> None:
+        self.plot_mode = config.meta.plot_mode
+        if self.plot_mode not in PLOT_MODES:
+            raise ValueError(f'Unknown plot mode: {self.plot_mode}, allowed -> {", ".join(PLOT_MODES)}')
+        self.spool_dir = plot_spool_dir(config)
+        self.logging_level = config.meta.logging_level
+        self.poll_interval = poll_interval
+        self.stop_event = None
+        self.render_process = None
+
+    def __enter__(self):
+        if self.plot_mode == 'background':
+            mp_context = multiprocessing.get_context('spawn')
+            self.stop_event = mp_context.Event()
+            self.render_process = mp_context.Process(
+                target=_render_loop, args=(self.spool_dir, self.stop_event, self.logging_level, self.poll_interval)
+            )
+            self.render_process.start()
+        elif self.plot_mode == 'deferred':
+            logger.info(f'Plots are queued in {self.spool_dir}, render them using python3 render_plots.py')
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        if self.render_process is not None:
+            logger.info('Waiting for the plot renderer to finish...')
+            self.stop_event.set()
+            self.render_process.join()
+            if self.render_process.exitcode != 0:
+                logger.warning(f'Plot renderer failed with exit code {self.render_process.exitcode}')
+            self.render_process = None
+        return False
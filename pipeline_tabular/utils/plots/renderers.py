@@ -0,0 +1,265 @@
+import os
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+
+def corr_heatmap(out_path: str, abs_corr: pd.DataFrame) -> None:
+    """Heatmap of absolute correlations between features"""
+    fig = plt.figure(figsize=(20, 20))
+    sns.heatmap(abs_corr, annot=False, xticklabels=True, yticklabels=True, cmap='viridis')
+    plt.xticks(rotation=90)
+    plt.savefig(out_path, dpi=300)
+    plt.close(fig)
+
+
+def rfecv_scores(
+    out_path: str, n_features: np.ndarray, mean_scores: np.ndarray, std_scores: np.ndarray, scoring: str, estimator: str
+) -> None:
+    """Cross-validated score for increasing number of features"""
+    fig = plt.figure()
+    plt.xlabel('Number of features selected')
+    plt.ylabel(f'Mean {scoring}')
+    plt.xticks(range(0, max(n_features) + 1, 5))
+    plt.grid(alpha=0.5)
+    plt.errorbar(n_features, mean_scores, yerr=std_scores)
+    plt.title(f'Recursive Feature Elimination for {estimator} estimator')
+    plt.savefig(out_path, dpi=300)
+    plt.close(fig)
+
+
+def feature_importance(out_path: str, importances: pd.DataFrame, estimator: str, target_label: str) -> None:
+    """Horizontal bar plot of feature importances"""
+    ax = importances.plot.barh()
+    fig = ax.get_figure()
+    plt.title(f'Feature importance' f'\n{estimator} estimator for target: {target_label}')
+    plt.xlabel('Feature importance')
+    plt.tight_layout()
+    plt.gca().legend_.remove()
+    plt.savefig(out_path, dpi=300)
+    plt.close(fig)
+
+
+def box_plot_by_target(out_path: str, frame: pd.DataFrame, target_label: str) -> None:
+    """Box plot of each feature split by target"""
+    fig = plt.figure()
+    sns.boxplot(
+        data=frame.melt(id_vars=[target_label]),
+        x='value',
+        y='variable',
+        hue=target_label,
+        orient='h',
+        meanline=True,
+        showmeans=True,
+    )
+    plt.axvline(x=0, alpha=0.7, color='grey', linestyle='--')
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=300)
+    plt.close(fig)
+
+
+def box_plot(out_path: str, x_frame: pd.DataFrame) -> None:
+    """Box plot of each feature"""
+    fig = plt.figure()
+    sns.boxplot(data=x_frame, orient='h', meanline=True, showmeans=True, whis=1.5)
+    plt.axvline(x=0, alpha=0.7, color='grey', linestyle='--')
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=300)
+    plt.close(fig)
+
+
+def dis_plot(out_path: str, x_frame: pd.DataFrame) -> None:
+    """Distribution of each feature"""
+    grid = sns.displot(data=x_frame, kind='kde')
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=300)
+    plt.close(grid.fig)
+
+
+def scatter_projection(
+    out_path: str, projection: np.ndarray, color: pd.Series, target_label: str, title: str, export_svg: bool = False
+) -> None:
+    """Interactive 2D or 3D scatter plot of a projection, saved as html and optionally as svg"""
+    import plotly.express as px
+
+    if projection.shape[1] == 2:
+        fig = px.scatter(
+            projection,
+            x=0,
+            y=1,
+            color=color,
+            labels={'color': target_label},
+            title=title,
+            color_continuous_scale='viridis',
+        )
+    else:
+        fig = px.scatter_3d(
+            projection,
+            x=0,
+            y=1,
+            z=2,
+            color=color,
+            labels={'color': target_label},
+            title=title,
+            color_continuous_scale='viridis',
+        )
+        fig.update_traces(marker_size=5)
+    fig.write_html(out_path)
+    if export_svg:  # needs kaleido
+        fig.write_image(f'{os.path.splitext(out_path)[0]}.svg')
+
+
+def feature_ranking(out_path: str, job_scores: pd.DataFrame, figsize: tuple = None, font_size: float = None) -> None:
+    """Horizontal bar plot of the average feature ranking of a job"""
+    with plt.rc_context(_font(font_size)):
+        ax = job_scores.plot.barh(x='feature', y='score', figsize=figsize, color='green')
+        fig = ax.get_figure()
+        plt.title('Average feature ranking')
+        plt.xlabel('Average feature ranking')
+        plt.tight_layout()
+        plt.gca().legend_.remove()
+        plt.savefig(out_path, dpi=300)
+        plt.close(fig)
+
+
+def score_heatmap(out_path: str, scores: pd.DataFrame, xticklabels: list, cmap: str, font_size: float = None) -> None:
+    """Heatmap of mean scores per model and job"""
+    with plt.rc_context(_font(font_size)):
+        fig = plt.figure()
+        sns.heatmap(
+            scores.astype(float),
+            annot=True,
+            xticklabels=xticklabels,
+            yticklabels=True,
+            vmin=0.5,
+            vmax=0.81,
+            cmap=cmap,
+            fmt='.2g',
+        )
+        plt.xticks(rotation=45)
+        plt.yticks(rotation=0)
+        plt.tight_layout()
+        plt.savefig(out_path, dpi=300)
+        plt.close(fig)
+
+
+def conf_matrix(out_path: str, matrix: np.ndarray, font_size: float = None) -> None:
+    """Mean confusion matrix"""
+    from sklearn.metrics import ConfusionMatrixDisplay
+
+    with plt.rc_context(_font(font_size)):
+        display = ConfusionMatrixDisplay(matrix)
+        display.plot(cmap='Blues', values_format='.2f')
+        display.figure_.tight_layout()
+        display.figure_.savefig(out_path, dpi=300)
+        plt.close(display.figure_)
+
+
+def mean_rocs(out_path: str, rocs: list, title: str, show_ci: bool = False, font_size: float = None) -> None:
+    """Mean ROC curves, rocs holds (roc, label, color or None) for each curve"""
+    from roc_utils import plot_mean_roc
+
+    with plt.rc_context(_font(font_size)):
+        fig, ax = plt.subplots()
+        for roc, label, color in rocs:  # without color, the default color of plot_mean_roc is used
+            colors = {} if color is None else {'color': color}
+            plot_mean_roc(roc, show_ci=show_ci, show_ti=False, show_opt=False, ax=ax, label=label, **colors)
+        ax.set_title(title)
+        fig.savefig(out_path, dpi=300)
+        plt.close(fig)
+
+
+def metric_box_plot(out_path: str, results: pd.DataFrame, metric: str, font_size: float = None) -> None:
+    """Box plot of a metric for each experiment"""
+    with plt.rc_context(_font(font_size)):
+        fig = plt.figure()
+        sns.boxplot(data=results, x='experiment', y=metric)
+        plt.xticks(rotation=45, ha='right')
+        plt.tight_layout()
+        fig.savefig(out_path, dpi=300)
+        plt.close(fig)
+
+
+def p_value_heatmap(
+    out_path: str,
+    p_values: pd.DataFrame,
+    title: str,
+    figsize: tuple = None,
+    xticklabels: list = None,
+    yticklabels: list = None,
+    font_size: float = None,
+) -> None:
+    """Heatmap of pairwise p-values, tick labels replace the row and column names if given"""
+    with plt.rc_context(_font(font_size)):
+        fig = plt.figure(figsize=figsize)
+        sns.heatmap(p_values.astype(float), annot=True, cmap='PuBuGn', fmt='.2f')
+        plt.title(title)
+        if xticklabels is not None:
+            plt.xticks(ticks=plt.xticks()[0], labels=xticklabels)
+        if yticklabels is not None:
+            plt.yticks(ticks=plt.yticks()[0], labels=yticklabels)
+        plt.xticks(rotation=45, ha='right')
+        plt.yticks(rotation=0)
+        plt.tight_layout()
+        fig.savefig(out_path, dpi=300)
+        plt.close(fig)
+
+
+def shap_summary(out_path: str, shap_values, x_test: pd.DataFrame, features: list, font_size: float = None) -> None:
+    """SHAP summary plot of one class (array) or all classes (list of arrays)"""
+    import shap
+
+    with plt.rc_context(_font(font_size)):
+        shap.summary_plot(shap_values, x_test, features, show=False)
+        plt.tight_layout()
+        plt.savefig(out_path, dpi=300)
+        plt.close(plt.gcf())
+
+
+def shap_heatmap(out_path: str, explanation, font_size: float = None) -> None:
+    """SHAP heatmap of all test samples"""
+    import shap
+
+    with plt.rc_context(_font(font_size)):
+        shap.plots.heatmap(explanation, show=False)
+        plt.tight_layout()
+        plt.savefig(out_path, dpi=300)
+        plt.close(plt.gcf())
+
+
+def coefficients(out_path: str, features: list, values: np.ndarray, font_size: float = None) -> None:
+    """Horizontal bar plot of model coefficients"""
+    with plt.rc_context(_font(font_size)):
+        fig = plt.figure()
+        plt.barh(features, values, color='yellowgreen')
+        plt.title('Feature coefficients')
+        plt.tight_layout()
+        plt.savefig(out_path, dpi=300)
+        plt.close(fig)
+
+
+def _font(font_size: float = None) -> dict:
+    """rc parameters of a renderer, the font size of the submitting process is lost when rendering elsewhere"""
+    return {} if font_size is None else {'font.size': font_size}
+
+
+RENDERERS = {
+    'corr_heatmap': corr_heatmap,
+    'rfecv_scores': rfecv_scores,
+    'feature_importance': feature_importance,
+    'box_plot_by_target': box_plot_by_target,
+    'box_plot': box_plot,
+    'dis_plot': dis_plot,
+    'scatter_projection': scatter_projection,
+    'feature_ranking': feature_ranking,
+    'score_heatmap': score_heatmap,
+    'conf_matrix': conf_matrix,
+    'mean_rocs': mean_rocs,
+    'metric_box_plot': metric_box_plot,
+    'p_value_heatmap': p_value_heatmap,
+    'shap_summary': shap_summary,
+    'shap_heatmap': shap_heatmap,
+    'coefficients': coefficients,
+}
@@ -0,0 +1,159 @@
+import os
+import time
+import resource
+from contextlib import contextmanager
+
+import pandas as pd
+from loguru import logger
+
+from pipeline_tabular.utils.resources import busy_cpu_seconds
+
+LABELS = ['seed', 'boot_iter', 'job', 'n_top', 'model']
+
+
+def _peak_rss() -> float:
+    """Peak resident memory of this process in MB since the last reset (Linux), else since the process started"""
+    try:
+        with open('/proc/self/status', 'r', encoding='utf-8') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reset_peak_rss() -> None:
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='utf-8') as clear_refs_file:
+            clear_refs_file.write('5')  # resets VmHWM to the current resident memory
+    except OSError:
+        pass
+
+
+class Profiler:
+    """Records wall time, CPU time and peak RSS of nested pipeline stages, an inactive profiler records nothing
+
+    Stages inherit the labels (seed, boot_iter, job, n_top, model) of their parent stage, their path joins the names
+    of all enclosing stages. cpu_seconds is the CPU time of this process, busy_cpu_seconds additionally includes its
+    child processes (e.g. process pool workers). Peak RSS is measured for this process only.
+    """
+
+    def __init__(self, active: bool = False) -> None:
+        self.active = active
+        self.records = []
+        self._stack = []  # open stages -> [path, labels, peak rss]
+
+    @contextmanager
+    def stage(self, name: str, **labels):
+        if not self.active:
+            yield
+            return
+        parent_path, parent_labels = (self._stack[-1][0], self._stack[-1][1]) if self._stack else ('', {})
+        frame = [f'{parent_path};{name}' if parent_path else name, {**parent_labels, **labels}, 0.0]
+        self._fold_peak()  # peak of the parents so far, reset for this stage
+        _reset_peak_rss()
+        self._stack.append(frame)
+        start_wall, start_cpu, start_busy = time.perf_counter(), time.process_time(), busy_cpu_seconds()
+        try:
+            yield
+        finally:
+            wall, cpu, busy = time.perf_counter(), time.process_time(), busy_cpu_seconds()
+            self._fold_peak()
+            self._stack.pop()
+            self.records.append(
+                {
+                    'path': frame[0],
+                    'stage': name,
+                    **{label: frame[1].get(label) for label in LABELS},
+                    'wall_seconds': wall - start_wall,
+                    'cpu_seconds': cpu - start_cpu,
+                    'busy_cpu_seconds': busy - start_busy,
+                    'peak_rss_mb': frame[2],
+                }
+            )
+
+    def merge(self, records: list) -> None:
+        """Add records of another process (e.g. a seed worker) below the currently open stage"""
+        if not self.active:
+            return
+        parent_path, parent_labels = (self._stack[-1][0], self._stack[-1][1]) if self._stack else ('', {})
+        for record in records:
+            path = f'{parent_path};{record["path"]}' if parent_path else record['path']
+            labels = {label: parent_labels.get(label) if record[label] is None else record[label] for label in LABELS}
+            self.records.append({**record, **labels, 'path': path})
+
+    def record(self, name: str, wall_seconds: float, cpu_seconds: float, **labels) -> None:
+        """Add a stage measured elsewhere below the currently open stage, e.g. the summed task time of a model in a
+        process pool, machine-wide CPU time and peak RSS are unknown"""
+        record = {
+            'path': name,
+            'stage': name,
+            **{label: labels.get(label) for label in LABELS},
+            'wall_seconds': wall_seconds,
+            'cpu_seconds': cpu_seconds,
+            'busy_cpu_seconds': None,
+            'peak_rss_mb': None,
+        }
+        self.merge([record])
+
+    def save(self, out_dir: str, name: str = 'timings') -> None:
+        """Save all records as <name>.parquet and a flame-style summary as <name>.folded and <name>_summary.txt"""
+        if not self.active or not self.records:
+            return
+        timings = pd.DataFrame(self.records, dtype=object).astype(  # labels can be missing
+            {'seed': 'string', 'boot_iter': 'Int64', 'job': 'string', 'n_top': 'Int64', 'model': 'string'}
+        )
+        timings = timings.astype({column: float for column in timings.columns if column.endswith(('seconds', 'mb'))})
+        timings.to_parquet(os.path.join(out_dir, f'{name}.parquet'), engine='fastparquet')
+        totals = timings.groupby('path', sort=False).agg(
+            calls=('wall_seconds', 'size'),
+            wall_seconds=('wall_seconds', 'sum'),
+            cpu_seconds=('cpu_seconds', 'sum'),
+            busy_cpu_seconds=('busy_cpu_seconds', lambda seconds: seconds.sum(min_count=1)),  # unknown for records
+            peak_rss_mb=('peak_rss_mb', 'max'),
+        )
+        with open(os.path.join(out_dir, f'{name}.folded'), 'w', encoding='utf-8') as folded_file:
+            folded_file.write(''.join(f'{path} {round(ms)}\n' for path, ms in self.self_times(totals).items()))
+        with open(os.path.join(out_dir, f'{name}_summary.txt'), 'w', encoding='utf-8') as summary_file:
+            summary_file.write(self.summary(totals))
+        logger.info(f'Timings of {len(timings)} stages saved to {os.path.join(out_dir, name)}.parquet')
+
+    @staticmethod
+    def self_times(totals: pd.DataFrame) -> pd.Series:
+        """Wall time in ms spent in each path itself, i.e. not in its child stages (collapsed stack format)"""
+        self_ms = totals['wall_seconds'] * 1000
+        for path, wall_seconds in totals['wall_seconds'].items():
+            parent = path.rpartition(';')[0]
+            if parent in self_ms.index:
+                self_ms[parent] -= wall_seconds * 1000
+        return self_ms.clip(lower=0)
+
+    @staticmethod
+    def summary(totals: pd.DataFrame) -> str:
+        """Indented tree of all stages aggregated over seeds, children sorted by wall time"""
+        lines = [f'{"stage":<80} {"calls":>7} {"wall [s]":>10} {"cpu [s]":>10} {"busy [s]":>10} {"rss [MB]":>10}']
+
+        def add_children(parent: str, depth: int) -> None:
+            prefix = f'{parent};' if parent else ''
+            children = [
+                path for path in totals.index if path.startswith(prefix) and ';' not in path[len(prefix) :]
+            ]
+            for path in sorted(children, key=lambda path: -totals.at[path, 'wall_seconds']):
+                row = totals.loc[path]
+                name = '  ' * depth + path[len(prefix) :]
+                lines.append(
+                    f'{name[:80]:<80} {int(row.calls):>7} {row.wall_seconds:>10.1f} {row.cpu_seconds:>10.1f} '
+                    f'{row.busy_cpu_seconds:>10.1f} {row.peak_rss_mb:>10.0f}'
+                )
+                add_children(path, depth + 1)
+
+        add_children('', 0)
+        return '\n'.join(lines) + '\n'
+
+    def _fold_peak(self) -> None:
+        """Add the peak RSS since the last reset to all open stages"""
+        if self._stack:
+            peak = _peak_rss()
+            for frame in self._stack:
+                frame[2] = max(frame[2], peak)
@@ -0,0 +1,89 @@
+import os
+import time
+from contextlib import contextmanager
+
+from joblib import parallel_config
+from loguru import logger
+from threadpoolctl import threadpool_limits
+
+
+def busy_cpu_seconds() -> float:
+    """CPU seconds spent by this process and its child processes (e.g. pool workers), other tenants of the machine
+    are not included. Running children are only found on Linux, elsewhere only finished children are counted."""
+    times = os.times()
+    busy = times.user + times.system + times.children_user + times.children_system
+    return busy + sum(_process_cpu_seconds(pid) for pid in _child_pids(os.getpid()))
+
+
+def _child_pids(pid: int) -> list:
+    """Running descendants of a process, e.g. loky workers started by any thread"""
+    try:
+        tids = os.listdir(f'/proc/{pid}/task')
+    except OSError:
+        return []
+    children = []
+    for tid in tids:
+        try:
+            with open(f'/proc/{pid}/task/{tid}/children', 'r', encoding='utf-8') as children_file:
+                children += [int(child) for child in children_file.read().split()]
+        except OSError:  # thread or process exited meanwhile
+            continue
+    return children + [grandchild for child in children for grandchild in _child_pids(child)]
+
+
+def _process_cpu_seconds(pid: int) -> float:
+    """CPU seconds of a running process and of its finished children"""
+    try:
+        with open(f'/proc/{pid}/stat', 'r', encoding='utf-8') as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()  # the process name may contain spaces
+        return sum(int(ticks) for ticks in fields[11:15]) / os.sysconf('SC_CLK_TCK')  # utime, stime, cutime, cstime
+    except (OSError, ValueError, IndexError):  # exited meanwhile
+        return 0.0
+
+
+class ResourceManager:
+    """Worker budget of the pipeline, assigned to exactly one level of parallelism at each call site
+
+    A call site either runs a pool with all workers whose tasks are single-threaded (n_jobs(nested=True) inside the
+    pool), or a single estimator fit with all workers. BLAS/OpenMP threads of pool workers are pinned to blas_threads,
+    i.e. workers * blas_threads cores are used at most. Stages can be timed to log their core utilisation.
+    """
+
+    def __init__(self, workers: int, blas_threads: int = 1) -> None:
+        self.workers = max(1, int(workers))
+        self.blas_threads = max(1, int(blas_threads))
+        self.stage_stats = {}  # stage -> [wall seconds, busy cpu seconds]
+
+    def n_jobs(self, nested: bool = False) -> int:
+        """n_jobs of a call site, nested calls run inside the pool of the same call site and get a single job"""
+        return 1 if nested else self.workers
+
+    @contextmanager
+    def pinned(self):
+        """Pin BLAS/OpenMP threads of joblib pool workers started within the context"""
+        with parallel_config(backend='loky', inner_max_num_threads=self.blas_threads):
+            yield
+
+    def pin_process(self) -> None:
+        """Pin BLAS/OpenMP threads of the current process, e.g. a worker of a process pool"""
+        threadpool_limits(limits=self.blas_threads)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Accumulate wall time and CPU time of this process and its pool workers during a stage"""
+        start_wall, start_busy = time.perf_counter(), busy_cpu_seconds()
+        try:
+            yield
+        finally:
+            stats = self.stage_stats.setdefault(name, [0.0, 0.0])
+            stats[0] += time.perf_counter() - start_wall
+            stats[1] += busy_cpu_seconds() - start_busy
+
+    def log_utilisation(self) -> None:
+        """Log the average number of cores used by the pipeline processes in each stage relative to the worker budget"""
+        for name, (wall, busy) in self.stage_stats.items():
+            cores = busy / wall if wall > 0 else 0.0
+            logger.info(
+                f'{name}: {wall:.1f}s wall, {cores:.1f} cores used by the pipeline on average '
+                f'({cores / (self.workers * self.blas_threads):.0%} of {self.workers} workers)'
+            )
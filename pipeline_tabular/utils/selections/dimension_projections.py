@@ -1,12 +1,13 @@
 import os
 
 import pandas as pd
-import plotly.express as px
 from loguru import logger
 from sklearn.decomposition import PCA
 from sklearn.manifold import TSNE
 from umap import UMAP
 
+from pipeline_tabular.utils.plots import submit_plot
+
 
 def plot_bubble(func):
     """Creates 2D and 3D scatter plots of the frame"""
@@ -17,38 +18,22 @@ def plot_bubble(func):
         y_train = frame[self.target_label]
         x_train = frame.drop(self.target_label, axis=1)
 
-        proj_2d, proj_3d, name = func(self, x_train)  # call the wrapped function
+        proj_2d, proj_3d, name = func(self, x_train, *args[1:])  # call the wrapped function
         if show_plots:
-            if proj_2d is not None:
-                fig_2d = px.scatter(
-                    proj_2d,
-                    x=0,
-                    y=1,
-                    color=y_train,
-                    labels={'color': self.target_label},
-                    title=f'{name} 2D',
-                    color_continuous_scale='viridis',
-                )
-                fig_2d.write_image(os.path.join(self.job_dir, f'{name}_2d.svg'))
-                fig_2d.write_html(os.path.join(self.job_dir, f'{name}_2d.html'))
-            else:
-                logger.warning(f'Cannot plot {name} 2D, needs at least 2 features to run')
-
-            if proj_3d is not None:
-                fig_3d = px.scatter_3d(
-                    proj_3d,
-                    x=0,
-                    y=1,
-                    z=2,
+            for projection, n_dims in [(proj_2d, 2), (proj_3d, 3)]:
+                if projection is None:
+                    logger.warning(f'Cannot plot {name} {n_dims}D, needs at least {n_dims} features to run')
+                    continue
+                submit_plot(
+                    self.config,
+                    'scatter_projection',
+                    os.path.join(self.job_dir, f'{name}_{n_dims}d.html'),
+                    projection=projection,
                     color=y_train,
-                    labels={'color': self.target_label},
-                    title=f'{name} 3D',
-                    color_continuous_scale='viridis',
+                    target_label=self.target_label,
+                    title=f'{name} {n_dims}D',
+                    export_svg=n_dims == 2,
                 )
-                fig_3d.update_traces(marker_size=5)
-                fig_3d.write_html(os.path.join(self.job_dir, f'{name}_3d.html'))
-            else:
-                logger.warning(f'Cannot plot {name} 3D, needs at least 3 features to run')
 
         if proj_2d is not None:
             proj_2d = pd.DataFrame(proj_2d, index=frame.index)
@@ -68,7 +53,7 @@ class DimensionProjections:
     def __init__(self) -> None:
         self.job_dir = None
         self.metadata = None
-        self.workers = None
+        self.resources = None
         self.target_label = None
 
     @plot_bubble
@@ -88,10 +73,10 @@ class DimensionProjections:
         """Perform t-SNE dimensionality reduction and visualisation"""
         proj_2d, proj_3d = None, None
         if len(frame.columns) >= 2:
-            tsne_2d = TSNE(n_components=2, random_state=seed, n_jobs=self.workers)
+            tsne_2d = TSNE(n_components=2, random_state=seed, n_jobs=self.resources.n_jobs())
             proj_2d = tsne_2d.fit_transform(frame)
         if len(frame.columns) >= 3:
-            tsne_3d = TSNE(n_components=3, random_state=seed, n_jobs=self.workers)
+            tsne_3d = TSNE(n_components=3, random_state=seed, n_jobs=self.resources.n_jobs())
             proj_3d = tsne_3d.fit_transform(frame)
         return proj_2d, proj_3d, 't-SNE'
 
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import check_scoring
+
+SCHEDULES = ['constant', 'fraction', 'geometric']
+IMPORTANCES = ['model', 'permutation']
+
+
+def elimination_path(n_features: int, min_features: int, max_features: int, step: float, schedule: str) -> list:
+    """Number of remaining features after each elimination, from all features down to min_features
+
+    constant removes step features per elimination, fraction removes step * n_features (like a float step of RFECV)
+    and geometric removes step * remaining features, i.e. wide tables shrink quickly. The path always passes through
+    max_features, subsets above max_features are only eliminated and never scored.
+    """
+    if schedule == 'constant':
+        if int(step) != step or step < 1:
+            raise ValueError(f'Step of constant schedule must be an integer >= 1, got {step}')
+    elif schedule in ['fraction', 'geometric']:
+        if not 0 < step < 1:
+            raise ValueError(f'Step of {schedule} schedule must be in (0, 1), got {step}')
+    else:
+        raise ValueError(f'Unknown elimination schedule: {schedule}, allowed -> {", ".join(SCHEDULES)}')
+
+    path = [n_features]
+    while path[-1] > min_features:
+        n_current = path[-1]
+        if schedule == 'constant':
+            n_remove = int(step)
+        elif schedule == 'fraction':
+            n_remove = max(1, int(step * n_features))
+        else:
+            n_remove = max(1, int(step * n_current))
+        n_next = max(n_current - n_remove, min_features)
+        if n_current > max_features:
+            n_next = max(n_next, max_features)
+        path.append(n_next)
+    return path
+
+
+def feature_importances(estimator) -> np.ndarray:
+    """Feature importances of a fitted estimator, absolute coefficients for linear models"""
+    try:
+        return estimator.feature_importances_
+    except AttributeError:
+        coefs = np.abs(estimator.coef_)
+        return coefs.sum(axis=0) if coefs.ndim > 1 else coefs
+
+
+def _eliminate(model, support: np.ndarray, n_keep: int) -> np.ndarray:
+    """Keep the n_keep most important features of support, ties are eliminated in column order like RFE"""
+    order = np.argsort(feature_importances(model), kind='stable')
+    return np.sort(support[order[len(support) - n_keep :]])
+
+
+def _eliminate_fold(estimator, x_values, y_values, train, test, path, max_features, scorer) -> list:
+    """Run the whole elimination path on a single fold, returns the test scores of all subsets up to max_features"""
+    x_train, y_train = x_values[train], y_values[train]
+    x_test, y_test = x_values[test], y_values[test]
+    support = np.arange(x_values.shape[1])
+    scores = []
+    for n_features, n_next in zip(path, path[1:] + [None]):
+        model = clone(estimator).fit(x_train[:, support], y_train)
+        if n_features <= max_features:
+            scores.append(scorer(model, x_test[:, support], y_test))
+        if n_next is not None:
+            support = _eliminate(model, support, n_next)
+    return scores
+
+
+class RecursiveElimination:
+    """Recursive feature elimination with cross-validated number of features, similar to RFECV
+
+    Elimination follows a configurable schedule and is capped at max_features, i.e. larger subsets are eliminated
+    without being scored. Folds are eliminated in parallel. A fitted estimator on all features (e.g. the best estimator
+    of the hyperparameter search) is reused for the first elimination of the final path instead of refitting it.
+    """
+
+    def __init__(
+        self,
+        estimator,
+        cv: list,
+        scoring: str,
+        min_features: int = 2,
+        max_features: int = None,
+        step: float = 1,
+        schedule: str = 'constant',
+        n_jobs: int = 1,
+    ) -> None:
+        self.estimator = estimator
+        self.cv = cv
+        self.scoring = scoring
+        self.min_features = min_features
+        self.max_features = max_features
+        self.step = step
+        self.schedule = schedule
+        self.n_jobs = n_jobs
+
+    def fit(self, x_frame: pd.DataFrame, y_frame: pd.Series, fitted_estimator=None):
+        x_values, y_values = np.asarray(x_frame), np.asarray(y_frame)
+        n_features = x_values.shape[1]
+        max_features = n_features if self.max_features is None else max(self.max_features, self.min_features)
+        path = elimination_path(n_features, self.min_features, max_features, self.step, self.schedule)
+        scorer = check_scoring(self.estimator, self.scoring)
+
+        fold_scores = Parallel(n_jobs=self.n_jobs)(
+            delayed(_eliminate_fold)(self.estimator, x_values, y_values, train, test, path, max_features, scorer)
+            for train, test in self.cv
+        )
+        fold_scores = np.array(fold_scores)  # fold x scored subset, largest subset first
+        scored = [n for n in path if n <= max_features]
+        mean_scores = fold_scores.mean(axis=0)
+        best_index = len(scored) - 1 - np.nanargmax(mean_scores[::-1])  # ties -> fewer features, like RFECV
+        self.n_features_ = scored[best_index]
+        self.cv_results_ = {  # smallest subset first, like RFECV
+            'n_features': np.array(scored[::-1]),
+            'mean_test_score': mean_scores[::-1],
+            'std_test_score': fold_scores.std(axis=0)[::-1],
+        }
+
+        support = np.arange(n_features)
+        model = fitted_estimator
+        for n_next in path[1 : path.index(self.n_features_) + 1]:
+            if model is None:
+                model = clone(self.estimator).fit(x_values[:, support], y_values)
+            support = _eliminate(model, support, n_next)
+            model = None
+        self.estimator_ = model if model is not None else clone(self.estimator).fit(x_values[:, support], y_values)
+        self.support_ = np.zeros(n_features, dtype=bool)
+        self.support_[support] = True
+        return self
+
+
+def _fold_importances(estimator, x_values, y_values, train, test, importance, scorer, seed) -> np.ndarray:
+    """Importances of a single fit on the training part of a fold, permutation importances use the test part"""
+    model = clone(estimator).fit(x_values[train], y_values[train])
+    if importance == 'model':
+        return feature_importances(model)
+    return permutation_importance(
+        model, x_values[test], y_values[test], scoring=scorer, n_repeats=5, random_state=seed
+    ).importances_mean
+
+
+def rank_features(
+    estimator,
+    x_frame: pd.DataFrame,
+    y_frame: pd.Series,
+    cv: list,
+    scoring: str,
+    importance: str,
+    seed: int,
+    n_jobs: int,
+) -> np.ndarray:
+    """Mean importances of a single fit per fold, a cheap ranking instead of recursive elimination"""
+    if importance not in IMPORTANCES:
+        raise ValueError(f'Unknown importance: {importance}, allowed -> {", ".join(IMPORTANCES)}')
+    x_values, y_values = np.asarray(x_frame), np.asarray(y_frame)
+    scorer = check_scoring(estimator, scoring)
+    fold_importances = Parallel(n_jobs=n_jobs)(
+        delayed(_fold_importances)(estimator, x_values, y_values, train, test, importance, scorer, seed)
+        for train, test in cv
+    )
+    return np.mean(fold_importances, axis=0)
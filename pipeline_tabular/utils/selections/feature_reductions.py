@@ -1,16 +1,23 @@
 import os
 import mrmr
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
 from loguru import logger
+from scipy.stats import rankdata
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.feature_selection import VarianceThreshold
 from sklearn.inspection import permutation_importance
 
-from pipeline_tabular.utils.helpers import init_estimator
+from pipeline_tabular.utils.correlation import (
+    correlated_pairs,
+    correlation_matrix,
+    correlation_to_target,
+    dense_pairs,
+    greedy_decorrelate,
+)
+from pipeline_tabular.utils.helpers import fold_plan, init_estimator
+from pipeline_tabular.utils.plots import submit_plot
 from pipeline_tabular.utils.verifications.verification import CrossValidation
 
 
@@ -22,11 +29,13 @@ class FeatureReductions:
         self.plot_format = None
         self.job_dir = None
         self.metadata = None
-        self.workers = None
+        self.resources = None
         self.target_label = None
         self.corr_method = None
         self.corr_thresh = None
         self.corr_ranking = None
+        self.corr_block_size = None
+        self.corr_plot_features = None
         self.variance_thresh = None
         self.learn_task = None
         self.univariate_thresh = None
@@ -61,47 +70,67 @@ class FeatureReductions:
         """Compute correlation between features and optionally drop highly correlated ones"""
         y_frame = frame[self.target_label]
         x_frame = frame.drop(self.target_label, axis=1)
-        corr_matrix = x_frame.corr(method=self.corr_method).round(2)
+        vectorised = self.corr_method in ['pearson', 'spearman'] and not x_frame.isna().any(axis=None)
 
         # calculate feature importance
         if self.corr_ranking == 'forest':
-            estimator = RandomForestClassifier(random_state=seed, n_jobs=self.workers)
+            estimator = RandomForestClassifier(random_state=seed, n_jobs=self.resources.n_jobs())
             estimator.fit(x_frame, y_frame)
+            estimator.set_params(n_jobs=self.resources.n_jobs(nested=True))  # predicts inside the permutation pool
             scoring = self.config.selection.scoring[self.learn_task]
             perm_importances = permutation_importance(
-                estimator, x_frame, y_frame, n_repeats=5, scoring=scoring, random_state=seed, n_jobs=self.workers
+                estimator,
+                x_frame,
+                y_frame,
+                n_repeats=5,
+                scoring=scoring,
+                random_state=seed,
+                n_jobs=self.resources.n_jobs(),
             )
             importances = perm_importances.importances_mean
             importances = pd.Series(importances, index=x_frame.columns)
         elif self.corr_ranking == 'corr':
-            importances = x_frame.corrwith(y_frame, axis=0, method=self.corr_method).round(2)
+            if vectorised:
+                importances = correlation_to_target(
+                    x_frame.to_numpy(dtype=float), y_frame.to_numpy(dtype=float), self.corr_method
+                )
+                importances = pd.Series(importances, index=x_frame.columns).round(2)
+            else:
+                importances = x_frame.corrwith(y_frame, axis=0, method=self.corr_method).round(2)
             importances = importances.abs()
         else:
             logger.error(f'Selected corr_ranking method {self.corr_ranking} has not been implemented.')
             raise NotImplementedError
-        importances = importances.sort_values(ascending=False)
+        importances = importances.sort_values(ascending=False, kind='stable')
 
-        # sort corr_matrix w.r.t. feature importance
-        corr_matrix = corr_matrix.reindex(index=importances.index, columns=importances.index)
-        abs_corr = corr_matrix.abs()
-        upper_tri = abs_corr.where(np.triu(np.ones(abs_corr.shape), k=1).astype(bool))
+        # correlated pairs w.r.t. features sorted by importance, never holds the dense correlation matrix in memory
+        ranked_frame = x_frame[importances.index]
+        if vectorised:
+            rows, cols, _ = correlated_pairs(
+                ranked_frame.to_numpy(), self.corr_method, self.corr_thresh, block_size=self.corr_block_size
+            )
+        else:  # e.g. kendall
+            abs_corr = np.nan_to_num(ranked_frame.corr(method=self.corr_method).round(2).abs().to_numpy())
+            rows, cols, _ = dense_pairs(abs_corr, self.corr_thresh)
 
-        cols_to_drop = [col for col in upper_tri.columns if any(upper_tri[col] > self.corr_thresh)]
+        keep = greedy_decorrelate(rows, cols, len(importances))
+        cols_to_drop = list(importances.index[~keep])
         x_frame = x_frame.drop(cols_to_drop, axis=1)
         logger.info(
             f'Removed {len(cols_to_drop)} redundant features with correlation above {self.corr_thresh}, '
             f'number of remaining features: {len(x_frame.columns)}'
         )
-        abs_corr = abs_corr.drop(cols_to_drop, axis=0)
-        abs_corr = abs_corr.drop(cols_to_drop, axis=1)
 
-        # plot correlation heatmap
+        # plot correlation heatmap of the most important remaining features
         if self.config.plot_first_iter:
-            fig = plt.figure(figsize=(20, 20))
-            sns.heatmap(abs_corr, annot=False, xticklabels=True, yticklabels=True, cmap='viridis')
-            plt.xticks(rotation=90)
-            plt.savefig(os.path.join(self.job_dir, f'corr_plot.{self.plot_format}'), dpi=300)
-            plt.close(fig)
+            plot_features = importances.index[keep][: self.corr_plot_features]
+            if vectorised:
+                abs_corr = np.abs(correlation_matrix(x_frame[plot_features].to_numpy(), self.corr_method).round(2))
+            else:
+                abs_corr = x_frame[plot_features].corr(method=self.corr_method).round(2).abs().to_numpy()
+            abs_corr = pd.DataFrame(abs_corr, index=plot_features, columns=plot_features)
+            out_path = os.path.join(self.job_dir, f'corr_plot.{self.plot_format}')
+            submit_plot(self.config, 'corr_heatmap', out_path, abs_corr=abs_corr)
 
         new_frame = pd.concat([x_frame, y_frame], axis=1)
         features = list(x_frame.columns)
@@ -119,7 +148,7 @@ class FeatureReductions:
                 y_frame,
                 K=max(self.n_top_features),
                 cat_features=categorical,
-                n_jobs=self.workers,
+                n_jobs=self.resources.n_jobs(),
                 show_progress=False,
             )
         elif self.learn_task == 'regression':
@@ -128,7 +157,7 @@ class FeatureReductions:
                 y_frame,
                 K=max(self.n_top_features),
                 cat_features=categorical,
-                n_jobs=self.workers,
+                n_jobs=self.resources.n_jobs(),
                 show_progress=False,
             )
         else:
@@ -170,21 +199,25 @@ class FeatureReductions:
             seed,
             self.scoring,
             self.class_weight,
-            self.workers,
+            self.resources.n_jobs(nested=True),
         )
-        scores = {}
-        for feature in x_frame.columns:
-            optimiser = CrossValidation(
-                x_frame[[feature]],
-                y_frame,
-                estimator,
-                cross_validator,
-                self.param_grids[model],
-                scoring,
-                seed,
-                self.workers,
-            )
-            scores[feature] = optimiser().best_score_
+        if self.config.selection.univariate_mode == 'rank' and scoring == 'roc_auc':
+            scores = self.__univariate_auc(x_frame, y_frame, cross_validator)
+        else:  # exact mode, one grid search per feature
+            scores = {}
+            for feature in x_frame.columns:
+                optimiser = CrossValidation(
+                    x_frame[[feature]],
+                    y_frame,
+                    estimator,
+                    cross_validator,
+                    self.param_grids[model],
+                    scoring,
+                    seed,
+                    self.resources.n_jobs(),
+                    self.config.verification.search,
+                )
+                scores[feature] = optimiser().best_score_
         if self.univariate_thresh > 0:
             scores = {key: value for key, value in scores.items() if value > self.univariate_thresh}
         scores = dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
@@ -192,37 +225,39 @@ class FeatureReductions:
 
         return frame, features
 
+    @staticmethod
+    def __univariate_auc(x_frame: pd.DataFrame, y_frame: pd.Series, cross_validator) -> dict:
+        """Mean cross-validated AUC of all single-feature models at once using rank statistics
+
+        A univariate model is monotonic in its feature, i.e. its test AUC only depends on the direction learned
+        on the training fold (sign of the class mean difference) and the ranks of the test samples.
+        """
+        x_values = x_frame.to_numpy(dtype=float)
+        positive = (y_frame == y_frame.max()).to_numpy()
+        fold_aucs = []
+        for train, test in fold_plan(cross_validator, x_frame, y_frame):
+            x_train, pos_train = x_values[train], positive[train]
+            direction = np.sign(x_train[pos_train].mean(axis=0) - x_train[~pos_train].mean(axis=0))
+            direction[direction == 0] = 1
+            ranks = rankdata(x_values[test] * direction, axis=0)  # ties get average rank like roc_auc_score
+            n_pos = positive[test].sum()
+            n_neg = len(test) - n_pos
+            fold_aucs.append((ranks[positive[test]].sum(axis=0) - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+        return dict(zip(x_frame.columns, np.mean(fold_aucs, axis=0)))
+
     def univariate_analysis(self, frame: pd.DataFrame) -> tuple:
         """Perform univariate analysis (box plots and distributions)"""
-        frame_long = frame.melt(id_vars=[self.target_label])
-        sns.boxplot(
-            data=frame_long,
-            x='value',
-            y='variable',
-            hue=self.target_label,
-            orient='h',
-            meanline=True,
-            showmeans=True,
+        submit_plot(
+            self.config,
+            'box_plot_by_target',
+            os.path.join(self.job_dir, f'box_plot_{self.target_label}.{self.plot_format}'),
+            frame=frame,
+            target_label=self.target_label,
         )
-        plt.axvline(x=0, alpha=0.7, color='grey', linestyle='--')
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.job_dir, f'box_plot_{self.target_label}.{self.plot_format}'), dpi=300)
-        plt.clf()
-
         x_frame = frame.drop(self.target_label, axis=1)
-
-        # box plot for each feature
-        sns.boxplot(data=x_frame, orient='h', meanline=True, showmeans=True, whis=1.5)
-        plt.axvline(x=0, alpha=0.7, color='grey', linestyle='--')
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.job_dir, f'box_plot.{self.plot_format}'), dpi=300)
-        plt.clf()
-
-        # plot distribution for each feature
-        sns.displot(data=x_frame, kind='kde')
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.job_dir, f'dis_plot.{self.plot_format}'), dpi=300)
-        plt.clf()
+        for plot_name in ['box_plot', 'dis_plot']:
+            out_path = os.path.join(self.job_dir, f'{plot_name}.{self.plot_format}')
+            submit_plot(self.config, plot_name, out_path, x_frame=x_frame)
         return frame, None
 
     def bivariate_analysis(self, frame: pd.DataFrame) -> tuple:
@@ -1,13 +1,13 @@
 import os
 
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import pandas as pd
 from loguru import logger
-from sklearn.feature_selection import RFECV, RFE
+from sklearn.base import clone
 
-from pipeline_tabular.utils.helpers import init_estimator
+from pipeline_tabular.utils.helpers import fold_plan, init_estimator
+from pipeline_tabular.utils.plots import submit_plot
+from pipeline_tabular.utils.selections.elimination import RecursiveElimination, feature_importances, rank_features
 from pipeline_tabular.utils.verifications.verification import CrossValidation
 
 
@@ -19,7 +19,7 @@ class RecursiveFeatureElimination:
         self.job_dir = None
         self.plot_format = None
         self.metadata = None
-        self.workers = None
+        self.resources = None
         self.target_label = None
         self.corr_method = None
         self.corr_thresh = None
@@ -28,82 +28,106 @@ class RecursiveFeatureElimination:
         self.class_weight = None
         self.learn_task = None
         self.param_grids = None
+        self.n_top_features = None
 
     def __reduction(self, frame: pd.DataFrame, rfe_estimator: str, seed: int) -> tuple:
-        """Reduce the number of features using recursive feature elimination"""
+        """Reduce the number of features using recursive feature elimination or a ranking of feature importances"""
         estimator, cross_validator, scoring = init_estimator(
-            rfe_estimator, self.learn_task, seed, self.scoring, self.class_weight, self.workers
+            rfe_estimator, self.learn_task, seed, self.scoring, self.class_weight, self.resources.n_jobs(nested=True)
         )
 
         y = frame[self.target_label]
         x = frame.drop(self.target_label, axis=1)
-        min_features = 2
+        folds = fold_plan(cross_validator, x, y)  # same folds for hyperparameter search and elimination
+        rfe_config = self.config.selection.rfe
+        if rfe_config.mode == 'eliminate':
+            support, importances = self.__eliminate(x, y, estimator, folds, scoring, rfe_estimator, seed)
+        elif rfe_config.mode == 'rank':
+            support, importances = self.__rank(x, y, estimator, folds, scoring, seed)
+        else:
+            raise ValueError(f'Unknown rfe mode: {rfe_config.mode}, allowed -> eliminate, rank')
+
+        frame = pd.concat((x.loc[:, support], frame[self.target_label]), axis=1)  # concat with target label
+        importances = pd.DataFrame(importances, index=x.columns[support], columns=['importance'])
+        importances = importances.sort_values(by='importance', ascending=True)
+
+        logger.info(
+            f'Removed {len(x.columns) + 1 - len(frame.columns)} features with RFE ({rfe_config.mode}) and '
+            f'{rfe_estimator} estimator, number of remaining features: {len(frame.columns) - 1}'
+        )
+        if self.config.plot_first_iter:
+            submit_plot(
+                self.config,
+                'feature_importance',
+                os.path.join(self.job_dir, f'feature_importance_{rfe_estimator}.{self.plot_format}'),
+                importances=importances,
+                estimator=rfe_estimator,
+                target_label=self.target_label,
+            )
+
+        features = importances.index.tolist()[::-1]
+
+        return frame, features
+
+    def __eliminate(self, x, y, estimator, folds, scoring, rfe_estimator: str, seed: int) -> tuple:
+        """Recursive elimination with cross-validated number of features, returns support and importances"""
         optimiser = CrossValidation(
             x,
             y,
             estimator,
-            cross_validator,
+            folds,
             self.param_grids[rfe_estimator],
             scoring,
             seed,
-            self.workers,
+            self.resources.n_jobs(),
+            self.config.verification.search,
         )
         estimator = optimiser()  # find estimator with ideal parameters
 
-        selector = RFECV(
-            estimator=estimator.best_estimator_,
-            min_features_to_select=min_features,
-            cv=cross_validator,
+        rfe_config = self.config.selection.rfe
+        selector = RecursiveElimination(
+            estimator=clone(estimator.best_estimator_),
+            cv=folds,
             scoring=scoring,
-            n_jobs=self.workers,
+            min_features=rfe_config.min_features,
+            max_features=max(self.n_top_features) if rfe_config.cap_to_n_top else None,
+            step=rfe_config.step,
+            schedule=rfe_config.schedule,
+            n_jobs=self.resources.n_jobs(),
         )
-        selector.fit(x, y)
+        selector.fit(x, y, fitted_estimator=estimator.best_estimator_)  # best estimator is fitted on all features
 
         # Plot performance for increasing number of features
         if self.config.plot_first_iter:
-            n_scores = len(selector.cv_results_['mean_test_score'])
-            fig = plt.figure()
-            plt.xlabel('Number of features selected')
-            plt.ylabel(f'Mean {scoring}')
-            plt.xticks(range(0, n_scores + 1, 5))
-            plt.grid(alpha=0.5)
-            plt.errorbar(
-                range(min_features, n_scores + min_features),
-                selector.cv_results_['mean_test_score'],
-                yerr=selector.cv_results_['std_test_score'],
+            submit_plot(
+                self.config,
+                'rfecv_scores',
+                os.path.join(self.job_dir, f'RFECV_{rfe_estimator}.{self.plot_format}'),
+                n_features=selector.cv_results_['n_features'],
+                mean_scores=selector.cv_results_['mean_test_score'],
+                std_scores=selector.cv_results_['std_test_score'],
+                scoring=scoring,
+                estimator=rfe_estimator,
             )
-            plt.title(f'Recursive Feature Elimination for {rfe_estimator} estimator')
-            plt.savefig(os.path.join(self.job_dir, f'RFECV_{rfe_estimator}.{self.plot_format}'), dpi=300)
-            plt.close(fig)
 
-        frame = pd.concat((x.loc[:, selector.support_], frame[self.target_label]), axis=1)  # concat with target label
-
-        try:  # some estimators return feature_importances_ attribute, others coef_
-            importances = selector.estimator_.feature_importances_
-        except AttributeError:
+        if not hasattr(selector.estimator_, 'feature_importances_'):
             logger.warning('Note that absolute coefficient values do not necessarily represent feature importances.')
-            importances = np.abs(np.squeeze(selector.estimator_.coef_))
-
-        importances = pd.DataFrame(importances, index=x.columns[selector.support_], columns=['importance'])
-        importances = importances.sort_values(by='importance', ascending=True)
-
-        logger.info(
-            f'Removed {len(x.columns) + 1 - len(frame.columns)} features with RFE and {rfe_estimator} estimator, '
-            f'number of remaining features: {len(frame.columns) - 1}'
-        )
-        if self.config.plot_first_iter:
-            ax = importances.plot.barh()
-            fig = ax.get_figure()
-            plt.title(f'Feature importance' f'\n{rfe_estimator} estimator for target: {self.target_label}')
-            plt.xlabel('Feature importance')
-            plt.tight_layout()
-            plt.gca().legend_.remove()
-            plt.savefig(os.path.join(self.job_dir, f'feature_importance_{rfe_estimator}.{self.plot_format}'), dpi=300)
-            plt.close(fig)
+        return selector.support_, feature_importances(selector.estimator_)
 
-        features = importances.index.tolist()[::-1]
+    def __rank(self, x, y, estimator, folds, scoring, seed: int) -> tuple:
+        """Keep the max(n_top_features) features with highest mean importance over one fit per fold
 
-        return frame, features
+        No hyperparameter search, the estimator is used with its default parameters.
+        """
+        importance = self.config.selection.rfe.importance
+        if importance == 'model' and not hasattr(estimator, 'feature_importances_'):
+            logger.warning('Note that absolute coefficient values do not necessarily represent feature importances.')
+        importances = rank_features(estimator, x, y, folds, scoring, importance, seed, self.resources.n_jobs())
+        n_keep = min(max(self.n_top_features), len(x.columns))
+        keep = np.argsort(-importances, kind='stable')[:n_keep]
+        support = np.zeros(len(x.columns), dtype=bool)
+        support[keep] = True
+        return support, importances[support]
 
     def fr_logistic_regression(self, frame: pd.DataFrame, seed: int) -> tuple:
         """Feature reduction using logistic regression estimator"""
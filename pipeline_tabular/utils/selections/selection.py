@@ -1,6 +1,8 @@
+import os
+
 import pandas as pd
 from loguru import logger
-from omegaconf import DictConfig
+from omegaconf import DictConfig, OmegaConf
 
 from pipeline_tabular.utils.normalisers import Normalisers
 from pipeline_tabular.utils.selections.dimension_projections import DimensionProjections
@@ -9,16 +11,19 @@ from pipeline_tabular.utils.selections.recursive_feature_elimination import (
     RecursiveFeatureElimination,
 )
 from pipeline_tabular.data_handler.data_handler import DataHandler
+from pipeline_tabular.data_handler.memo_cache import MemoCache
+from pipeline_tabular.utils.helpers import hash_frame
+from pipeline_tabular.utils.resources import ResourceManager
 
 
 class Selection(DataHandler, Normalisers, DimensionProjections, FeatureReductions, RecursiveFeatureElimination):
     """Execute jobs"""
 
-    def __init__(self, config: DictConfig) -> None:
-        super().__init__()
+    def __init__(self, config: DictConfig, context=None) -> None:
+        super().__init__(context)
         self.config = config
         self.plot_format = config.meta.plot_format
-        self.workers = config.meta.workers
+        self.resources = ResourceManager(config.meta.workers, config.meta.blas_threads)
         self.jobs = config.selection.jobs
         self.task = config.meta.learn_task
         self.scoring = config.selection.scoring
@@ -27,27 +32,116 @@ class Selection(DataHandler, Normalisers, DimensionProjections, FeatureReduction
         self.corr_method = config.selection.corr_method
         self.corr_thresh = config.selection.corr_thresh
         self.corr_ranking = config.selection.corr_ranking
+        self.corr_block_size = config.selection.corr_block_size
+        self.corr_plot_features = config.selection.corr_plot_features
         self.variance_thresh = config.selection.variance_thresh
         self.class_weight = config.selection.class_weight
         self.param_grids = config.verification.param_grids
         self.n_top_features = config.verification.use_n_top_features
         self.job_name = ''
         self.job_dir = None
+        self.step_features = []  # features of each step of the current job, checkpointed by Run
+        cache_config = config.selection.cache
+        self.memo = None
+        if cache_config.active:
+            cache_dir = None
+            if cache_config.disk:
+                cache_dir = os.path.join(config.meta.output_dir, config.meta.experiment, 'cache', 'selection')
+            self.memo = MemoCache(cache_config.max_entries, cache_dir, cache_config.max_disk_mb)
+        self.shared_prefixes = {  # only prefixes shared by several jobs are worth caching
+            tuple(job[:end])
+            for job_iter, job in enumerate(self.jobs)
+            for end in range(1, len(job) + 1)
+            if any(list(other[:end]) == list(job[:end]) for other in self.jobs[job_iter + 1 :])
+        }
+        self.memo_signature = MemoCache.key(  # all settings that can change the outcome of a step
+            OmegaConf.to_container(config.selection, resolve=True),
+            OmegaConf.to_container(config.verification, resolve=True),
+            config.meta.learn_task,
+            config.meta.target_label,
+        )
 
     def __call__(self, seed, boot_iter, job, job_name, job_dir) -> None:
         """Run all jobs"""
         self.__check_jobs()
         self.job_name = job_name
         self.job_dir = job_dir
+        self.step_features = []
+
+        frame = self.get_store('frame', seed, 'train')
+        # leading normalisers are cheap and normalise the stored train frame in place, so they always run
+        n_leading = next((step_iter for step_iter, step in enumerate(job) if 'norm' not in step), len(job))
+        frame, error = self.__run_steps(job, 0, n_leading, frame, seed, boot_iter)
+        if error or self.memo is None:
+            self.__run_steps(job, n_leading, len(job), frame, seed, boot_iter)
+            return
+        frame_hash = hash_frame(frame)
+        start, frame, step_features = self.__restore_prefix(job, n_leading, frame, frame_hash, seed, boot_iter)
+        self.__run_steps(job, start, len(job), frame, seed, boot_iter, frame_hash, step_features)
 
+    def restore_scaler(self, seed, job, job_name) -> None:
+        """Rerun the steps of a job up to its last normaliser if its selected features are already available
+
+        Verification needs the scaler fitted during selection and the train frame normalised by leading normalisers.
+        """
+        norm_iters = [step_iter for step_iter, step in enumerate(job) if 'norm' in step]
+        if not norm_iters:
+            return
+        self.job_name = job_name
         frame = self.get_store('frame', seed, 'train')
-        for step in job:
+        for step in job[: norm_iters[-1] + 1]:
+            with self._profiler.stage(step):
+                frame, _, error = self.process_job(step, frame, seed)
+            if error:
+                logger.error(f'Step {step} is invalid')
+                return
+
+    def __run_steps(self, job, start, stop, frame, seed, boot_iter, frame_hash=None, step_features=None) -> tuple:
+        """Run steps start:stop of a job, results of shared prefixes are cached if frame_hash is given"""
+        for step_iter in range(start, stop):
+            step = job[step_iter]
             logger.info(f'Running {step} for seed {seed}...')
-            frame, features, error = self.process_job(step, frame, seed)
+            with self._profiler.stage(step):
+                frame, features, error = self.process_job(step, frame, seed)
             if error:
                 logger.error(f'Step {step} is invalid')
-                break
+                return frame, True
             self.__store_features(features, seed, boot_iter)
+            if frame_hash is not None:
+                step_features = step_features + [features]
+                prefix = tuple(job[: step_iter + 1])
+                if prefix in self.shared_prefixes:
+                    self.memo.set(
+                        self.__memo_key(prefix, frame_hash, seed),
+                        {
+                            'frame': frame.copy(),  # later normalisers modify their input frame in place
+                            'features': step_features,
+                            'scaler': self.scaler if any('norm' in step for step in prefix) else None,
+                        },
+                    )
+        return frame, False
+
+    def __restore_prefix(self, job, n_leading, frame, frame_hash, seed, boot_iter) -> tuple:
+        """Restore the result of the longest cached prefix of a job, returns the step to continue with"""
+        if self.config.plot_first_iter:  # plots of the first iteration are stored per job, run all steps
+            return n_leading, frame, []
+        for stop in range(len(job), n_leading, -1):
+            prefix = tuple(job[:stop])
+            if prefix not in self.shared_prefixes:
+                continue
+            cached = self.memo.get(self.__memo_key(prefix, frame_hash, seed))
+            if cached is None:
+                continue
+            logger.info(f'Reusing cached results of {list(prefix)} for seed {seed}...')
+            for features in cached['features']:  # replay stored features, feature scores count every step
+                self.__store_features(features, seed, boot_iter)
+            if cached['scaler'] is not None:
+                self.scaler = cached['scaler']
+            return stop, cached['frame'].copy(), cached['features']
+        return n_leading, frame, []
+
+    def __memo_key(self, prefix: tuple, frame_hash: str, seed) -> str:
+        return MemoCache.key(frame_hash, list(prefix), str(seed), self.memo_signature)
 
     def __check_jobs(self) -> None:
         """Check if the given jobs are valid"""
@@ -62,6 +156,7 @@ class Selection(DataHandler, Normalisers, DimensionProjections, FeatureReduction
             if isinstance(features, list):
                 if len(features) > 0:
                     self.set_store('feature', seed, self.job_name, features, boot_iter)
+                    self.step_features.append(features)
                 else:
                     logger.warning(f'No features found for {self.job_name}')
             else:
@@ -0,0 +1,222 @@
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from loguru import logger
+from omegaconf import DictConfig
+from sklearn.base import clone
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+from pipeline_tabular.utils.verifications.path_search import RegularisationPathSearch, _fit_path, best_index
+
+SWEEP_METHODS = ['grid', 'random']
+
+
+def _fit_and_score(estimator, x_frame, y_frame, train, test, n_top, params, scorer) -> float:
+    """Fit a single candidate on the first n_top features of a fold, failed fits score nan like GridSearchCV"""
+    estimator = clone(estimator).set_params(**params)
+    try:
+        estimator.fit(x_frame.iloc[train, :n_top], y_frame.iloc[train])
+        return scorer(estimator, x_frame.iloc[test, :n_top], y_frame.iloc[test])
+    except Exception:
+        return np.nan
+
+
+def _fit_nested_paths(estimator, x_frame, y_frame, train, test, n_tops, params, path_param, path_values, scorer):
+    """Fit the regularisation path of a fold for each of the nested feature subsets, returns (path scores, times)
+    for each n_top"""
+    return [
+        _timed(
+            _fit_path,
+            clone(estimator),
+            x_frame.iloc[:, :n_top],
+            y_frame,
+            train,
+            test,
+            params,
+            path_param,
+            path_values,
+            scorer,
+        )
+        for n_top in n_tops
+    ]
+
+
+def _refit(estimator, x_frame, y_frame, n_top, params):
+    return clone(estimator).set_params(**params).fit(x_frame.iloc[:, :n_top], y_frame)
+
+
+def _timed(function, *args) -> tuple:
+    """Result of a task and its (wall, CPU) seconds in the worker process"""
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    result = function(*args)
+    return result, np.array([time.perf_counter() - start_wall, time.process_time() - start_cpu])
+
+
+class NTopSweep:
+    """Hyperparameter searches of all (model, n_top) pairs of a job in a single process pool
+
+    Features of smaller n_top are nested in those of larger n_top, i.e. all searches share the frame of the largest
+    subset and the fold plan, candidates only select their first n_top columns. Estimators run single-threaded, the
+    pool is the only level of parallelism. Linear models with a regularisation path fit all nested subsets of a fold
+    in one task, each path warm started like RegularisationPathSearch. Searches and best parameters are the same as
+    with GridSearchCV/RandomizedSearchCV on each subset. Tasks are ordered by search, i.e. searches finish one after
+    another and run yields each best estimator while the pool continues with the next searches. task_times holds the
+    (wall, CPU) seconds spent on each search summed over its tasks, i.e. the time each model would take on a single
+    worker.
+    """
+
+    def __init__(
+        self, x_frame: pd.DataFrame, y_frame: pd.Series, folds: list, search: DictConfig, seed: int, workers: int
+    ) -> None:
+        if search.method not in SWEEP_METHODS:
+            raise ValueError(f'n_top sweep supports {", ".join(SWEEP_METHODS)} search, got {search.method}')
+        self.x_frame = x_frame
+        self.y_frame = y_frame
+        self.folds = folds
+        self.search = search
+        self.seed = seed
+        self.workers = workers
+        self.task_times = None
+
+    def __call__(self, searches: list) -> list:
+        """Run searches given as dicts with model, n_top, estimator, param_grid and scoring, returns best estimators"""
+        best_estimators = [None] * len(searches)
+        for index, best_estimator in self.run(searches):
+            best_estimators[index] = best_estimator
+        return best_estimators
+
+    def run(self, searches: list):
+        """Run searches like __call__, yields (search index, best estimator) as soon as all tasks of a search are done
+
+        The best candidate is refit in this process, the pool already works on the tasks of the next searches.
+        """
+        start_time = time.perf_counter()
+        grid_candidates = {}  # search index -> candidates
+        path_groups = {}  # model -> (search indices, regularisation parameter, other candidates, path values)
+        for index, search in enumerate(searches):
+            param_grid = search['param_grid']
+            if self.use_path(search['estimator'], param_grid):
+                if search['model'] not in path_groups:
+                    path_groups[search['model']] = ([], *self.path_candidates(search['estimator'], param_grid))
+                path_groups[search['model']][0].append(index)
+            else:
+                grid_candidates[index] = self.candidates(param_grid)
+
+        tasks, owners = [], []
+        for index, candidates in grid_candidates.items():
+            estimator = self.single_threaded(searches[index]['estimator'])
+            scorer = check_scoring(estimator, searches[index]['scoring'])
+            n_top = searches[index]['n_top']
+            for cand_iter, params in enumerate(candidates):
+                for fold_iter, (train, test) in enumerate(self.folds):
+                    tasks.append(
+                        delayed(_timed)(
+                            _fit_and_score, estimator, self.x_frame, self.y_frame, train, test, n_top, params, scorer
+                        )
+                    )
+                    owners.append((index, cand_iter, fold_iter))
+        for model, (indices, path_param, other_candidates, path_values) in path_groups.items():
+            estimator = self.single_threaded(searches[indices[0]]['estimator'])
+            scorer = check_scoring(estimator, searches[indices[0]]['scoring'])
+            n_tops = [searches[index]['n_top'] for index in indices]
+            for cand_iter, params in enumerate(other_candidates):
+                for fold_iter, (train, test) in enumerate(self.folds):
+                    tasks.append(
+                        delayed(_fit_nested_paths)(
+                            estimator,
+                            self.x_frame,
+                            self.y_frame,
+                            train,
+                            test,
+                            n_tops,
+                            params,
+                            path_param,
+                            path_values,
+                            scorer,
+                        )
+                    )
+                    owners.append((model, cand_iter, fold_iter))
+
+        self.task_times = np.zeros((len(searches), 2))
+        n_tasks = Counter(owner for owner, _, _ in owners)
+        owner_results = defaultdict(list)  # search index or model with path -> (candidate, fold, scores) of done tasks
+        with Parallel(n_jobs=self.workers, return_as='generator') as parallel:  # one pool for all searches
+            for (owner, cand_iter, fold_iter), result in zip(owners, parallel(tasks)):
+                if owner in path_groups:  # (path scores, times) of each nested subset
+                    owner_results[owner].append((cand_iter, fold_iter, [scores for scores, _ in result]))
+                    self.task_times[path_groups[owner][0]] += np.array([times for _, times in result])
+                else:
+                    owner_results[owner].append((cand_iter, fold_iter, result[0]))
+                    self.task_times[owner] += result[1]
+                if len(owner_results[owner]) < n_tasks[owner]:
+                    continue
+                best_params = self.best_params(searches, grid_candidates, path_groups, owner, owner_results.pop(owner))
+                for index, params in best_params.items():
+                    best_estimator, times = _timed(
+                        _refit,
+                        self.single_threaded(searches[index]['estimator']),
+                        self.x_frame,
+                        self.y_frame,
+                        searches[index]['n_top'],
+                        params,
+                    )
+                    self.task_times[index] += times
+                    yield index, best_estimator
+        logger.debug(
+            f'n_top sweep optimised {len(searches)} model/n_top pairs in {len(tasks)} tasks '
+            f'and {time.perf_counter() - start_time:.1f}s'
+        )
+
+    def use_path(self, estimator, param_grid: dict) -> bool:
+        """Regularisation paths replace the exhaustive grid only, a random search samples its candidates"""
+        return (
+            self.search.regularisation_path
+            and self.search.method == 'grid'
+            and RegularisationPathSearch.supports(estimator, param_grid)
+        )
+
+    def candidates(self, param_grid: dict) -> list:
+        """Candidates in the same order as GridSearchCV or RandomizedSearchCV"""
+        if self.search.method == 'random':
+            n_iter = min(self.search.n_iter, len(ParameterGrid(param_grid)))
+            return list(ParameterSampler(param_grid, n_iter, random_state=self.seed))
+        return list(ParameterGrid(param_grid))
+
+    @staticmethod
+    def path_candidates(estimator, param_grid: dict) -> tuple:
+        """Regularisation parameter, other candidates and path values in the same order as RegularisationPathSearch"""
+        path_param, descending = RegularisationPathSearch.path_params[type(estimator).__name__]
+        path_values = sorted(param_grid[path_param], reverse=descending)
+        other_grid = {param: values for param, values in param_grid.items() if param not in [path_param, 'warm_start']}
+        return path_param, list(ParameterGrid(other_grid)), path_values
+
+    def best_params(self, searches: list, grid_candidates: dict, path_groups: dict, owner, results: list) -> dict:
+        """Best candidate of the searches of an owner (search index or model with path) given the (candidate, fold,
+        scores) of all its tasks, ties are resolved in favour of the first candidate like GridSearchCV"""
+        if owner not in path_groups:
+            scores = np.full((len(grid_candidates[owner]), len(self.folds)), np.nan)
+            for cand_iter, fold_iter, result in results:
+                scores[cand_iter, fold_iter] = result
+            return {owner: grid_candidates[owner][best_index(scores.mean(axis=1), searches[owner]['estimator'])[0]]}
+
+        indices, path_param, other_candidates, path_values = path_groups[owner]
+        scores = np.full((len(other_candidates), len(self.folds), len(indices), len(path_values)), np.nan)
+        for cand_iter, fold_iter, result in results:
+            scores[cand_iter, fold_iter] = result
+        best_params = {}
+        for subset_iter, index in enumerate(indices):
+            mean_scores = scores[:, :, subset_iter].mean(axis=1)  # other candidate x path value
+            best_candidate, best_value = best_index(mean_scores, searches[index]['estimator'])
+            best_params[index] = {**other_candidates[best_candidate], path_param: path_values[best_value]}
+        return best_params
+
+    @staticmethod
+    def single_threaded(estimator):
+        """Avoid nested pools, the sweep already runs one task per worker"""
+        if 'n_jobs' in estimator.get_params():
+            return clone(estimator).set_params(n_jobs=1)
+        return estimator
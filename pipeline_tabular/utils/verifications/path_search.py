@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone, is_classifier
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid, check_cv
+
+
+def _fit_path(estimator, x_frame, y_frame, train, test, params, path_param, path_values, scorer) -> list:
+    """Fit the regularisation path of a single fold, each fit starts from the solution of the previous one"""
+    estimator.set_params(**params, warm_start=True)
+    x_train, y_train = x_frame.iloc[train], y_frame.iloc[train]
+    x_test, y_test = x_frame.iloc[test], y_frame.iloc[test]
+    scores = []
+    for value in path_values:
+        estimator.set_params(**{path_param: value})
+        try:
+            estimator.fit(x_train, y_train)
+            scores.append(scorer(estimator, x_test, y_test))
+        except Exception:  # failed fits score nan like GridSearchCV, e.g. elasticnet penalty without l1_ratio
+            scores.append(np.nan)
+    return scores
+
+
+def best_index(mean_scores: np.ndarray, estimator) -> tuple:
+    """Index of the best mean score, ties are resolved in favour of the first candidate like GridSearchCV"""
+    if np.isnan(mean_scores).all():
+        raise ValueError(
+            f'All fits of the hyperparameter search failed for {type(estimator).__name__}, check its parameter grid'
+        )
+    return np.unravel_index(np.nanargmax(mean_scores), mean_scores.shape)
+
+
+class RegularisationPathSearch:
+    """Hyperparameter search for linear models, which fits the whole regularisation path of each fold with warm
+    starts (similar to LogisticRegressionCV/LassoCV) and exposes the same interface as GridSearchCV"""
+
+    path_params = {  # estimator -> (regularisation parameter, whether values need to be sorted in descending order)
+        'LogisticRegression': ('C', False),  # small C -> strong regularisation
+        'Lasso': ('alpha', True),  # large alpha -> strong regularisation
+        'ElasticNet': ('alpha', True),
+    }
+
+    def __init__(self, estimator, param_grid: dict, scoring: str, cv, n_jobs: int) -> None:
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.cv = cv
+        self.n_jobs = n_jobs
+
+    @classmethod
+    def supports(cls, estimator, param_grid: dict) -> bool:
+        """Check whether the estimator has a regularisation path that can be fitted with warm starts"""
+        name = type(estimator).__name__
+        return name in cls.path_params and cls.path_params[name][0] in param_grid
+
+    def fit(self, x_frame: pd.DataFrame, y_frame: pd.Series):
+        path_param, descending = self.path_params[type(self.estimator).__name__]
+        path_values = sorted(self.param_grid[path_param], reverse=descending)  # start with strongest regularisation
+        other_grid = {
+            param: values for param, values in self.param_grid.items() if param not in [path_param, 'warm_start']
+        }
+        candidates = list(ParameterGrid(other_grid))
+        folds = list(check_cv(self.cv, y_frame, classifier=is_classifier(self.estimator)).split(x_frame, y_frame))
+        scorer = check_scoring(self.estimator, self.scoring)
+
+        fold_scores = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_path)(
+                clone(self.estimator), x_frame, y_frame, train, test, params, path_param, path_values, scorer
+            )
+            for params in candidates
+            for train, test in folds
+        )
+        fold_scores = np.array(fold_scores).reshape(len(candidates), len(folds), len(path_values))
+        mean_scores = fold_scores.mean(axis=1)  # candidate x path value
+        best_candidate, best_value = best_index(mean_scores, self.estimator)
+
+        self.cv_results_ = {
+            'params': [{**params, path_param: value} for params in candidates for value in path_values],
+            'mean_test_score': mean_scores.ravel(),
+            'std_test_score': fold_scores.std(axis=1).ravel(),
+        }
+        self.best_params_ = {**candidates[best_candidate], path_param: path_values[best_value]}
+        self.best_score_ = mean_scores[best_candidate, best_value]
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(x_frame, y_frame)
+        self.classes_ = getattr(self.best_estimator_, 'classes_', None)
+        self.n_features_in_ = self.best_estimator_.n_features_in_
+        return self
+
+    def predict(self, x_frame: pd.DataFrame):
+        return self.best_estimator_.predict(x_frame)
+
+    def predict_proba(self, x_frame: pd.DataFrame):
+        return self.best_estimator_.predict_proba(x_frame)
+
+    def decision_function(self, x_frame: pd.DataFrame):
+        return self.best_estimator_.decision_function(x_frame)
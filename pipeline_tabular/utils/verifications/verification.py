@@ -1,16 +1,26 @@
+import time
+
+import numpy as np
 import pandas as pd
 import sklearn.metrics as metrics
 import imblearn.metrics as imb_metrics
 from loguru import logger
 from omegaconf import DictConfig
+from sklearn.base import is_classifier
 from sklearn.ensemble import VotingClassifier, VotingRegressor
-from sklearn.model_selection import GridSearchCV
+from sklearn.experimental import enable_halving_search_cv  # needed to import HalvingGridSearchCV
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, ParameterGrid, RandomizedSearchCV, check_cv
 from sklearn.preprocessing import LabelEncoder
 
-from pipeline_tabular.utils.helpers import init_estimator
+from pipeline_tabular.utils.helpers import fold_plan, init_estimator
 from pipeline_tabular.utils.normalisers import Normalisers
+from pipeline_tabular.utils.resources import ResourceManager
+from pipeline_tabular.utils.verifications.n_top_sweep import SWEEP_METHODS, NTopSweep
+from pipeline_tabular.utils.verifications.path_search import RegularisationPathSearch
 from pipeline_tabular.data_handler.data_handler import DataHandler, NestedDefaultDict
 
+logger.trace(enable_halving_search_cv)  # to avoid auto import removal
+
 
 class CrossValidation:
     """Cross validation for feature selection"""
@@ -25,40 +35,130 @@ class CrossValidation:
         scoring: str,
         seed: int,
         workers: int,
+        search: DictConfig = None,
     ) -> None:
         self.x_train = x_train
         self.y_train = y_train
         self.estimator = estimator
         self.cross_validator = cross_validator
-        self.param_grid = dict(param_grid)
+        self.param_grid = {param: list(values) for param, values in param_grid.items()}  # plain lists for samplers
         self.scoring = scoring
         self.seed = seed
         self.workers = workers
+        self.search_method = search.method if search is not None else 'grid'
+        self.n_iter = search.n_iter if search is not None else None
+        self.factor = search.factor if search is not None else None
+        self.regularisation_path = search.regularisation_path if search is not None else False
 
     def __call__(self):
-        selector = GridSearchCV(
-            estimator=self.estimator,
-            param_grid=self.param_grid,
-            scoring=self.scoring,
-            cv=self.cross_validator,
-            n_jobs=self.workers,
-        )
+        start_time = time.perf_counter()
+        selector = self.init_search()
         selector.fit(self.x_train, self.y_train)
+        self.log_savings(selector, time.perf_counter() - start_time)
         return selector
 
+    def init_search(self):
+        """Initialise the hyperparameter search engine"""
+        if self.search_method == 'halving' and len(self.y_train) < self.halving_min_samples():
+            logger.warning(
+                f'Successive halving needs at least {self.halving_min_samples()} samples (2 per class and fold), '
+                f'got {len(self.y_train)} -> falling back to grid search'
+            )
+            self.search_method = 'grid'
+        if (  # same candidates as the exhaustive grid search, other methods keep their sampling
+            self.regularisation_path
+            and self.search_method == 'grid'
+            and RegularisationPathSearch.supports(self.estimator, self.param_grid)
+        ):
+            return RegularisationPathSearch(
+                estimator=self.estimator,
+                param_grid=self.param_grid,
+                scoring=self.scoring,
+                cv=self.cross_validator,
+                n_jobs=self.workers,
+            )
+        if self.search_method == 'grid':
+            return GridSearchCV(
+                estimator=self.estimator,
+                param_grid=self.param_grid,
+                scoring=self.scoring,
+                cv=self.cross_validator,
+                n_jobs=self.workers,
+            )
+        elif self.search_method == 'halving':
+            return HalvingGridSearchCV(
+                estimator=self.estimator,
+                param_grid=self.param_grid,
+                factor=self.factor,
+                scoring=self.scoring,
+                cv=self.cross_validator,
+                random_state=self.seed,
+                n_jobs=self.workers,
+            )
+        elif self.search_method == 'random':
+            return RandomizedSearchCV(
+                estimator=self.estimator,
+                param_distributions=self.param_grid,
+                n_iter=min(self.n_iter, len(ParameterGrid(self.param_grid))),
+                scoring=self.scoring,
+                cv=self.cross_validator,
+                random_state=self.seed,
+                n_jobs=self.workers,
+            )
+        elif self.search_method == 'bayes':
+            try:  # optional dependency, optimisation runs locally
+                from skopt import BayesSearchCV
+            except ImportError as error:
+                raise ImportError('Bayesian search needs scikit-optimize, install it or use another method') from error
+
+            return BayesSearchCV(
+                estimator=self.estimator,
+                search_spaces=self.param_grid,
+                n_iter=self.n_iter,
+                scoring=self.scoring,
+                cv=self.cross_validator,
+                random_state=self.seed,
+                n_jobs=self.workers,
+            )
+        raise ValueError(f'Unknown search method: {self.search_method}, allowed -> grid, halving, random, bayes')
+
+    def halving_min_samples(self) -> int:
+        """Samples HalvingGridSearchCV needs in its first iteration, fewer samples than that raise a ValueError"""
+        classifier = is_classifier(self.estimator)
+        n_splits = check_cv(self.cross_validator, self.y_train, classifier=classifier).get_n_splits()
+        n_classes = len(np.unique(self.y_train)) if classifier else 1
+        return n_splits * 2 * n_classes
+
+    def log_savings(self, selector, elapsed: float) -> None:
+        """Log the number of fits and the estimated wall-clock savings compared to the exhaustive grid search"""
+        if isinstance(selector, RegularisationPathSearch):  # same number of fits, but warm started
+            logger.debug(f'Regularisation path search took {elapsed:.1f}s')
+            return
+        n_splits = check_cv(self.cross_validator).get_n_splits()
+        exhaustive_fits = len(ParameterGrid(self.param_grid)) * n_splits
+        if self.search_method == 'halving':
+            n_fits = sum(selector.n_candidates_) * n_splits
+        else:
+            n_fits = len(selector.cv_results_['params']) * n_splits
+        logger.debug(
+            f'{self.search_method} search ran {n_fits}/{exhaustive_fits} fits in {elapsed:.1f}s, '
+            f'estimated saving compared to grid search: {elapsed * (exhaustive_fits / n_fits - 1):.1f}s'
+        )
+
 
 class Verification(DataHandler, Normalisers):
     """Train random forest classifier to verify feature importance"""
 
-    def __init__(self, config: DictConfig) -> None:
-        super().__init__()
+    def __init__(self, config: DictConfig, context=None) -> None:
+        super().__init__(context)
         self.config = config
-        self.workers = config.meta.workers
+        self.resources = ResourceManager(config.meta.workers, config.meta.blas_threads)
         self.learn_task = config.meta.learn_task
         self.target_label = config.meta.target_label
         self.train_scoring = config.selection.scoring
         self.class_weight = config.selection.class_weight
         self.n_top_features = config.verification.use_n_top_features
+        self.n_top_sweep = config.verification.n_top_sweep
         v_scoring_dict = config.collect_results.metrics_to_collect[self.learn_task]
         self.verif_scoring = [
             v_scoring
@@ -73,6 +173,7 @@ class Verification(DataHandler, Normalisers):
         if len(self.models) < 2:  # ensemble methods need at least two models to combine their results
             self.ensemble = []
         self.best_estimators = NestedDefaultDict()
+        self.fold_plans = {}
 
     def __call__(self, seed, boot_iter, job_name, imputer, model=None, n_top_features=None, explain_mode=False):
         """Train classifier to verify final feature importance"""
@@ -82,19 +183,23 @@ class Verification(DataHandler, Normalisers):
         self.models = model if model is not None else self.models  # single model provided by Explain class
         self.explain_mode = explain_mode
 
+        self.job_name = job_name
         self.train_test_split()
         top_features = self.get_store('feature', seed, job_name, boot_iter)
         if not explain_mode:
             n_top_features = [n for n in self.n_top_features if n <= len(top_features)]
             if not n_top_features:
                 n_top_features = [len(top_features)]  # ensure that list is not empty
+        swept = {}
+        if self.n_top_sweep and not explain_mode and self.config.verification.search.method in SWEEP_METHODS:
+            with self._profiler.stage('n_top_sweep'):
+                swept = self.sweep_models(job_name, top_features, n_top_features)  # optimise all n_top at once
         for n_top in n_top_features:
             logger.info(f'Verifying final feature importance for top {n_top} features...')
             self.top_features = top_features[:n_top]
-            self.train_models(f'{job_name}_{n_top}')  # optimise all models
-            pred_function, estimator = self.evaluate(
-                f'{job_name}_{n_top}'
-            )  # evaluate all optimised models
+            self.train_models(n_top, swept.get(n_top, {}))  # optimise all models
+            with self._profiler.stage('evaluate', n_top=n_top):
+                pred_function, estimator = self.evaluate(job_name, n_top)  # evaluate all optimised models
 
         return pred_function, estimator, self.x_train, self.x_test  # only needed for Explain class
 
@@ -107,15 +212,76 @@ class Verification(DataHandler, Normalisers):
             test, normalise=True
         )  # test data not yet normalised
 
-    def train_models(self, job_name) -> None:
-        """Train classifier to verify feature importance"""
+    def models_to_train(self, n_top) -> list:
+        """Models without results for the current bootstrap, ensembles need all models"""
+        if self.explain_mode or not all(self.__done(n_top, ensemble) for ensemble in self.ensemble):
+            return list(self.models)
+        return [model for model in self.models if not self.__done(n_top, model)]
+
+    def __done(self, n_top, model) -> bool:
+        return self.unit_done(self.seed, self.boot_iter, self.job_name, n_top, model)
+
+    def sweep_models(self, job_name, top_features: list, n_top_features: list) -> dict:
+        """Optimise all models for all n_top in a single process pool, returns n_top -> model -> best estimator
+
+        Each model is evaluated and checkpointed as soon as its search finished, i.e. an interrupted sweep resumes
+        with the searches that were still running.
+        """
+        searches = []
+        for n_top in n_top_features:
+            for model in self.models_to_train(n_top):
+                estimator, cross_validator, scoring = init_estimator(
+                    model,
+                    self.learn_task,
+                    self.seed,
+                    self.train_scoring,
+                    self.class_weight,
+                    self.resources.n_jobs(nested=True),
+                )
+                searches.append(
+                    {
+                        'model': model,
+                        'n_top': n_top,
+                        'estimator': estimator,
+                        'param_grid': {param: list(values) for param, values in self.param_grids[model].items()},
+                        'scoring': scoring,
+                    }
+                )
+        if not searches:
+            return {}
+        logger.info(f'Training {len(searches)} model/n_top pairs...')
+        sweep = NTopSweep(
+            self.x_train[top_features[: max(n_top_features)]],  # smaller n_top use the first columns
+            self.y_train,
+            self.get_fold_plan(cross_validator),  # same cross-validator for all models
+            self.config.verification.search,
+            self.seed,
+            self.resources.n_jobs(),
+        )
+        swept = {}
+        for index, best_estimator in sweep.run(searches):
+            model, n_top = searches[index]['model'], searches[index]['n_top']
+            swept.setdefault(n_top, {})[model] = best_estimator
+            self.top_features = top_features[:n_top]
+            self.best_estimators[model] = best_estimator
+            with self._profiler.stage('evaluate', n_top=n_top, model=model):
+                self.evaluate(job_name, n_top, [model])
+        for search, (wall_seconds, cpu_seconds) in zip(searches, sweep.task_times):  # summed over pool workers
+            self._profiler.record(
+                f'search_{search["model"]}', wall_seconds, cpu_seconds, n_top=search['n_top'], model=search['model']
+            )
+        return swept
+
+    def train_models(self, n_top, swept: dict = None) -> None:
+        """Train classifier to verify feature importance, models already optimised by the n_top sweep are reused"""
+        swept = swept or {}
         estimators = []
-        for model in self.models:
-            try:
-                scores = self.get_store('score', self.seed, job_name)[model]
-            except KeyError:  # model not yet stored for this seed/job
-                scores = {scoring: [] for scoring in self.verif_scoring}
-            if len(scores[self.verif_scoring[0]]) < self.boot_iter + 1 or self.explain_mode:  # bootstraps missing
+        x_train_top = self.x_train[self.top_features]  # same column subset for all models
+        for model in self.models_to_train(n_top):
+            if model in swept:
+                estimators.append((model, swept[model]))
+                self.best_estimators[model] = swept[model]
+            else:
                 logger.info(f'Training {model} model...')
                 param_grid = self.param_grids[model]
                 estimator, cross_validator, scoring = init_estimator(
@@ -124,19 +290,21 @@ class Verification(DataHandler, Normalisers):
                     self.seed,
                     self.train_scoring,
                     self.class_weight,
-                    self.workers,
+                    self.resources.n_jobs(nested=True),  # the search runs the pool
                 )
                 optimiser = CrossValidation(
-                    self.x_train[self.top_features],
+                    x_train_top,
                     self.y_train,
                     estimator,
-                    cross_validator,
+                    self.get_fold_plan(cross_validator),
                     param_grid,
                     scoring,
                     self.seed,
-                    self.workers,
+                    self.resources.n_jobs(),
+                    self.config.verification.search,
                 )
-                best_estimator = optimiser()
+                with self._profiler.stage(f'search_{model}', n_top=n_top, model=model):
+                    best_estimator = optimiser()
                 estimators.append((model, best_estimator))
                 self.best_estimators[model] = best_estimator  # store for evaluation later
 
@@ -144,14 +312,18 @@ class Verification(DataHandler, Normalisers):
             logger.info(f'Training {ensemble} ensemble model...')
             if 'voting' in ensemble:
                 if self.learn_task == 'binary_classification':
-                    ens_estimator = VotingClassifier(estimators=estimators, voting='soft', n_jobs=self.workers)
+                    ens_estimator = VotingClassifier(
+                        estimators=estimators, voting='soft', n_jobs=self.resources.n_jobs(nested=True)
+                    )
                     ens_estimator.estimators_ = [
                         est_tuple[1] for est_tuple in estimators
                     ]  # best_estimators are already fit -> need to set estimators_, le_ and classes_
                     ens_estimator.le_ = LabelEncoder().fit(self.y_test)
                     ens_estimator.classes_ = ens_estimator.le_.classes_
                 else:  # regression
-                    ens_estimator = VotingRegressor(estimators=estimators, n_jobs=self.workers)
+                    ens_estimator = VotingRegressor(
+                        estimators=estimators, n_jobs=self.resources.n_jobs(nested=True)
+                    )
                     ens_estimator.estimators_ = [
                         est_tuple[1] for est_tuple in estimators
                     ]  # best_estimators are already fit -> need to set estimators_
@@ -161,15 +333,23 @@ class Verification(DataHandler, Normalisers):
 
             self.best_estimators[ensemble] = ens_estimator  # store for evaluation later
 
-    def evaluate(self, job_name):
-        """Evaluate all optimised models"""
+    def get_fold_plan(self, cross_validator) -> list:
+        """Return fold indices of the current seed/bootstrap, computed once and reused for all models and n_top"""
+        key = (str(self.seed), self.boot_iter, len(self.y_train))
+        if key not in self.fold_plans:
+            self.fold_plans = {key: fold_plan(cross_validator, self.x_train, self.y_train)}  # keep current plan only
+        return self.fold_plans[key]
+
+    def evaluate(self, job_name, n_top, models: list = None):
+        """Evaluate all optimised models, or the given ones"""
         # pred_func = None
-        scores = self.get_store('score', self.seed, job_name)
-        models = self.models if self.explain_mode else (self.models + self.ensemble)
+        scores = self.get_store('score', self.seed, f'{job_name}_{n_top}')
+        if models is None:
+            models = self.models if self.explain_mode else (self.models + self.ensemble)
         for i, model in enumerate(models):
             if model not in scores.keys():
-                scores[model] = {scoring: [] for scoring in self.verif_scoring + ['probas', 'true', 'pred', 'pos_rate']}
-            if len(scores[model][self.verif_scoring[0]]) < self.boot_iter + 1 or self.explain_mode:
+                scores[model] = {scoring: [] for scoring in self.verif_scoring + ['pos_rate']}
+            if not self.__done(n_top, model) or self.explain_mode:
                 logger.info(f'Evaluating {model} model ({i+1}/{len(models)})...')
                 estimator = self.best_estimators[model]
                 y_pred = estimator.predict(self.x_test[self.top_features])
@@ -189,13 +369,28 @@ class Verification(DataHandler, Normalisers):
                         except ValueError:
                             scores[model][score].append(getattr(imb_metrics, score)(self.y_test, y_pred))
 
-                scores[model]['probas'].append(probas.tolist())  # need list to save as json later
-                scores[model]['pred'].append(y_pred.tolist())
-                scores[model]['true'].append(self.y_test.tolist())
+                self._prediction_store.add(
+                    self.seed, self.boot_iter, job_name, n_top, model, self.x_test.index, probas, self.y_test, y_pred
+                )  # per-sample predictions are kept in typed columns, not in the score store
                 scores[model]['pos_rate'].append(round(self.y_test.sum() / len(self.y_test), 3))
                 if y_pred.sum() == 0:
                     logger.warning(f'0/{int(self.y_test.sum())} positive samples were predicted using top features.')
-        self.set_store('score', self.seed, job_name, scores)  # store results for summary in report
+                self.set_store('score', self.seed, f'{job_name}_{n_top}', scores)
+                self.checkpoint_unit(  # a restart continues with the next model
+                    self.seed,
+                    self.boot_iter,
+                    job_name,
+                    n_top,
+                    model,
+                    scores={score: values[-1] for score, values in scores[model].items() if values},
+                    predictions={
+                        column: values.tolist()
+                        for column, values in self._prediction_store.select(
+                            self.seed, self.boot_iter, job_name, n_top, model
+                        ).items()
+                    },
+                )
+        self.set_store('score', self.seed, f'{job_name}_{n_top}', scores)  # store results for summary in report
 
         return None, None
 
@@ -0,0 +1,22 @@
+import sys
+
+import matplotlib
+from loguru import logger
+
+from pipeline_tabular.config_manager import ConfigManager
+from pipeline_tabular.utils.plots.plot_queue import plot_spool_dir, render_pending
+
+
+def render_plots() -> None:
+    """Render all plots queued by runs of the configured experiment, e.g. with meta.plot_mode deferred"""
+    config = ConfigManager()(save=False)
+    logger.remove()
+    logger.add(sys.stderr, level=config.meta.logging_level)
+
+    matplotlib.use('Agg')
+    n_plots = render_pending(plot_spool_dir(config))
+    logger.info(f'Rendered {n_plots} queued plots successfully.')
+
+
+if __name__ == '__main__':
+    render_plots()
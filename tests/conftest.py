@@ -0,0 +1,20 @@
+import os
+
+import pytest
+from omegaconf import OmegaConf
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def config(tmp_path):
+    """Default config.yaml writing all outputs to a temporary directory"""
+    config = OmegaConf.load(os.path.join(REPO_DIR, 'config.yaml'))
+    config.meta.output_dir = str(tmp_path / 'out')
+    config.meta.experiment = 'test'
+    config.meta.target_label = 'target'
+    config.meta.input_cache = False
+    config.meta.export_frame_csv = False
+    config.inspection.label_as_index = None
+    config.inspection.manual_clean = False
+    return config
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from pipeline_tabular.data_handler.data_handler import RunContext
+from pipeline_tabular.utils.inspections.clean_up import CleanUp
+
+
+def test_clean_values_nullable_dtypes(config):
+    frame = pd.DataFrame(
+        {
+            'int': pd.array([1, None, 3, 0, 5, 6, 7], dtype='Int64'),
+            'bool': pd.array([True, None, False, True, False, True, False], dtype='boolean'),
+            'target': pd.array([0, 1, None, 1, 0, 1, 0], dtype='Int64'),
+        }
+    )
+    cleaned = CleanUp(config, RunContext()).clean_values(frame)
+
+    assert (cleaned.dtypes == float).all()
+    assert cleaned.index.tolist() == [0, 1, 3, 4, 5, 6]  # row without target dropped
+    np.testing.assert_array_equal(cleaned['int'], [1, np.nan, np.nan, 5, 6, 7])  # 0 replaced, not categorical
+    np.testing.assert_array_equal(cleaned['bool'], [1, np.nan, 1, 0, 1, 0])  # 0 kept, categorical
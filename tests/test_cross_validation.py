@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401, needed to import HalvingGridSearchCV
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, StratifiedKFold
+
+from pipeline_tabular.utils.helpers import init_estimator
+from pipeline_tabular.utils.verifications.verification import CrossValidation
+
+PARAM_GRID = {'C': [0.01, 1, 100], 'max_iter': [1000]}
+
+
+def small_cohort(n_samples: int = 40) -> tuple:
+    rng = np.random.default_rng(0)
+    x_frame = pd.DataFrame(rng.normal(size=(n_samples, 4)), columns=[f'f{i}' for i in range(4)])
+    y_frame = pd.Series(np.tile([0, 1], n_samples // 2), name='target')
+    x_frame['f0'] += y_frame  # informative feature
+    return x_frame, y_frame
+
+
+def cross_validation(config, method: str, cross_validator=None, n_samples: int = 40) -> CrossValidation:
+    config.verification.search.method = method
+    config.verification.search.n_iter = 2
+    estimator, repeated_folds, _ = init_estimator(
+        'logistic_regression', 'binary_classification', 0, config.selection.scoring, workers=1
+    )
+    x_frame, y_frame = small_cohort(n_samples)
+    return CrossValidation(
+        x_frame,
+        y_frame,
+        estimator,
+        cross_validator or repeated_folds,  # 3 x 10 repeated folds need 120 samples for successive halving
+        PARAM_GRID,
+        'roc_auc',
+        0,
+        1,
+        config.verification.search,
+    )
+
+
+@pytest.mark.parametrize('method', ['grid', 'halving', 'random', 'bayes'])
+def test_search_engines_fit_small_cohort(config, method):
+    if method == 'bayes':
+        pytest.importorskip('skopt')
+    selector = cross_validation(config, method)()
+
+    assert selector.best_params_['C'] in PARAM_GRID['C']
+    assert selector.best_estimator_.coef_.shape == (1, 4)
+
+
+def test_halving_falls_back_to_grid_search_on_small_cohort(config):
+    optimiser = cross_validation(config, 'halving')
+
+    assert optimiser.halving_min_samples() == 30 * 2 * 2
+    assert type(optimiser.init_search()) is GridSearchCV
+    assert optimiser.search_method == 'grid'
+
+
+def test_halving_used_with_enough_samples(config):
+    optimiser = cross_validation(config, 'halving', StratifiedKFold(n_splits=3), n_samples=40)
+
+    assert optimiser.halving_min_samples() == 3 * 2 * 2
+    assert isinstance(optimiser.init_search(), HalvingGridSearchCV)
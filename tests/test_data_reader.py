@@ -0,0 +1,81 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline_tabular.data_handler.data_handler import RunContext
+from pipeline_tabular.run.data_reader import DataReader
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame(
+        {
+            'pid': ['a', 'b', 'c', 'd'],
+            'int_nan': [1, None, 3, 0],  # float64 in memory, Int64 when read by fastparquet
+            'int': [1, 2, 3, 4],
+            'float': [0.5, np.nan, 1.5, 2.5],
+            'text': ['x', None, '1', 'y'],
+            'target': [0, 1, 0, 1],
+        }
+    )
+
+
+@pytest.mark.parametrize('cache', [False, True])
+def test_parquet_reads_like_csv(config, tmp_path, frame, cache):
+    config.meta.input_cache = cache
+    config.inspection.label_as_index = 'pid'
+    frame.to_csv(tmp_path / 'input.csv', index=False)
+    parquet_frame = frame.copy()
+    parquet_frame['int_nan'] = parquet_frame['int_nan'].astype('Int64')
+    parquet_frame.to_parquet(tmp_path / 'input.parquet', engine='fastparquet', index=False)
+
+    read = {}
+    for suffix in ['csv', 'parquet']:
+        config.meta.input_file = str(tmp_path / f'input.{suffix}')
+        for _ in range(1 + cache):  # second read uses the cached copy
+            reader = DataReader(config, RunContext())
+            reader.read_file()
+            read[suffix] = reader.frame
+
+    pd.testing.assert_frame_equal(read['parquet'], read['csv'])
+    assert read['parquet']['int_nan'].dtype == float
+
+
+def test_normalise_dtypes():
+    frame = pd.DataFrame(
+        {
+            'int': pd.array([1, 2], dtype='Int64'),
+            'int_na': pd.array([1, None], dtype='Int64'),
+            'bool': pd.array([True, False], dtype='boolean'),
+            'bool_na': pd.array([True, None], dtype='boolean'),
+            'string': pd.array(['x', None], dtype='string'),
+        }
+    )
+    normalised = DataReader.normalise_dtypes(frame)
+
+    assert normalised.dtypes.astype(str).tolist() == ['int64', 'float64', 'bool', 'float64', 'object']
+    assert np.isnan(normalised.loc[1, 'int_na']) and np.isnan(normalised.loc[1, 'string'])
+
+
+def _cache_input(config) -> None:
+    reader = DataReader(config, RunContext())
+    reader.read_file()
+    for _ in range(10):
+        reader.write_cache(reader.cache_path())
+
+
+def test_concurrent_cache_writers(config, tmp_path, frame):
+    config.meta.input_cache = True
+    config.meta.input_file = str(tmp_path / 'input.csv')
+    frame.to_csv(config.meta.input_file, index=False)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        for result in [executor.submit(_cache_input, config) for _ in range(4)]:
+            result.result()
+
+    reader = DataReader(config, RunContext())
+    assert os.listdir(reader.cache_dir) == [os.path.basename(reader.cache_path())]  # no temporary files left
+    reader.read_file()
+    assert reader.frame.shape == frame.shape
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from pipeline_tabular.data_handler.frame_snapshot import FrameSnapshot
+
+
+def test_round_trip_keeps_dtypes_and_index(tmp_path):
+    frame = pd.DataFrame(
+        {'a': [1.5, np.nan, 2.0], 'b': np.array([1, 2, 3], dtype='int8'), 'c': ['x', None, 'z'], 'd': [0.0, 1.0, 2.0]},
+        index=pd.date_range('2024-01-01', periods=3, name='date'),
+    )
+    snapshot = FrameSnapshot(str(tmp_path))
+    snapshot.save(frame)
+
+    pd.testing.assert_frame_equal(snapshot.load(), frame, check_freq=False)
+
+
+def test_save_removes_blocks_of_previous_dtypes(tmp_path):
+    snapshot = FrameSnapshot(str(tmp_path))
+    snapshot.save(pd.DataFrame({'a': [1.0, 2.0], 'b': [1, 2]}))
+    assert os.path.isfile(tmp_path / 'frame_int64.npy')
+
+    frame = pd.DataFrame({'a': [1.0, 2.0], 'b': [3.0, 4.0]}, index=['x', 'y'])
+    snapshot.save(frame)
+
+    assert sorted(os.listdir(tmp_path)) == ['frame.json', 'frame_float64.npy', 'frame_index.npy']
+    pd.testing.assert_frame_equal(snapshot.load(), frame)
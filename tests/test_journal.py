@@ -0,0 +1,20 @@
+import time
+
+from pipeline_tabular.data_handler.journal import ResultJournal
+
+
+def test_resume_state_keeps_unit_records_after_the_latest_seed_record(tmp_path):
+    ResultJournal(str(tmp_path), 'w0').append([{'seed': '1', 'unit': ['a'], 'value': 1}])
+    time.sleep(0.01)  # records are ordered by the time they were written
+    ResultJournal(str(tmp_path), 'w1').append([{'seed': '1', 'value': 'seed'}, {'seed': '2', 'unit': ['b']}])
+    time.sleep(0.01)
+    ResultJournal(str(tmp_path), 'w0').append([{'seed': '1', 'unit': ['c']}])  # resumed after the seed record
+
+    seed_records, unit_records = ResultJournal(str(tmp_path)).resume_state()
+    assert seed_records['1']['value'] == 'seed'
+    assert [record['unit'] for record in unit_records['1']] == [['c']]
+    assert [record['unit'] for record in unit_records['2']] == [['b']]
+
+    journal = ResultJournal(str(tmp_path))
+    assert journal.compact() == 1
+    assert journal.resume_state() == (seed_records, unit_records)
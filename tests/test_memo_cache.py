@@ -0,0 +1,22 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pipeline_tabular.data_handler.memo_cache import MemoCache
+
+
+def _write_entry(cache_dir: str) -> None:
+    cache = MemoCache(cache_dir=cache_dir)
+    for _ in range(20):
+        cache.set('shared', np.arange(100_000))
+
+
+def test_concurrent_writers_of_the_same_entry(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        for result in [executor.submit(_write_entry, cache_dir) for _ in range(4)]:
+            result.result()  # no writer lost its temporary file to another one
+
+    assert os.listdir(cache_dir) == ['shared.pkl']
+    np.testing.assert_array_equal(MemoCache(cache_dir=cache_dir).get('shared'), np.arange(100_000))
@@ -0,0 +1,60 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV, RandomizedSearchCV, StratifiedKFold
+
+from pipeline_tabular.utils.verifications.n_top_sweep import NTopSweep
+
+N_TOPS = [2, 4, 6]
+PARAM_GRID = {
+    'penalty': ['l1', 'l2'],  # l1 fails with the default lbfgs solver, i.e. scores nan
+    'C': [0.01, 1, 100],
+    'max_iter': [1000, 2000],  # converged either way, i.e. tied scores
+}
+
+
+@pytest.fixture
+def cohort() -> tuple:
+    rng = np.random.default_rng(0)
+    y_frame = pd.Series(np.tile([0, 1], 30), name='target')
+    x_frame = pd.DataFrame(rng.normal(size=(60, 6)), columns=[f'f{i}' for i in range(6)])
+    x_frame.iloc[:, :3] += 0.5 * y_frame.to_numpy()[:, None]  # informative features
+    folds = list(StratifiedKFold(n_splits=3, shuffle=True, random_state=0).split(x_frame, y_frame))
+    return x_frame, y_frame, folds
+
+
+@pytest.mark.parametrize('method', ['grid', 'random'])
+def test_best_params_match_sklearn_searches(config, cohort, method):
+    x_frame, y_frame, folds = cohort
+    config.verification.search.method = method
+    config.verification.search.n_iter = 8
+    searches = [
+        {
+            'model': 'logistic_regression',
+            'n_top': n_top,
+            'estimator': LogisticRegression(random_state=0),
+            'param_grid': PARAM_GRID,
+            'scoring': 'roc_auc',
+        }
+        for n_top in N_TOPS
+    ]
+    best_estimators = NTopSweep(x_frame, y_frame, folds, config.verification.search, 0, 2)(searches)
+
+    for n_top, best_estimator in zip(N_TOPS, best_estimators):
+        if method == 'grid':
+            search = GridSearchCV(LogisticRegression(random_state=0), PARAM_GRID, scoring='roc_auc', cv=folds)
+        else:
+            search = RandomizedSearchCV(
+                LogisticRegression(random_state=0), PARAM_GRID, n_iter=8, scoring='roc_auc', cv=folds, random_state=0
+            )
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # failed l1 fits
+            search.fit(x_frame.iloc[:, :n_top], y_frame)
+        assert np.isnan(search.cv_results_['mean_test_score']).any()
+        if method == 'grid':
+            assert (search.cv_results_['rank_test_score'] == 1).sum() > 1  # first of the tied candidates is best
+        assert {param: best_estimator.get_params()[param] for param in PARAM_GRID} == search.best_params_
+        np.testing.assert_allclose(best_estimator.coef_, search.best_estimator_.coef_)
@@ -0,0 +1,26 @@
+import os
+import time
+
+import matplotlib
+import numpy as np
+
+from pipeline_tabular.utils.plots.plot_queue import CLAIM_TIMEOUT, plot_spool_dir, render_pending, submit_plot
+
+matplotlib.use('Agg')
+
+
+def test_jobs_of_dead_renderer_are_rendered_again(config):
+    config.meta.plot_mode = 'deferred'
+    spool_dir = plot_spool_dir(config)
+    out_dir = os.path.join(config.meta.output_dir, 'plots')
+    for name in ['stale', 'claimed']:
+        submit_plot(config, 'conf_matrix', os.path.join(out_dir, f'{name}.png'), matrix=np.eye(2))
+    stale_job, claimed_job = sorted(os.listdir(spool_dir))
+    for job in [stale_job, claimed_job]:  # claimed by a renderer that died
+        os.replace(os.path.join(spool_dir, job), os.path.join(spool_dir, f'{job}.rendering'))
+    claim_time = time.time() - CLAIM_TIMEOUT - 1
+    os.utime(os.path.join(spool_dir, f'{stale_job}.rendering'), (claim_time, claim_time))
+
+    assert render_pending(spool_dir) == 1
+    assert os.listdir(out_dir) == ['stale.png']
+    assert os.listdir(spool_dir) == [f'{claimed_job}.rendering']  # may still be rendered by another renderer
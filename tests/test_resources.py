@@ -0,0 +1,42 @@
+import subprocess
+import sys
+import time
+
+import pytest
+from joblib import Parallel, delayed
+
+from pipeline_tabular.utils.resources import busy_cpu_seconds
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='running children are found via /proc')
+
+ORPHAN = '''
+import os, time
+if os.fork() == 0:  # reparented once this process exits, i.e. another tenant of the machine
+    end = time.process_time() + 1.0
+    while time.process_time() < end:
+        pass
+'''
+
+
+def _burn(seconds: float) -> None:
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+
+def test_running_pool_workers_are_counted():
+    with Parallel(n_jobs=2) as parallel:
+        parallel(delayed(_burn)(0.0) for _ in range(2))  # start workers
+        start_busy = busy_cpu_seconds()
+        parallel(delayed(_burn)(0.5) for _ in range(2))
+        busy = busy_cpu_seconds() - start_busy  # workers are still running
+
+    assert busy > 0.8
+
+
+def test_other_processes_are_not_counted():
+    subprocess.run([sys.executable, '-c', ORPHAN], check=True)
+    start_busy = busy_cpu_seconds()
+    time.sleep(1.0)
+
+    assert busy_cpu_seconds() - start_busy < 0.5
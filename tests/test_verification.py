@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline_tabular.data_handler.data_handler import RunContext
+from pipeline_tabular.utils.verifications.verification import Verification
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_sweep_evaluates_each_model_as_soon_as_its_search_finished(config, monkeypatch):
+    for model in config.verification.models:
+        config.verification.models[model] = model in ['logistic_regression', 'forest']
+    config.verification.param_grids.logistic_regression = {'C': [0.1, 1]}
+    config.verification.param_grids.forest = {'n_estimators': [5], 'max_depth': [2, 3]}
+    config.meta.workers = 2
+    verification = Verification(config, RunContext())
+    verification.seed, verification.boot_iter, verification.job_name, verification.explain_mode = 0, 0, 'job', False
+    rng = np.random.default_rng(0)
+    verification.y_train = pd.Series(np.tile([0, 1], 30), name='target')
+    verification.x_train = pd.DataFrame(rng.normal(size=(60, 4)), columns=[f'f{i}' for i in range(4)])
+
+    evaluated = []
+
+    def evaluate(job_name, n_top, models=None):
+        evaluated.append((n_top, models))
+        if len(evaluated) == 3:  # crash while the last search is still running
+            raise Interrupted
+
+    monkeypatch.setattr(verification, 'evaluate', evaluate)
+    with pytest.raises(Interrupted):
+        verification.sweep_models('job', list(verification.x_train.columns), [2, 4])
+
+    assert evaluated == [(2, ['logistic_regression']), (2, ['forest']), (4, ['logistic_regression'])]
@@ -0,0 +1,55 @@
+import time
+import multiprocessing
+
+from pipeline_tabular.run.work_queue import SQLiteWorkQueue
+
+
+def claim_all(path: str, worker: str) -> list:
+    work_queue = SQLiteWorkQueue(path)
+    seeds = []
+    while (unit := work_queue.claim('exp', worker)) is not None:
+        seeds.append(unit[1])
+        assert work_queue.complete('exp', unit[1], worker)
+    return seeds
+
+
+def test_units_are_claimed_once_by_concurrent_workers(tmp_path):
+    path = str(tmp_path / 'queue.sqlite')
+    work_queue = SQLiteWorkQueue(path)
+    seeds = list(range(100, 140))
+    assert work_queue.publish('exp', seeds) == len(seeds)
+    assert work_queue.publish('exp', seeds) == 0  # idempotent
+
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        claimed = pool.starmap(claim_all, [(path, f'w{worker}') for worker in range(4)])
+
+    assert sorted(seed for worker_seeds in claimed for seed in worker_seeds) == seeds
+    assert work_queue.counts('exp') == {'pending': 0, 'running': 0, 'done': len(seeds), 'failed': 0}
+
+
+def test_expired_unit_is_reclaimed_and_only_completed_by_its_owner(tmp_path):
+    work_queue = SQLiteWorkQueue(str(tmp_path / 'queue.sqlite'), lease_time=0.2, max_attempts=2)
+    work_queue.publish('exp', [5])
+    assert work_queue.claim('exp', 'w0') == (0, 5)
+    assert work_queue.claim('exp', 'x') is None  # lease still valid
+
+    time.sleep(0.3)
+    assert not work_queue.renew('exp', 5, 'x')
+    assert work_queue.claim('exp', 'x') == (0, 5)
+    assert not work_queue.renew('exp', 5, 'w0')
+    assert not work_queue.complete('exp', 5, 'w0')  # lease was lost
+    assert work_queue.counts('exp')['running'] == 1
+    assert work_queue.complete('exp', 5, 'x')
+    assert work_queue.counts('exp')['done'] == 1
+
+
+def test_expired_unit_fails_without_attempts_left(tmp_path):
+    work_queue = SQLiteWorkQueue(str(tmp_path / 'queue.sqlite'), lease_time=0.1, max_attempts=2)
+    work_queue.publish('exp', [1, 2])
+    assert work_queue.claim('exp', 'w0') == (0, 1)
+    work_queue.fail('exp', 1, 'w0', 'error')  # retried
+    assert work_queue.claim('exp', 'w0') == (0, 1)
+    time.sleep(0.2)  # second attempt expires
+
+    assert work_queue.claim('exp', 'x') == (1, 2)
+    assert work_queue.counts('exp') == {'pending': 0, 'running': 1, 'done': 0, 'failed': 1}